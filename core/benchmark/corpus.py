@@ -0,0 +1,63 @@
+import os
+import numpy as np
+
+SYLLABLES = ("ba", "be", "bi", "bo", "ca", "co", "da", "de", "do", "gi", "ha", "he", "ho", "kh", "la", "le",
+             "lo", "ma", "me", "mo", "na", "ne", "ng", "nh", "ph", "qu", "ra", "sa", "ta", "th", "tr", "va")
+
+class SyntheticCorpus():
+    """
+    Reproducible synthetic chunks for benchmarks. Every chunk belongs to one of `n_topics` topics and
+    draws its words Zipf-style from that topic's slice of the vocabulary, so chunks of a topic share
+    words and queries have real nearest neighbours. chunk(i) depends only on (seed, i): any chunk can
+    be regenerated without keeping the corpus, which is what lets the 1M-chunk sizes stream.
+    """
+    def __init__(self, n_chunks:int, seed:int=0, vocab_size:int=20000, n_topics:int=200,
+                 topic_vocab:int=400, words_per_chunk:int=80):
+        self.n_chunks = n_chunks
+        self.seed = seed
+        self.n_topics = n_topics
+        self.words_per_chunk = words_per_chunk
+        rng = np.random.default_rng(seed)
+        self.vocab = np.array([
+            "".join(rng.choice(SYLLABLES, size=rng.integers(2, 4))) + str(i % 10) for i in range(vocab_size)
+        ])
+        self.topic_words = rng.integers(0, vocab_size, size=(n_topics, topic_vocab))
+        weights = 1.0 / np.arange(1, topic_vocab + 1)
+        self.word_probs = weights / weights.sum()
+
+    def __len__(self):
+        return self.n_chunks
+
+    def topic(self, i:int) -> int:
+        return i % self.n_topics
+
+    def chunk(self, i:int) -> str:
+        rng = np.random.default_rng([self.seed, i])
+        words = rng.choice(self.topic_words[self.topic(i)], size=self.words_per_chunk, p=self.word_probs)
+        return " ".join(self.vocab[words])
+
+    def iter_chunks(self, start:int=0, stop:int=None):
+        """Yields (id, text, payload) for chunks in [start, stop)."""
+        for i in range(start, self.n_chunks if stop is None else stop):
+            text = self.chunk(i)
+            yield i, text, {"text": text, "topic": self.topic(i)}
+
+    def queries(self, n_queries:int, words_per_query:int=12) -> list:
+        """Query strings built from a random sample of the words of random chunks."""
+        rng = np.random.default_rng([self.seed, self.n_chunks, 1]) # Distinct from the per-chunk seeds
+        queries = []
+        for i in rng.integers(0, self.n_chunks, size=n_queries):
+            words = self.chunk(int(i)).split()
+            queries.append(" ".join(rng.choice(words, size=min(words_per_query, len(words)), replace=False)))
+        return queries
+
+    def write_files(self, out_dir:str, chunks_per_file:int=50) -> list:
+        """Writes the corpus as .txt documents (blank line between chunks) for the NaiveRAG pipeline."""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for start in range(0, self.n_chunks, chunks_per_file):
+            path = os.path.join(out_dir, f"doc_{start // chunks_per_file:06d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(self.chunk(i) + "." for i in range(start, min(start + chunks_per_file, self.n_chunks))))
+            paths.append(path)
+        return paths
@@ -0,0 +1,53 @@
+import re, hashlib
+import numpy as np
+from llama_index.bridge.pydantic import Field
+from llama_index.embeddings import BaseEmbedding
+from llama_index.llms import MockLLM
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def hash_embed(texts:list, dim:int=256, seed:int=0, features_per_word:int=4) -> np.ndarray:
+    """
+    Deterministic feature-hashing embedding: each lowercased word adds +-1 to `features_per_word`
+    positions chosen from a keyed hash of the word, and rows are L2-normalized.
+    Texts sharing words get similar vectors, so nearest-neighbour results are meaningful,
+    and the same (text, dim, seed) always gives the same vector on every machine.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    key = seed.to_bytes(8, "little")
+    features = {}
+    for row, text in enumerate(texts):
+        for word in WORD_PATTERN.findall(text.lower()):
+            feature = features.get(word)
+            if feature is None:
+                digest = hashlib.blake2b(word.encode(), key=key, digest_size=4 * features_per_word).digest()
+                codes = np.frombuffer(digest, dtype="<u4").astype(np.int64)
+                feature = features[word] = (codes % dim, np.where(codes & (1 << 31), -1.0, 1.0))
+            np.add.at(vectors[row], feature[0], feature[1])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class HashEmbedding(BaseEmbedding):
+    """llama_index embedding model backed by hash_embed, for running NaiveRAG without OpenAI."""
+    dim: int = Field(default=256, description="Embedding size.")
+    seed: int = Field(default=0, description="Hash key, different seeds give unrelated vectors.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _get_query_embedding(self, query:str) -> list:
+        return hash_embed([query], self.dim, self.seed)[0].tolist()
+
+    async def _aget_query_embedding(self, query:str) -> list:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text:str) -> list:
+        return hash_embed([text], self.dim, self.seed)[0].tolist()
+
+    def _get_text_embeddings(self, texts:list) -> list:
+        return hash_embed(texts, self.dim, self.seed).tolist()
+
+def stub_llm(max_tokens:int=16):
+    """LLM answering instantly with a fixed-length echo of the prompt, so query timings measure retrieval."""
+    return MockLLM(max_tokens=max_tokens)
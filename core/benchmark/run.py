@@ -0,0 +1,247 @@
+"""
+Offline retrieval benchmarks: no OpenAI key or network needed.
+
+    python -m core.benchmark.run --sizes 10000 100000 1000000 --out bench/results.json
+    python -m core.benchmark.run --sizes 10000 --baseline bench/results.json
+
+Embeddings come from the deterministic hash_embed and answers from a stub LLM, so two runs on the
+same machine ingest and query exactly the same data and the JSON results can be diffed between versions.
+"""
+import os, gc, sys, json, time, shutil, argparse, platform, subprocess, tempfile
+import numpy as np
+from core.benchmark.corpus import SyntheticCorpus
+from core.benchmark.fakes import hash_embed, HashEmbedding, stub_llm
+
+COLLECTION_NAME = "bench"
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # Peak instead of current RSS where /proc is unavailable (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def dir_bytes(path:str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def latency_stats(seconds:list) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean())}
+
+def embed_corpus(corpus:SyntheticCorpus, path:str, dim:int, batch_size:int=4096) -> np.memmap:
+    """Embeds the whole corpus into a float32 memmap, so large sizes never sit in RAM."""
+    vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(corpus), dim))
+    for start in range(0, len(corpus), batch_size):
+        stop = min(start + batch_size, len(corpus))
+        vectors[start:stop] = hash_embed([corpus.chunk(i) for i in range(start, stop)], dim)
+    vectors.flush()
+    return vectors
+
+def exact_top_k(vectors:np.ndarray, queries:np.ndarray, top_k:int, block_size:int=65536) -> np.ndarray:
+    """Ground-truth neighbour ids by blockwise brute force (vectors are normalized, so dot = cosine)."""
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        scores = queries @ np.asarray(vectors[start:start + block_size]).T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        keep = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+    return best_ids
+
+def bench_qdrant(corpus:SyntheticCorpus, vectors:np.ndarray, backend:str, work_dir:str,
+                 n_queries:int, top_k:int, batch_size:int, profile:str="default") -> dict:
+    """Ingest, search latency, recall@k, memory and cold start of MyQdrant on a local backend."""
+    from core.connector.qdrantdb import MyQdrant, estimate_memory
+    location = os.path.join(work_dir, f"{backend}_{profile}_{len(corpus)}")
+    shutil.rmtree(location, ignore_errors=True)
+    queries = hash_embed(corpus.queries(n_queries), vectors.shape[1])
+
+    gc.collect()
+    rss_before = rss_bytes()
+    client = MyQdrant(local_location=location, local_backend=backend)
+    client.create_collection(COLLECTION_NAME, embedding_size=vectors.shape[1], profile=profile)
+    items = ((point_id, vectors[point_id], payload) for point_id, _, payload in corpus.iter_chunks())
+    ingest = client.bulk_upsert(items, COLLECTION_NAME, batch_size=batch_size)
+
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = client.search_data(COLLECTION_NAME, query.tolist(), top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+        found.append([hit.id for hit in hits])
+    memory = rss_bytes() - rss_before
+
+    truth = exact_top_k(vectors, queries, top_k)
+    recall = np.mean([len(set(ids) & set(expected.tolist())) / top_k for ids, expected in zip(found, truth)])
+
+    del client, hits
+    gc.collect()
+    start = time.perf_counter()
+    # The profile is loaded from the collection, as in any other process opening it
+    client = MyQdrant(local_location=location, local_backend=backend)
+    client.search_data(COLLECTION_NAME, queries[0].tolist(), top_k=top_k)
+    cold_start = time.perf_counter() - start
+    del client
+
+    return {"benchmark": "qdrant", "backend": backend, "profile": profile, "chunks": len(corpus),
+            "estimated": estimate_memory(len(corpus), vectors.shape[1], profile),
+            "ingest_items_per_second": ingest["items_per_second"], "ingest_seconds": ingest["seconds"],
+            "search": latency_stats(latencies), f"recall_at_{top_k}": float(recall),
+            "memory_bytes": memory, "disk_bytes": dir_bytes(location), "cold_start_seconds": cold_start}
+
+def bench_naive_rag(corpus:SyntheticCorpus, dim:int, work_dir:str, n_queries:int) -> dict:
+    """run_naive ingest, query latency (retrieval + stub LLM) and cold start of the NaiveRAG pipeline."""
+    from core.rag.naive import NaiveRAG
+    data_path = os.path.join(work_dir, f"docs_{len(corpus)}")
+    db_path = os.path.join(work_dir, f"naive_{len(corpus)}")
+    shutil.rmtree(db_path, ignore_errors=True)
+    if not os.path.exists(data_path):
+        corpus.write_files(data_path)
+    queries = corpus.queries(n_queries)
+
+    def make_rag():
+        return NaiveRAG(data_path, db_path, COLLECTION_NAME, llm=stub_llm(), embed_model=HashEmbedding(dim=dim))
+
+    gc.collect()
+    rss_before = rss_bytes()
+    rag = make_rag()
+    start = time.perf_counter()
+    rag.run_naive()
+    ingest_seconds = time.perf_counter() - start
+    points = rag.client.count(COLLECTION_NAME).count
+
+    retrieve_latencies, query_latencies = [], []
+    retriever = rag.index.as_retriever(similarity_top_k=3)
+    for query in queries:
+        start = time.perf_counter()
+        retriever.retrieve(query)
+        retrieve_latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        rag.query(query)
+        query_latencies.append(time.perf_counter() - start)
+    memory = rss_bytes() - rss_before
+
+    rag.client.close()
+    del rag, retriever
+    gc.collect()
+    start = time.perf_counter()
+    rag = make_rag()
+    rag.query_vector_storage()
+    rag.query(queries[0])
+    cold_start = time.perf_counter() - start
+    rag.client.close()
+
+    return {"benchmark": "naive_rag", "backend": "qdrant", "chunks": len(corpus), "points": points,
+            "ingest_items_per_second": points / ingest_seconds, "ingest_seconds": ingest_seconds,
+            "retrieve": latency_stats(retrieve_latencies), "query": latency_stats(query_latencies),
+            "memory_bytes": memory, "disk_bytes": dir_bytes(db_path), "cold_start_seconds": cold_start}
+
+def environment() -> dict:
+    import qdrant_client, llama_index
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"git_commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__,
+            "qdrant_client": getattr(qdrant_client, "__version__", None), "llama_index": llama_index.__version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+def result_key(result:dict) -> tuple:
+    return result["benchmark"], result["backend"], result.get("profile", "default"), result["chunks"]
+
+def flatten(result:dict, prefix:str="") -> dict:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+# Metrics where a larger value is better, every other numeric metric is better when smaller
+HIGHER_IS_BETTER = ("items_per_second", "recall_at")
+
+def compare(baseline:dict, current:dict, tolerance:float=0.1) -> list:
+    """Returns one row per metric present in both runs, flagging changes worse than `tolerance`."""
+    baseline_results = {result_key(result): flatten(result) for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = baseline_results.get(result_key(result))
+        if old is None:
+            continue
+        for metric, value in flatten(result).items():
+            if metric == "chunks" or not old.get(metric):
+                continue
+            ratio = value / old[metric]
+            higher_is_better = any(name in metric for name in HIGHER_IS_BETTER)
+            regressed = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+            rows.append({"key": result_key(result), "metric": metric, "baseline": old[metric],
+                         "current": value, "ratio": ratio, "regressed": regressed})
+    return rows
+
+def main(argv:list=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="corpus sizes in chunks")
+    parser.add_argument("--backends", nargs="+", default=["qdrant", "numpy"], help="MyQdrant local backends")
+    parser.add_argument("--profiles", nargs="+", default=["default"],
+                        help="collection profiles, e.g. default int8 binary (quantization is searched on numpy only)")
+    parser.add_argument("--naive-rag", action="store_true", help="also benchmark the NaiveRAG pipeline")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="where collections are built (default: a temp dir)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    report = {"environment": environment(), "config": vars(args), "results": []}
+    for size in args.sizes:
+        corpus = SyntheticCorpus(size, seed=args.seed)
+        start = time.perf_counter()
+        vectors = embed_corpus(corpus, os.path.join(work_dir, f"vectors_{size}_{args.dim}.npy"), args.dim)
+        print(f"[{size}] embedded corpus in {time.perf_counter() - start:.1f}s")
+        for backend, profile in ((backend, profile) for backend in args.backends for profile in args.profiles):
+            result = bench_qdrant(corpus, vectors, backend, work_dir, args.queries, args.top_k, args.batch_size, profile)
+            report["results"].append(result)
+            print(f"[{size}] {backend}/{profile}: {result['ingest_items_per_second']:.0f} items/s, "
+                  f"p50 {result['search']['p50_ms']:.2f}ms, p99 {result['search']['p99_ms']:.2f}ms, "
+                  f"recall@{args.top_k} {result[f'recall_at_{args.top_k}']:.3f}, "
+                  f"est. RAM {result['estimated']['ram_bytes'] / 2**20:.0f}MB, "
+                  f"cold start {result['cold_start_seconds']:.2f}s")
+        if args.naive_rag:
+            result = bench_naive_rag(corpus, args.dim, work_dir, args.queries)
+            report["results"].append(result)
+            print(f"[{size}] naive_rag: {result['ingest_items_per_second']:.0f} points/s, "
+                  f"query p50 {result['query']['p50_ms']:.2f}ms, cold start {result['cold_start_seconds']:.2f}s")
+        del vectors
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(json.load(f), report)
+        for row in rows:
+            flag = "REGRESSION" if row["regressed"] else ""
+            print(f"{row['key']} {row['metric']}: {row['baseline']:.4g} -> {row['current']:.4g} "
+                  f"(x{row['ratio']:.2f}) {flag}")
+    if args.work_dir is None:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os, re, json, math, unicodedata
+from array import array
+from collections import Counter
+import numpy as np
+
+# Words are runs of letters/digits, optionally joined by hyphens, so codes such as "107-PL-1X" stay whole
+TOKEN_PATTERN = re.compile(r"\w+(?:\s*-\s*\w+)*")
+
+def tokenize_vi(text:str, bigrams:bool=True) -> list:
+    """
+    Vietnamese-aware tokenizer. Text is NFC-normalized and lowercased, so composed and decomposed
+    diacritics match. Hyphenated codes are kept whole ("107-pl-1x") and also split into their parts.
+    Vietnamese words are mostly multi-syllable, so adjacent syllable bigrams ("sông_hồng") are added.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    tokens = []
+    syllables = []
+    previous_end = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if text[previous_end:match.start()].strip():
+            syllables = [] # No bigrams across punctuation
+        previous_end = match.end()
+        if "-" in word:
+            parts = [part.strip() for part in word.split("-")]
+            tokens.append("-".join(parts))
+            tokens.extend(parts)
+            syllables = []
+            continue
+        for syllable in word.split("_"):
+            if not syllable:
+                continue
+            tokens.append(syllable)
+            if bigrams and syllables:
+                tokens.append(syllables[-1] + "_" + syllable)
+            syllables.append(syllable)
+    return tokens
+
+class BM25Index():
+    """
+    Incremental in-memory BM25 index over point texts.
+    Postings are compact `array` buffers (row numbers and term frequencies per term) and document
+    lengths are kept per row, so a query is a few vectorized numpy additions over the postings of
+    its terms. Deleted or overwritten rows are tombstoned and dropped on the next compaction.
+    """
+    def __init__(self, k1:float=1.2, b:float=0.75, bigrams:bool=True):
+        self.k1 = k1
+        self.b = b
+        self.bigrams = bigrams
+        self.vocab = {} # term -> term id
+        self.postings_rows = [] # term id -> array('i') of rows
+        self.postings_tfs = [] # term id -> array('H') of term frequencies
+        self.doc_lengths = array('f')
+        self.deleted = bytearray()
+        self.row_to_id = []
+        self.id_to_row = {}
+        self.total_length = 0.0
+        self.n_deleted = 0
+
+    def __len__(self):
+        return len(self.id_to_row)
+
+    def add(self, point_id, text:str):
+        if point_id in self.id_to_row:
+            self.delete(point_id)
+        terms = Counter(tokenize_vi(text, self.bigrams))
+        row = len(self.row_to_id)
+        for term, tf in terms.items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.postings_rows)
+                self.postings_rows.append(array('i'))
+                self.postings_tfs.append(array('H'))
+            self.postings_rows[term_id].append(row)
+            self.postings_tfs[term_id].append(min(tf, 65535))
+        length = float(sum(terms.values()))
+        self.doc_lengths.append(length)
+        self.deleted.append(0)
+        self.row_to_id.append(point_id)
+        self.id_to_row[point_id] = row
+        self.total_length += length
+
+    def add_many(self, items):
+        """Adds (point_id, text) pairs."""
+        for point_id, text in items:
+            self.add(point_id, text)
+
+    def delete(self, point_id):
+        row = self.id_to_row.pop(point_id, None)
+        if row is None:
+            return
+        self.deleted[row] = 1
+        self.total_length -= self.doc_lengths[row]
+        self.n_deleted += 1
+        if self.n_deleted > 1000 and self.n_deleted > len(self.row_to_id) // 3:
+            self.compact()
+
+    def compact(self):
+        """Rewrites postings without tombstoned rows and renumbers the remaining rows."""
+        deleted = np.frombuffer(bytes(self.deleted), dtype=np.uint8).astype(bool)
+        new_row = np.cumsum(~deleted) - 1
+        for term_id in range(len(self.postings_rows)):
+            rows = np.frombuffer(self.postings_rows[term_id], dtype=np.int32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16)
+            live = ~deleted[rows]
+            self.postings_rows[term_id] = array('i', new_row[rows[live]].astype(np.int32).tobytes())
+            self.postings_tfs[term_id] = array('H', tfs[live].tobytes())
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.float32)[~deleted]
+        self.doc_lengths = array('f', lengths.tobytes())
+        self.row_to_id = [point_id for point_id, is_deleted in zip(self.row_to_id, deleted) if not is_deleted]
+        self.id_to_row = {point_id: row for row, point_id in enumerate(self.row_to_id)}
+        self.deleted = bytearray(len(self.row_to_id))
+        self.n_deleted = 0
+
+    def search(self, query:str, top_k:int=10) -> list:
+        """Returns [(point_id, bm25 score)] best first."""
+        n_docs = len(self.id_to_row)
+        if n_docs == 0:
+            return []
+        deleted = np.frombuffer(bytes(self.deleted), dtype=np.uint8).astype(bool)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.float32)
+        avg_length = self.total_length / n_docs
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        scores = np.zeros(len(self.row_to_id), dtype=np.float32)
+        for term in set(tokenize_vi(query, self.bigrams)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            rows = np.frombuffer(self.postings_rows[term_id], dtype=np.int32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            live = ~deleted[rows]
+            rows, tfs = rows[live], tfs[live]
+            if len(rows) == 0:
+                continue
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            # Each row appears once per term, so plain fancy-index addition is safe
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.row_to_id[row], float(scores[row])) for row in candidates]
+
+    def save(self, path:str):
+        """Persists the index as one .npz file (postings concatenated with per-term offsets)."""
+        self.compact()
+        terms = sorted(self.vocab, key=self.vocab.get)
+        sizes = np.array([len(rows) for rows in self.postings_rows], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            rows=np.frombuffer(b''.join(rows.tobytes() for rows in self.postings_rows), dtype=np.int32),
+            tfs=np.frombuffer(b''.join(tfs.tobytes() for tfs in self.postings_tfs), dtype=np.uint16),
+            offsets=offsets,
+            doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.float32),
+            meta=np.array(json.dumps({'k1': self.k1, 'b': self.b, 'bigrams': self.bigrams,
+                                      'terms': terms, 'ids': self.row_to_id}, ensure_ascii=False)),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path:str):
+        data = np.load(path)
+        meta = json.loads(str(data['meta']))
+        index = cls(k1=meta['k1'], b=meta['b'], bigrams=meta['bigrams'])
+        rows, tfs, offsets = data['rows'], data['tfs'], data['offsets']
+        index.vocab = {term: term_id for term_id, term in enumerate(meta['terms'])}
+        index.postings_rows = [array('i', rows[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(meta['terms']))]
+        index.postings_tfs = [array('H', tfs[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(meta['terms']))]
+        index.doc_lengths = array('f', data['doc_lengths'].tobytes())
+        index.row_to_id = meta['ids']
+        index.id_to_row = {point_id: row for row, point_id in enumerate(index.row_to_id)}
+        index.deleted = bytearray(len(index.row_to_id))
+        index.total_length = float(np.sum(data['doc_lengths'], dtype=np.float64))
+        return index
+
+def fuse_scores(vector_hits:list, keyword_hits:list, alpha:float=0.5, fusion:str="relative_score", rrf_k:int=60) -> list:
+    """
+    Combines [(id, score)] lists like Weaviate's hybrid search: alpha=1 is pure vector, alpha=0 pure keyword.
+    "relative_score" min-max normalizes each list before weighting, "ranked" uses reciprocal-rank fusion.
+    Returns [(id, fused score)] best first.
+    """
+    fused = {}
+    for weight, hits in ((alpha, vector_hits), (1 - alpha, keyword_hits)):
+        if weight == 0 or len(hits) == 0:
+            continue
+        if fusion == "ranked":
+            contributions = [(point_id, 1.0 / (rrf_k + rank + 1)) for rank, (point_id, _) in enumerate(hits)]
+        else:
+            scores = [score for _, score in hits]
+            low, high = min(scores), max(scores)
+            contributions = [(point_id, (score - low) / (high - low) if high > low else 1.0) for point_id, score in hits]
+        for point_id, value in contributions:
+            fused[point_id] = fused.get(point_id, 0.0) + weight * value
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
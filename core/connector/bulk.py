@@ -0,0 +1,70 @@
+import time, random, threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+def chunked(iterable, size:int):
+    """Yields lists of at most `size` items without materializing the iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class BulkLoader():
+    """
+    Streams any iterable through `send_fn(batch)` in batches of `batch_size`.
+    At most `parallel` batches are sent at once and at most 2 * `parallel` batches are held in
+    memory: the input is only read further when a slot frees up, so memory stays flat for any
+    corpus size. A failing batch is retried with exponential backoff up to `max_retries` times.
+    """
+    def __init__(self, send_fn, batch_size:int=256, parallel:int=4, max_retries:int=3, backoff:float=1.0):
+        self.send_fn = send_fn
+        self.batch_size = batch_size
+        self.parallel = parallel
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _send(self, batch:list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.send_fn(batch)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.0))
+
+    def load(self, items, show_progress:bool=False) -> dict:
+        """Sends every item and returns {'items', 'batches', 'seconds', 'items_per_second'}."""
+        slots = threading.BoundedSemaphore(2 * self.parallel)
+        lock = threading.Lock()
+        report = {'items': 0, 'batches': 0}
+        errors = []
+        start = time.perf_counter()
+
+        def on_done(future, n_items):
+            slots.release()
+            if future.exception() is not None:
+                errors.append(future.exception())
+                return
+            with lock:
+                report['items'] += n_items
+                report['batches'] += 1
+                if show_progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"{report['items']} items in {elapsed:.1f}s ({report['items'] / elapsed:.0f} items/s)")
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            for batch in chunked(items, self.batch_size):
+                slots.acquire() # Back-pressure: wait for a free slot before reading more input
+                if errors:
+                    slots.release()
+                    break
+                future = executor.submit(self._send, batch)
+                future.add_done_callback(lambda f, n=len(batch): on_done(f, n))
+        if errors:
+            raise errors[0]
+
+        report['seconds'] = time.perf_counter() - start
+        report['items_per_second'] = report['items'] / report['seconds'] if report['seconds'] > 0 else 0.0
+        return report
@@ -0,0 +1,181 @@
+import os, time, sqlite3, hashlib, threading, unicodedata
+from typing import Any, List
+import numpy as np
+from llama_index.embeddings.base import BaseEmbedding
+from llama_index.bridge.pydantic import PrivateAttr
+
+def normalize_text(text:str) -> str:
+    """Unicode-normalize (NFC) and collapse whitespace so trivially different strings share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model:str, text:str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache():
+    """
+    Persistent, content-addressed embedding cache stored in a single SQLite file.
+    Entries are keyed by (model, sha256 of the normalized text) and hold the raw float32 vector.
+    When the stored vectors exceed `max_size_mb`, the least recently used entries are evicted.
+    """
+    def __init__(self, path:str, max_size_mb:float=1024):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                key TEXT PRIMARY KEY,
+                                model TEXT NOT NULL,
+                                vector BLOB NOT NULL,
+                                last_access REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model:str, texts:list) -> list:
+        """Returns one float32 vector per text, or None where the text is not cached."""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_access=? WHERE key=?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+
+    def get(self, model:str, text:str):
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model:str, texts:list, vectors):
+        now = time.time()
+        # One row per key, the last vector wins as with INSERT OR REPLACE
+        rows = list({key: (key, model, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in
+                     ((cache_key(model, text), vector) for text, vector in zip(texts, vectors))}.values())
+        with self._lock:
+            # Replaced rows only change the size by the difference with the old vector
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start:start + 500]]
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchone()[0]
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._size += sum(len(row[2]) for row in rows) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def put(self, model:str, text:str, vector):
+        self.put_many(model, [text], [vector])
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under 90% of its budget
+        target = int(self.max_bytes * 0.9)
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 1000").fetchall()
+            if not rows:
+                break
+            dropped = []
+            for key, size in rows:
+                dropped.append((key,))
+                self._size -= size
+                if self._size <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key=?", dropped)
+            self.evictions += len(dropped)
+        self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {"entries": entries, "size_bytes": self._size, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._size = 0
+
+    def close(self):
+        self._conn.close()
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps any llama_index embed model (e.g. OpenAIEmbedding) with an EmbeddingCache,
+    so ingestion, the semantic splitter and query engines only call the API on cache misses.
+    """
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model:BaseEmbedding, cache:EmbeddingCache, **kwargs: Any):
+        super().__init__(model_name=embed_model.model_name,
+                         embed_batch_size=embed_model.embed_batch_size, **kwargs)
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        vector = self._cache.get(self.model_name, query)
+        if vector is None:
+            vector = self._embed_model._get_query_embedding(query)
+            self._cache.put(self.model_name, query, vector)
+        return list(map(float, vector))
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        vector = self._cache.get(self.model_name, query)
+        if vector is None:
+            vector = await self._embed_model._aget_query_embedding(query)
+            self._cache.put(self.model_name, query, vector)
+        return list(map(float, vector))
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self._embed_model._get_text_embeddings([texts[i] for i in missing])
+            self._cache.put_many(self.model_name, [texts[i] for i in missing], new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        return [list(map(float, vector)) for vector in vectors]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = await self._embed_model._aget_text_embeddings([texts[i] for i in missing])
+            self._cache.put_many(self.model_name, [texts[i] for i in missing], new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        return [list(map(float, vector)) for vector in vectors]
@@ -0,0 +1,659 @@
+import os, json, math, uuid, shutil, threading
+from collections import namedtuple
+import numpy as np
+from qdrant_client.http import models
+
+# Number of set bits of every byte value, for Hamming distances between packed binary codes
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+# The memory maps and row count a read works on, see NumpyCollection.snapshot
+Snapshot = namedtuple('Snapshot', ['vectors', 'offsets', 'deleted', 'ids', 'codes', 'count'])
+
+class NumpyCollection():
+    """
+    One collection stored as a directory of flat files:
+        config.json   - vector size, distance, row count and capacity
+        vectors.f32   - memory-mapped (capacity, size) float32 matrix, rows L2-normalized for cosine
+        offsets.i64   - memory-mapped (capacity, 2) byte offset/length of every row in payloads.jsonl
+        deleted.u8    - memory-mapped tombstone flag per row
+        ids.u8        - memory-mapped (capacity, 17) point id per row: a kind byte (0 int, 1 UUID) and 16 value bytes
+        payloads.jsonl - one JSON line per row, appended on upsert
+        codes.i8 / codes.b1 - with quantization, the memory-mapped int8 or packed sign-bit code of every row
+        payload_index.json - rows of every value of the indexed payload fields, see filter_rows
+    Upserts are append-only: overwriting a point tombstones its old row. Opening a collection only
+    maps the files, payloads are read for the returned hits and the id lookup is built on first write.
+
+    With quantization ("int8" or "binary") searches scan the 4x / 32x smaller codes and only read the
+    float32 rows of the best `limit * oversampling` candidates to rescore them, so the page cache
+    only needs to hold the codes and the original vectors effectively stay on disk.
+    """
+    FILES = (('vectors.f32', None), ('offsets.i64', 16), ('deleted.u8', 1), ('ids.u8', 17))
+    QUANTIZATIONS = (None, 'int8', 'binary')
+    # Rows scored per block when scanning codes, bounds the temporary float/bit arrays
+    BLOCK_BYTES = 1 << 24
+
+    def __init__(self, path:str):
+        self.path = path
+        self._lock = threading.RLock()
+        with open(os.path.join(path, 'config.json')) as f:
+            self.config = json.load(f)
+        self._id_to_row = None
+        self._payload_index = None # field -> {value: [rows]}, loaded on first filtered search
+        self._payload_index_count = 0 # rows covered by _payload_index
+        self._payload_index_dirty = False
+        self._value_rows = {} # (field, value) -> np.ndarray of rows, cache of _payload_index
+        self._open()
+
+    @classmethod
+    def create(cls, path:str, size:int, distance:str=models.Distance.COSINE, capacity:int=1024,
+               quantization:str=None):
+        if distance not in (models.Distance.COSINE, models.Distance.DOT):
+            raise ValueError(f"Distance {distance} is not supported by the numpy backend")
+        if quantization not in cls.QUANTIZATIONS:
+            raise ValueError(f"Quantization {quantization} is not supported by the numpy backend")
+        os.makedirs(path)
+        config = {'size': size, 'distance': models.Distance(distance).value,
+                  'count': 0, 'deleted': 0, 'capacity': capacity, 'quantization': quantization}
+        for name, row_bytes in cls._files(config):
+            with open(os.path.join(path, name), 'wb') as f:
+                f.truncate(capacity * row_bytes)
+        open(os.path.join(path, 'payloads.jsonl'), 'wb').close()
+        with open(os.path.join(path, 'config.json'), 'w') as f:
+            json.dump(config, f)
+        return cls(path)
+
+    @classmethod
+    def _files(cls, config:dict) -> list:
+        """(file name, bytes per row) of every memory-mapped file of a collection."""
+        files = [(name, row_bytes or 4 * config['size']) for name, row_bytes in cls.FILES]
+        if config.get('quantization') == 'int8':
+            files.append(('codes.i8', config['size']))
+        elif config.get('quantization') == 'binary':
+            files.append(('codes.b1', (config['size'] + 7) // 8))
+        return files
+
+    @property
+    def quantization(self) -> str:
+        return self.config.get('quantization')
+
+    def _open(self):
+        capacity, size = self.config['capacity'], self.config['size']
+        self.vectors = np.memmap(os.path.join(self.path, 'vectors.f32'), dtype=np.float32,
+                                 mode='r+', shape=(capacity, size))
+        self.offsets = np.memmap(os.path.join(self.path, 'offsets.i64'), dtype=np.int64,
+                                 mode='r+', shape=(capacity, 2))
+        self.deleted = np.memmap(os.path.join(self.path, 'deleted.u8'), dtype=np.uint8,
+                                 mode='r+', shape=(capacity,))
+        self.ids = np.memmap(os.path.join(self.path, 'ids.u8'), dtype=np.uint8,
+                             mode='r+', shape=(capacity, 17))
+        self.codes = None
+        if self.quantization is not None:
+            name, row_bytes = self._files(self.config)[-1]
+            self.codes = np.memmap(os.path.join(self.path, name), dtype=np.int8 if self.quantization == 'int8' else np.uint8,
+                                   mode='r+', shape=(capacity, row_bytes))
+
+    def _grow(self, needed:int):
+        capacity = self.config['capacity']
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.flush()
+        del self.vectors, self.offsets, self.deleted, self.ids, self.codes
+        for name, row_bytes in self._files(self.config):
+            with open(os.path.join(self.path, name), 'r+b') as f:
+                f.truncate(capacity * row_bytes)
+        self.config['capacity'] = capacity
+        self._open()
+
+    def _save_config(self):
+        tmp_path = os.path.join(self.path, 'config.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.config, f)
+        os.replace(tmp_path, os.path.join(self.path, 'config.json'))
+
+    def set_config(self, key:str, value):
+        """Stores an extra JSON value in config.json, e.g. the search profile saved by MyQdrant."""
+        with self._lock:
+            self.config[key] = value
+            self._save_config()
+
+    def flush(self):
+        self.vectors.flush()
+        self.offsets.flush()
+        self.deleted.flush()
+        self.ids.flush()
+        if self.codes is not None:
+            self.codes.flush()
+
+    @staticmethod
+    def _encode_id(point_id) -> bytes:
+        if isinstance(point_id, int):
+            return b'\x00' + point_id.to_bytes(16, 'little')
+        return b'\x01' + uuid.UUID(str(point_id)).bytes
+
+    @staticmethod
+    def _decode_id(encoded:bytes):
+        if encoded[0] == 0:
+            return int.from_bytes(encoded[1:], 'little')
+        return str(uuid.UUID(bytes=encoded[1:]))
+
+    def _normalize_id(self, point_id):
+        # Qdrant returns UUIDs in canonical lowercase form, so lookups use the same form
+        return point_id if isinstance(point_id, int) else str(uuid.UUID(str(point_id)))
+
+    @property
+    def id_to_row(self) -> dict:
+        if self._id_to_row is None:
+            with self._lock:
+                if self._id_to_row is None:
+                    count = self.config['count']
+                    live = np.flatnonzero(self.deleted[:count] == 0)
+                    ids = self.ids[live].tobytes()
+                    self._id_to_row = {self._decode_id(ids[17 * i:17 * (i + 1)]): int(row)
+                                       for i, row in enumerate(live)}
+        return self._id_to_row
+
+    def snapshot(self) -> Snapshot:
+        """
+        The current memory maps and row count, taken together under the lock. _grow swaps in new maps,
+        so every read works on the maps it started with instead of indexing replaced or shorter ones;
+        the old maps stay valid for as long as the read holds them.
+        """
+        with self._lock:
+            return Snapshot(self.vectors, self.offsets, self.deleted, self.ids, self.codes, self.config['count'])
+
+    @property
+    def cosine(self) -> bool:
+        return self.config['distance'] == models.Distance.COSINE.value
+
+    def _prepare(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.cosine:
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors
+
+    def upsert(self, points:list):
+        if isinstance(points, models.Batch):
+            payloads = points.payloads or [{}] * len(points.ids)
+            points = [models.PointStruct(id=i, vector=v, payload=p)
+                      for i, v, p in zip(points.ids, points.vectors, payloads)]
+        # Later duplicates of an id win, as in Qdrant
+        points = list({self._normalize_id(point.id): point for point in points}.items())
+        if len(points) == 0:
+            return
+        vectors = self._prepare([point.vector for _, point in points])
+        with self._lock:
+            id_to_row = self.id_to_row
+            start = self.config['count']
+            self._grow(start + len(points))
+            # Drop leftovers of an interrupted upsert so offsets and file contents stay aligned
+            payload_path = os.path.join(self.path, 'payloads.jsonl')
+            position = int(self.offsets[start - 1].sum()) if start > 0 else 0
+            with open(payload_path, 'r+b') as f:
+                f.truncate(position)
+            with open(payload_path, 'ab') as f:
+                for row, (point_id, point) in enumerate(points, start=start):
+                    line = json.dumps(point.payload or {}, ensure_ascii=False).encode('utf-8') + b'\n'
+                    f.write(line)
+                    self.offsets[row] = (position, len(line))
+                    self.ids[row] = np.frombuffer(self._encode_id(point_id), dtype=np.uint8)
+                    position += len(line)
+            self.vectors[start:start + len(points)] = vectors
+            if self.codes is not None:
+                self.codes[start:start + len(points)] = self._quantize(vectors)
+            self.deleted[start:start + len(points)] = 0
+            self.flush()
+            self.config['count'] = start + len(points)
+            self._save_config()
+            # Tombstone overwritten rows only once the new rows are durable
+            for row, (point_id, _) in enumerate(points, start=start):
+                old_row = id_to_row.get(point_id)
+                if old_row is not None:
+                    self.deleted[old_row] = 1
+                    self.config['deleted'] += 1
+                id_to_row[point_id] = row
+            self.deleted.flush()
+            self._save_config()
+            if self._payload_index is not None:
+                self._index_payloads(((row, point.payload or {}) for row, (_, point) in enumerate(points, start=start)),
+                                     list(self._payload_index))
+                self._payload_index_count = self.config['count']
+
+    def delete(self, ids:list):
+        with self._lock:
+            id_to_row = self.id_to_row
+            for point_id in ids:
+                row = id_to_row.pop(self._normalize_id(point_id), None)
+                if row is not None:
+                    self.deleted[row] = 1
+                    self.config['deleted'] += 1
+            self.flush()
+            self._save_config()
+
+    def set_payload(self, payload:dict, ids:list):
+        """Merges payload into the points' payloads, by re-appending their rows (upserts are append-only)."""
+        records = self.retrieve(ids, with_payload=True, with_vectors=True)
+        self.upsert([models.PointStruct(id=record.id, vector=record.vector, payload={**(record.payload or {}), **payload})
+                     for record in records])
+
+    def count(self) -> int:
+        return self.config['count'] - self.config['deleted']
+
+    def _read_rows(self, rows, with_payload=True, view:Snapshot=None) -> list:
+        """
+        Returns (id, payload) for the given rows, seeking to their payload lines only.
+        with_payload is True, False or a list of payload keys to keep.
+        """
+        view = view or self.snapshot()
+        results = []
+        with open(os.path.join(self.path, 'payloads.jsonl'), 'rb') as f:
+            for row in rows:
+                payload = None
+                if with_payload:
+                    position, length = view.offsets[row]
+                    f.seek(int(position))
+                    payload = json.loads(f.read(int(length)))
+                    if isinstance(with_payload, (list, tuple)):
+                        payload = {key: payload[key] for key in with_payload if key in payload}
+                results.append((self._decode_id(view.ids[row].tobytes()), payload))
+        return results
+
+    def _iter_payloads(self, start:int, stop:int):
+        """Yields (row, payload) for rows [start, stop), reading payloads.jsonl sequentially."""
+        if start >= stop:
+            return
+        with open(os.path.join(self.path, 'payloads.jsonl'), 'rb') as f:
+            f.seek(int(self.offsets[start][0]))
+            for row in range(start, stop):
+                yield row, json.loads(f.read(int(self.offsets[row][1])))
+
+    def _index_payloads(self, rows_payloads, fields:list):
+        for row, payload in rows_payloads:
+            for field in fields:
+                values = payload.get(field)
+                # A list matches each of its elements, as in Qdrant
+                for value in set(values if isinstance(values, list) else [values]):
+                    if value is not None and not isinstance(value, (dict, list)):
+                        self._payload_index[field].setdefault(value, []).append(row)
+        self._value_rows = {}
+        self._payload_index_dirty = True
+
+    def _load_payload_index(self):
+        if self._payload_index is not None:
+            return
+        self._payload_index, self._payload_index_count = {}, 0
+        index_path = os.path.join(self.path, 'payload_index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                saved = json.load(f)
+            self._payload_index = {field: {value: rows for value, rows in values}
+                                   for field, values in saved['fields'].items()}
+            self._payload_index_count = saved['count']
+        # Catch up with rows upserted since the index was saved
+        count = self.config['count']
+        if self._payload_index and self._payload_index_count < count:
+            self._index_payloads(self._iter_payloads(self._payload_index_count, count), list(self._payload_index))
+        self._payload_index_count = count
+
+    def field_index(self, field:str) -> dict:
+        """{value: [rows]} of a payload field, built with one pass over the payloads the first time."""
+        with self._lock:
+            self._load_payload_index()
+            if field not in self._payload_index:
+                self._payload_index[field] = {}
+                self._index_payloads(self._iter_payloads(0, self.config['count']), [field])
+                self.save_payload_index()
+            return self._payload_index[field]
+
+    def create_payload_index(self, field:str, field_schema=None):
+        with self._lock:
+            self.config.setdefault('payload_indexes', {})[field] = getattr(field_schema, 'value', field_schema)
+            self._save_config()
+            self.field_index(field)
+
+    def save_payload_index(self):
+        with self._lock:
+            if self._payload_index is None or not self._payload_index_dirty:
+                return
+            tmp_path = os.path.join(self.path, 'payload_index.json.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'count': self._payload_index_count,
+                           'fields': {field: list(values.items()) for field, values in self._payload_index.items()}}, f)
+            os.replace(tmp_path, os.path.join(self.path, 'payload_index.json'))
+            self._payload_index_dirty = False
+
+    def _rows_of(self, field:str, values) -> np.ndarray:
+        index = self.field_index(field)
+        parts = []
+        for value in values:
+            rows = self._value_rows.get((field, value))
+            if rows is None:
+                rows = self._value_rows[(field, value)] = np.array(index.get(value, []), dtype=np.int64)
+            parts.append(rows)
+        if len(parts) == 0:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+    @staticmethod
+    def _conditions(conditions) -> list:
+        if conditions is None:
+            return []
+        return conditions if isinstance(conditions, list) else [conditions]
+
+    def _match_condition(self, condition) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self._match_filter(condition)
+        if isinstance(condition, models.HasIdCondition):
+            id_to_row = self.id_to_row
+            return np.unique(np.array([id_to_row[point_id] for point_id in map(self._normalize_id, condition.has_id)
+                                       if point_id in id_to_row], dtype=np.int64))
+        if isinstance(condition, models.FieldCondition):
+            match = condition.match
+            if isinstance(match, models.MatchValue):
+                return self._rows_of(condition.key, [match.value])
+            if isinstance(match, models.MatchAny):
+                return self._rows_of(condition.key, match.any)
+            if isinstance(match, models.MatchExcept):
+                excluded = set(getattr(match, 'except_'))
+                return self._rows_of(condition.key, [v for v in self.field_index(condition.key) if v not in excluded])
+            if match is None and condition.range is not None:
+                bounds = condition.range
+                return self._rows_of(condition.key, [
+                    v for v in self.field_index(condition.key)
+                    if isinstance(v, (int, float)) and not isinstance(v, bool)
+                    and (bounds.gt is None or v > bounds.gt) and (bounds.gte is None or v >= bounds.gte)
+                    and (bounds.lt is None or v < bounds.lt) and (bounds.lte is None or v <= bounds.lte)])
+        raise ValueError(f"The numpy backend does not support the filter condition {condition!r}")
+
+    def _match_filter(self, query_filter:models.Filter) -> np.ndarray:
+        result = None
+        for condition in self._conditions(query_filter.must):
+            rows = self._match_condition(condition)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        should = self._conditions(query_filter.should)
+        if should:
+            rows = np.unique(np.concatenate([self._match_condition(condition) for condition in should]))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if result is None:
+            result = np.arange(self.config['count'], dtype=np.int64)
+        for condition in self._conditions(query_filter.must_not):
+            result = np.setdiff1d(result, self._match_condition(condition), assume_unique=True)
+        return result
+
+    def filter_rows(self, query_filter:models.Filter) -> np.ndarray:
+        """
+        Sorted live rows matching a Qdrant Filter (must / should / must_not of match value, any or except,
+        range and has_id conditions, nested filters). Conditions are answered from the per-value row lists
+        of the payload index instead of reading payloads, so a filtered search only touches matching rows.
+        """
+        with self._lock:
+            rows = self._match_filter(query_filter)
+            return rows[self.deleted[rows] == 0]
+
+    def _quantize(self, vectors:np.ndarray) -> np.ndarray:
+        if self.quantization == 'binary':
+            return np.packbits(vectors > 0, axis=1)
+        if self.config.get('int8_scale') is None:
+            # Calibrated once on the first batch, like Qdrant's quantile: outliers are clipped
+            self.config['int8_scale'] = max(float(np.quantile(np.abs(vectors), 0.99)), 1e-6)
+        return np.clip(np.rint(vectors * (127 / self.config['int8_scale'])), -127, 127).astype(np.int8)
+
+    def approximate_scores(self, query_vectors, view:Snapshot=None) -> np.ndarray:
+        """Like scores(), but computed from the quantized codes block by block."""
+        view = view or self.snapshot()
+        queries = self._prepare(query_vectors)
+        count = view.count
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        if self.quantization == 'int8':
+            block = max(1024, self.BLOCK_BYTES // (4 * self.config['size']))
+            for start in range(0, count, block):
+                stop = min(start + block, count)
+                codes = np.asarray(view.codes[start:stop], dtype=np.float32)
+                scores[:, start:stop] = queries @ codes.T
+            if count:
+                # The scale is only calibrated by the first upsert
+                scores *= self.config['int8_scale'] / 127
+        else:
+            query_bits = np.packbits(queries > 0, axis=1)
+            block = max(64, self.BLOCK_BYTES // (len(queries) * query_bits.shape[1]))
+            for start in range(0, count, block):
+                stop = min(start + block, count)
+                differing = np.bitwise_xor(query_bits[:, None, :], view.codes[start:stop][None, :, :])
+                hamming = POPCOUNT[differing].sum(axis=2, dtype=np.int32)
+                scores[:, start:stop] = 1 - 2 * hamming / self.config['size']
+        if self.config['deleted']:
+            scores[:, view.deleted[:count].astype(bool)] = -np.inf
+        return scores
+
+    def scores(self, query_vectors, view:Snapshot=None) -> np.ndarray:
+        """Scores of every row for each query, shape (n_queries, count); deleted rows get -inf."""
+        view = view or self.snapshot()
+        count = view.count
+        scores = self._prepare(query_vectors) @ view.vectors[:count].T
+        if self.config['deleted']:
+            scores[:, view.deleted[:count].astype(bool)] = -np.inf
+        return scores
+
+    def top_k(self, scores:np.ndarray, limit:int) -> np.ndarray:
+        """Row numbers of the `limit` best scores, best first."""
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.argpartition(-scores, limit - 1)[:limit]
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return rows[np.isfinite(scores[rows])]
+
+    def search(self, query_vector, limit:int=10, with_payload:bool=True, with_vectors:bool=False,
+               search_params:models.SearchParams=None, query_filter:models.Filter=None) -> list:
+        return self.search_batch([query_vector], limit, with_payload, with_vectors, search_params, query_filter)[0]
+
+    def search_batch(self, query_vectors, limit:int=10, with_payload:bool=True, with_vectors:bool=False,
+                     search_params:models.SearchParams=None, query_filter:models.Filter=None) -> list:
+        """
+        Exact search, or on a quantized collection a scan of the codes followed by rescoring the
+        best `limit * oversampling` candidates with the original vectors. search_params follows Qdrant:
+        exact=True or quantization.ignore skip the codes, quantization.rescore=False returns code scores.
+        With query_filter only the matching rows (see filter_rows) are read and scored, exactly.
+        """
+        view = self.snapshot()
+        if query_filter is not None:
+            return self._filtered_search(query_vectors, limit, with_payload, with_vectors, query_filter, view)
+        quantization = search_params.quantization if search_params is not None else None
+        if self.quantization is None or (search_params is not None and search_params.exact) \
+                or (quantization is not None and quantization.ignore):
+            # One (n_queries, dim) x (dim, count) product scores every query at once
+            scores = self.scores(query_vectors, view)
+            results = []
+            for row_scores in scores:
+                rows = self.top_k(row_scores, limit)
+                results.append(self._scored_points(rows, row_scores[rows], with_payload, with_vectors, view))
+            return results
+
+        oversampling = quantization.oversampling if quantization is not None and quantization.oversampling else 1.0
+        rescore = quantization is None or quantization.rescore is not False
+        queries = self._prepare(query_vectors)
+        results = []
+        for query, row_scores in zip(queries, self.approximate_scores(queries, view)):
+            rows = self.top_k(row_scores, math.ceil(limit * oversampling) if rescore else limit)
+            scores = row_scores[rows]
+            if rescore and len(rows) > 0:
+                order = np.argsort(rows)
+                exact = np.empty(len(rows), dtype=np.float32)
+                exact[order] = view.vectors[rows[order]] @ query # Sorted rows read the memmap sequentially
+                best = np.argsort(-exact, kind='stable')[:limit]
+                rows, scores = rows[best], exact[best]
+            results.append(self._scored_points(rows, scores, with_payload, with_vectors, view))
+        return results
+
+    def _filtered_search(self, query_vectors, limit:int, with_payload:bool, with_vectors:bool,
+                         query_filter:models.Filter, view:Snapshot) -> list:
+        # Rows appended after the snapshot are not in its maps
+        rows = self.filter_rows(query_filter)
+        rows = rows[rows < view.count]
+        queries = self._prepare(query_vectors)
+        scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+        # Sorted rows read the memmap sequentially, blocks bound the gathered copy
+        block = max(1024, self.BLOCK_BYTES // (4 * self.config['size']))
+        for start in range(0, len(rows), block):
+            scores[:, start:start + block] = queries @ view.vectors[rows[start:start + block]].T
+        results = []
+        for row_scores in scores:
+            best = self.top_k(row_scores, limit)
+            results.append(self._scored_points(rows[best], row_scores[best], with_payload, with_vectors, view))
+        return results
+
+    def memory_report(self) -> dict:
+        """Bytes of live-row data the searches scan (search_bytes) next to the full float32 vectors."""
+        view = self.snapshot()
+        count = view.count
+        vector_bytes = count * 4 * self.config['size']
+        code_bytes = count * view.codes.shape[1] if view.codes is not None else 0
+        return {'count': count, 'quantization': self.quantization, 'vector_bytes': vector_bytes,
+                'code_bytes': code_bytes, 'search_bytes': code_bytes or vector_bytes}
+
+    def _scored_points(self, rows, scores, with_payload:bool, with_vectors:bool, view:Snapshot) -> list:
+        return [
+            models.ScoredPoint(id=point_id, version=0, score=float(score), payload=payload,
+                               vector=view.vectors[row].tolist() if with_vectors else None)
+            for row, score, (point_id, payload) in zip(rows, scores, self._read_rows(rows, with_payload, view))
+        ]
+
+    def scroll(self, limit:int=10, offset:int=None, with_payload:bool=True, with_vectors:bool=False,
+               scroll_filter:models.Filter=None):
+        # The offset is a row number, so pages stay stable while the collection only grows
+        view = self.snapshot()
+        start = int(offset or 0)
+        if scroll_filter is not None:
+            live = self.filter_rows(scroll_filter)
+            live = live[(live >= start) & (live < view.count)]
+        else:
+            live = np.flatnonzero(view.deleted[start:view.count] == 0) + start
+        rows = live[:limit]
+        next_offset = int(live[limit]) if len(live) > limit else None
+        records = [
+            models.Record(id=point_id, payload=payload,
+                          vector=view.vectors[row].tolist() if with_vectors else None)
+            for row, (point_id, payload) in zip(rows, self._read_rows(rows, with_payload, view))
+        ]
+        return records, next_offset
+
+    def retrieve(self, ids:list, with_payload:bool=True, with_vectors:bool=False) -> list:
+        ids = [self._normalize_id(point_id) for point_id in ids]
+        with self._lock:
+            view = self.snapshot()
+            id_to_row = self.id_to_row
+            rows = [id_to_row[point_id] for point_id in ids if point_id in id_to_row]
+        return [
+            models.Record(id=point_id, payload=payload,
+                          vector=view.vectors[row].tolist() if with_vectors else None)
+            for row, (point_id, payload) in zip(rows, self._read_rows(rows, with_payload, view))
+        ]
+
+class NumpyVectorStore():
+    """
+    Local exact-search backend for MyQdrant with the QdrantClient methods MyQdrant relies on.
+    Vectors live in memory-mapped float32 matrices, so opening is instant and a query is one
+    matrix-vector product plus an argpartition instead of QdrantLocal's per-point Python loop.
+    """
+    def __init__(self, location:str):
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+        self.collections = {}
+
+    def _collection_path(self, collection_name:str) -> str:
+        return os.path.join(self.location, collection_name)
+
+    def get_collection(self, collection_name:str) -> NumpyCollection:
+        collection = self.collections.get(collection_name)
+        if collection is None:
+            path = self._collection_path(collection_name)
+            if not os.path.exists(os.path.join(path, 'config.json')):
+                raise ValueError(f"Collection {collection_name} not found")
+            collection = self.collections[collection_name] = NumpyCollection(path)
+        return collection
+
+    def get_collections(self):
+        names = [name for name in sorted(os.listdir(self.location))
+                 if os.path.exists(os.path.join(self._collection_path(name), 'config.json'))]
+        return models.CollectionsResponse(collections=[models.CollectionDescription(name=name) for name in names])
+
+    def create_collection(self, collection_name:str, vectors_config:models.VectorParams,
+                          quantization_config=None, **kwargs):
+        """Vectors are always memory-mapped, so on_disk and hnsw_config are accepted and ignored."""
+        if os.path.exists(self._collection_path(collection_name)):
+            raise ValueError(f"Collection {collection_name} already exists")
+        quantization_config = quantization_config or vectors_config.quantization_config
+        quantization = None
+        if isinstance(quantization_config, models.ScalarQuantization):
+            quantization = 'int8'
+        elif isinstance(quantization_config, models.BinaryQuantization):
+            quantization = 'binary'
+        elif quantization_config is not None:
+            raise ValueError(f"Quantization {type(quantization_config).__name__} is not supported by the numpy backend")
+        self.collections[collection_name] = NumpyCollection.create(
+            self._collection_path(collection_name), vectors_config.size, vectors_config.distance,
+            quantization=quantization)
+        return True
+
+    def recreate_collection(self, collection_name:str, vectors_config:models.VectorParams, **kwargs):
+        self.delete_collection(collection_name)
+        return self.create_collection(collection_name, vectors_config, **kwargs)
+
+    def delete_collection(self, collection_name:str, **kwargs):
+        self.collections.pop(collection_name, None)
+        if os.path.exists(self._collection_path(collection_name)):
+            shutil.rmtree(self._collection_path(collection_name))
+            return True
+        return False
+
+    def count(self, collection_name:str, **kwargs) -> models.CountResult:
+        return models.CountResult(count=self.get_collection(collection_name).count())
+
+    def upsert(self, collection_name:str, points, **kwargs):
+        self.get_collection(collection_name).upsert(points)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name:str, points_selector, **kwargs):
+        if isinstance(points_selector, models.PointIdsList):
+            points_selector = points_selector.points
+        if not isinstance(points_selector, (list, tuple)):
+            raise ValueError("The numpy backend only deletes by a list of point ids")
+        self.get_collection(collection_name).delete(points_selector)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def set_payload(self, collection_name:str, payload:dict, points, **kwargs):
+        if isinstance(points, models.PointIdsList):
+            points = points.points
+        if not isinstance(points, (list, tuple)):
+            raise ValueError("The numpy backend only sets payloads by a list of point ids")
+        self.get_collection(collection_name).set_payload(payload, points)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def scroll(self, collection_name:str, limit:int=10, offset:int=None,
+               with_payload:bool=True, with_vectors:bool=False, scroll_filter:models.Filter=None, **kwargs):
+        return self.get_collection(collection_name).scroll(limit, offset, with_payload, with_vectors, scroll_filter)
+
+    def create_payload_index(self, collection_name:str, field_name:str, field_schema=None, **kwargs):
+        self.get_collection(collection_name).create_payload_index(field_name, field_schema)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def retrieve(self, collection_name:str, ids:list, with_payload:bool=True, with_vectors:bool=False, **kwargs):
+        return self.get_collection(collection_name).retrieve(ids, with_payload, with_vectors)
+
+    def search(self, collection_name:str, query_vector, limit:int=10, query_filter:models.Filter=None,
+               with_payload:bool=True, with_vectors:bool=False, search_params:models.SearchParams=None, **kwargs) -> list:
+        return self.get_collection(collection_name).search(query_vector, limit, with_payload, with_vectors,
+                                                           search_params, query_filter)
+
+    def search_batch(self, collection_name:str, query_vectors, limit:int=10, query_filter=None,
+                     with_payload:bool=True, with_vectors:bool=False, search_params:models.SearchParams=None,
+                     **kwargs) -> list:
+        return self.get_collection(collection_name).search_batch(
+            query_vectors, limit, with_payload, with_vectors, search_params, query_filter)
+
+    def close(self):
+        for collection in self.collections.values():
+            collection.flush()
+            collection.save_payload_index()
+        self.collections = {}
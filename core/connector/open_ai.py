@@ -1,42 +1,188 @@
-from openai import OpenAI
+import random, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.connector.streaming import TokenStream, AsyncTokenStream
+from core.monitoring import tracing
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError)
 
 class MyOAI():
-    def __init__(self, api_key:str, chat_model:str="gpt-3.5-turbo-1106"):
+    def __init__(self, api_key:str, chat_model:str="gpt-3.5-turbo-1106",
+                 embedding_model:str="text-embedding-ada-002", max_workers:int=4, cache=None):
         self.chat_model = chat_model
+        self.embedding_model = embedding_model
+        self.max_workers = max_workers
+        self.cache = cache # Optional EmbeddingCache, consulted before every embedding request
         self.client = OpenAI(api_key=api_key)
+        self._async_client = None
 
     def get_chat(self, prompt:str=None, system:str=None, temp:float=0.0, 
-                 stop:str=None, max_tokens:int=2000, stream:bool=False):
+                 stop:str=None, max_tokens:int=2000, stream:bool=False, json_mode:bool=False):
+        """json_mode asks for a JSON object response; the prompt itself must mention JSON."""
+        if stream:
+            return self.stream_chat(prompt, system, temp, stop, max_tokens)
+
+        with tracing.span("openai.chat", model=self.chat_model) as span:
+            completion = self.client.chat.completions.create(
+                **self._chat_kwargs(prompt, system, temp, stop, max_tokens, json_mode)
+            )
+            if completion.usage is not None:
+                span.set(prompt_tokens=completion.usage.prompt_tokens,
+                         completion_tokens=completion.usage.completion_tokens)
+        return completion.choices[0].message.content
+
+    def stream_chat(self, prompt:str=None, system:str=None, temp:float=0.0,
+                    stop:str=None, max_tokens:int=2000) -> TokenStream:
+        """
+        Yields the answer tokens as they arrive. The returned TokenStream exposes
+        time_to_first_token, tokens_per_second and the full text once consumed.
+        """
+        start = time.perf_counter()
+        # Covers the request until the response headers arrive, token timings are on the TokenStream
+        with tracing.span("openai.chat_stream", model=self.chat_model):
+            completion = self.client.chat.completions.create(
+                **self._chat_kwargs(prompt, system, temp, stop, max_tokens), stream=True
+            )
+        return TokenStream(
+            (chunk.choices[0].delta.content for chunk in completion
+             if chunk.choices and chunk.choices[0].delta.content),
+            start,
+        )
+
+    def astream_chat(self, prompt:str=None, system:str=None, temp:float=0.0,
+                     stop:str=None, max_tokens:int=2000) -> AsyncTokenStream:
+        """Async version of stream_chat, consumed with `async for`."""
+        start = time.perf_counter()
+        async def deltas():
+            completion = await self.async_client.chat.completions.create(
+                **self._chat_kwargs(prompt, system, temp, stop, max_tokens), stream=True
+            )
+            async for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        return AsyncTokenStream(deltas(), start)
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.client.api_key)
+        return self._async_client
+
+    def _chat_kwargs(self, prompt:str, system:str, temp:float, stop:str, max_tokens:int,
+                     json_mode:bool=False) -> dict:
         if system==None:
             system = "You are an VPI - an AI assistant developed by Vietnam Petroleum Institue that helps people find information."
-
-        completion = self.client.chat.completions.create(
-        model=self.chat_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=temp,
-        max_tokens=max_tokens,
-        top_p=0.95,
-        frequency_penalty=0,
-        presence_penalty=0,
-        stream=stream,
+        kwargs = dict(
+            model=self.chat_model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temp,
+            max_tokens=max_tokens,
+            top_p=0.95,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=stop,
         )
-        return completion.choices[0].message.content
+        if json_mode:
+            kwargs['response_format'] = {"type": "json_object"}
+        return kwargs
 
     def get_embedding(self, text:str):
-        response = self.client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response.data[0].embedding
-    
+        with tracing.span("openai.get_embedding", model=self.embedding_model) as span:
+            if self.cache is not None:
+                vector = self.cache.get(self.embedding_model, text)
+                if vector is not None:
+                    span.set(cache_hits=1)
+                    return vector.tolist()
+            vector = self._embed_batch([text])[0]
+            if self.cache is not None:
+                self.cache.put(self.embedding_model, text, vector)
+            return vector
+
+    def get_embeddings(self, texts:list, max_batch_tokens:int=8000, max_batch_size:int=256,
+                       max_workers:int=None, max_retries:int=6):
+        """
+        Embedding many texts at once. Inputs are packed into batches of at most `max_batch_tokens` tokens
+        and `max_batch_size` items, the batches are sent concurrently with at most `max_workers` requests
+        in flight, and rate-limit errors are retried with exponential backoff.
+        Returns a contiguous float32 array of shape (len(texts), dim) in input order.
+        """
+        texts = list(texts)
+        if len(texts) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        with tracing.span("openai.get_embeddings", model=self.embedding_model, texts=len(texts)) as span:
+            cached = self.cache.get_many(self.embedding_model, texts) if self.cache is not None else [None] * len(texts)
+            missing = [i for i, vector in enumerate(cached) if vector is None]
+            vectors = None
+            hit = next((vector for vector in cached if vector is not None), None)
+            if hit is not None:
+                vectors = np.empty((len(texts), len(hit)), dtype=np.float32)
+                for i, vector in enumerate(cached):
+                    if vector is not None:
+                        vectors[i] = vector
+
+            # Repeated texts are only sent once
+            positions = {}
+            for i in missing:
+                positions.setdefault(texts[i], []).append(i)
+            missing_texts = list(positions)
+            batches = list(self._embedding_batches(missing_texts, max_batch_tokens, max_batch_size))
+            span.set(cache_hits=len(texts) - len(missing), requests=len(batches))
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+                results = executor.map(
+                    tracing.bind(lambda idx: self._embed_batch([missing_texts[i] for i in idx], max_retries)), batches)
+                for idx, batch_vectors in zip(batches, results):
+                    if vectors is None:
+                        vectors = np.empty((len(texts), len(batch_vectors[0])), dtype=np.float32)
+                    for i, vector in zip(idx, batch_vectors):
+                        vectors[positions[missing_texts[i]]] = vector
+                    if self.cache is not None:
+                        self.cache.put_many(self.embedding_model, [missing_texts[i] for i in idx], batch_vectors)
+            return vectors
+
+    def _embedding_batches(self, texts:list, max_batch_tokens:int, max_batch_size:int):
+        # Yield lists of input positions, never splitting a single text across batches
+        batch, batch_tokens = [], 0
+        encoding = get_encoding()
+        for i, text in enumerate(texts):
+            n_tokens = len(encoding.encode(text))
+            if batch and (batch_tokens + n_tokens > max_batch_tokens or len(batch) >= max_batch_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += n_tokens
+        if batch:
+            yield batch
+
+    def _embed_batch(self, texts:list, max_retries:int=6, backoff:float=1.0, max_backoff:float=60.0):
+        for attempt in range(max_retries + 1):
+            try:
+                with tracing.span("openai.embedding_request", batch_size=len(texts), retries=attempt) as span:
+                    response = self.client.embeddings.create(
+                        input=texts,
+                        model=self.embedding_model
+                    )
+                    span.set(prompt_tokens=response.usage.prompt_tokens)
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            except RETRYABLE_ERRORS:
+                if attempt == max_retries:
+                    raise
+                # Exponential backoff with jitter so concurrent batches do not retry in lockstep
+                time.sleep(min(max_backoff, backoff * 2**attempt) * random.uniform(0.5, 1.0))
+
 #==============================================================================
 import tiktoken
-encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str="cl100k_base"):
+    """Returns the tiktoken encoder, built once per encoding name."""
+    return tiktoken.get_encoding(encoding_name)
+
 def token_count(string: str, encoding_name: str="cl100k_base") -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
+    num_tokens = len(get_encoding(encoding_name).encode(string))
     return num_tokens
\ No newline at end of file
@@ -0,0 +1,72 @@
+from llama_index.bridge.pydantic import Field
+from llama_index.schema import TextNode, NodeRelationship, RelatedNodeInfo
+from llama_index.vector_stores import QdrantVectorStore
+from llama_index.vector_stores.types import VectorStoreQueryResult
+from llama_index.vector_stores.utils import metadata_dict_to_node
+
+# Keys of a lean payload besides the copied metadata fields
+LEAN_FIELDS = ['text', 'doc_id', 'start_char_idx', 'end_char_idx']
+# Metadata copied as native payload keys, so they can be filtered and indexed
+# (`aliases` and `alias_count` are only set on chunks that absorbed duplicates, see core.ingestion.dedup)
+DEFAULT_METADATA_FIELDS = ['file_path', 'file_name', 'page_label', 'aliases', 'alias_count']
+# Metadata kept out of the LLM prompt and the embedded text, as SimpleDirectoryReader does
+EXCLUDED_METADATA_KEYS = ['file_name', 'aliases', 'alias_count']
+# Payload keys indexed at collection creation ({key: Qdrant payload schema}), the usual filter fields
+PAYLOAD_INDEX_FIELDS = {'file_path': 'keyword', 'file_name': 'keyword', 'doc_id': 'keyword', 'page_label': 'keyword'}
+# Projection that builds prompt context from either payload layout (lean or llama_index `_node_content`)
+CONTEXT_FIELDS = LEAN_FIELDS + ['_node_content']
+
+def lean_payload(node, metadata_fields:list=DEFAULT_METADATA_FIELDS) -> dict:
+    """Payload with the chunk text, source document id, character offsets and selected metadata only."""
+    payload = {
+        'text': node.get_content(),
+        'doc_id': node.ref_doc_id,
+        'start_char_idx': node.start_char_idx,
+        'end_char_idx': node.end_char_idx,
+    }
+    for key in metadata_fields:
+        if key in node.metadata:
+            payload[key] = node.metadata[key]
+    return payload
+
+def node_from_lean_payload(point_id, payload:dict, metadata_fields:list=DEFAULT_METADATA_FIELDS) -> TextNode:
+    relationships = {}
+    if payload.get('doc_id') is not None:
+        relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=payload['doc_id'])
+    return TextNode(
+        id_=str(point_id),
+        text=payload.get('text', ''),
+        metadata={key: payload[key] for key in metadata_fields if key in payload},
+        excluded_embed_metadata_keys=EXCLUDED_METADATA_KEYS,
+        excluded_llm_metadata_keys=EXCLUDED_METADATA_KEYS,
+        start_char_idx=payload.get('start_char_idx'),
+        end_char_idx=payload.get('end_char_idx'),
+        relationships=relationships,
+    )
+
+class LeanQdrantVectorStore(QdrantVectorStore):
+    """
+    QdrantVectorStore writing lean payloads instead of the serialized node in `_node_content`
+    (relationships, templates and every metadata key as one JSON string). Points written by the
+    stock store are still read, so a collection can be migrated file by file.
+    """
+    metadata_fields: list = Field(default_factory=lambda: list(DEFAULT_METADATA_FIELDS))
+
+    def _build_points(self, nodes:list):
+        points, ids = super()._build_points(nodes)
+        for point, node in zip(points, nodes):
+            point.payload = lean_payload(node, self.metadata_fields)
+        return points, ids
+
+    def parse_to_query_result(self, response:list) -> VectorStoreQueryResult:
+        nodes, similarities, ids = [], [], []
+        for point in response:
+            payload = point.payload or {}
+            if '_node_content' in payload:
+                node = metadata_dict_to_node(payload)
+            else:
+                node = node_from_lean_payload(point.id, payload, self.metadata_fields)
+            nodes.append(node)
+            similarities.append(point.score)
+            ids.append(str(point.id))
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
@@ -1,41 +1,470 @@
+import os, json, threading
 from qdrant_client import QdrantClient
 from qdrant_client.local.qdrant_local import QdrantLocal
 from qdrant_client.http import models
+from core.connector.numpy_store import NumpyVectorStore
+from core.connector.bulk import BulkLoader
+from core.connector.snapshot import export_snapshot
+from core.connector.bm25 import BM25Index, fuse_scores
+from core.connector.payload import PAYLOAD_INDEX_FIELDS
+from core.monitoring import tracing
+
+# Named collection profiles, see resolve_profile. Quantized profiles keep the small codes in RAM
+# and the original float32 vectors on disk, which are only read to rescore the oversampled candidates.
+COLLECTION_PROFILES = {
+    "default": {},
+    "on_disk": {"on_disk": True},
+    "int8": {"quantization": "int8", "on_disk": True, "oversampling": 2.0},
+    "binary": {"quantization": "binary", "on_disk": True, "oversampling": 3.0},
+}
+PROFILE_DEFAULTS = {
+    "quantization": None, # None, "int8" or "binary"
+    "quantile": 0.99, # int8 only: values beyond this quantile are clipped
+    "always_ram": True, # keep the quantized codes in RAM
+    "on_disk": False, # keep the original vectors on disk
+    "hnsw_m": 16,
+    "hnsw_ef_construct": 100,
+    "hnsw_ef": 128, # search-time beam width
+    "oversampling": 1.0, # candidates fetched from the codes = limit * oversampling
+    "rescore": True, # rescore the candidates with the original vectors
+}
+
+def resolve_profile(profile="default") -> dict:
+    """A profile name, or a dict of PROFILE_DEFAULTS overrides with an optional "base" profile name."""
+    if isinstance(profile, str):
+        profile = {"base": profile}
+    profile = dict(profile)
+    resolved = dict(PROFILE_DEFAULTS, **COLLECTION_PROFILES[profile.pop("base", "default")])
+    resolved.update(profile)
+    return resolved
+
+def estimate_memory(n_vectors:int, embedding_size:int, profile="default") -> dict:
+    """
+    Rough RAM and disk footprint of a collection, following Qdrant's sizing guide: original vectors,
+    quantized codes and the HNSW graph (2 * m links of 4 bytes per vector on level 0).
+    """
+    profile = resolve_profile(profile)
+    vector_bytes = n_vectors * embedding_size * 4
+    code_bytes = 0
+    if profile["quantization"] == "int8":
+        code_bytes = n_vectors * embedding_size
+    elif profile["quantization"] == "binary":
+        code_bytes = n_vectors * ((embedding_size + 7) // 8)
+    graph_bytes = n_vectors * profile["hnsw_m"] * 2 * 4
+    ram_bytes = graph_bytes + (code_bytes if profile["always_ram"] else 0) + (0 if profile["on_disk"] else vector_bytes)
+    return {"ram_bytes": ram_bytes, "disk_bytes": vector_bytes + code_bytes + graph_bytes,
+            "vector_bytes": vector_bytes, "code_bytes": code_bytes, "graph_bytes": graph_bytes}
+
+def payload_text(payload:dict, text_field:str="text") -> str:
+    """Text of a point: the `text_field` payload key, or the text inside a llama_index `_node_content`."""
+    if payload is None:
+        return ""
+    if text_field in payload:
+        return payload[text_field] or ""
+    if "_node_content" in payload:
+        return json.loads(payload["_node_content"]).get("text", "")
+    return ""
+
+def build_filter(filters) -> models.Filter:
+    """
+    A Qdrant Filter from {payload key: condition}, all conditions required. A condition is a value
+    (exact match), a list (match any) or a dict of "gt", "gte", "lt", "lte" bounds (range), e.g.
+    {"file_name": "report.pdf", "block": ["15-1", "15-2"], "year": {"gte": 2020}}.
+    None and models.Filter pass through unchanged.
+    """
+    if filters is None or isinstance(filters, models.Filter):
+        return filters
+    must = []
+    for key, condition in filters.items():
+        if isinstance(condition, dict):
+            must.append(models.FieldCondition(key=key, range=models.Range(**condition)))
+        elif isinstance(condition, (list, tuple, set)):
+            must.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(condition))))
+        else:
+            must.append(models.FieldCondition(key=key, match=models.MatchValue(value=condition)))
+    return models.Filter(must=must)
 
 class MyQdrant():
-    def __init__(self, qdrant_url:str=None, qdrant_api_key:str=None, local_location:str=None):
+    def __init__(self, qdrant_url:str=None, qdrant_api_key:str=None, local_location:str=None, 
+                 local_backend:str="qdrant", profile_path:str=None):
+        """
+        local_backend: "qdrant" uses QdrantLocal, "numpy" uses the memory-mapped NumpyVectorStore,
+        which opens instantly and searches with one matrix product (exact search, COSINE/DOT only).
+        profile_path: JSON file keeping the profile of each collection, so every process opening it
+        searches with the same settings; `<local_location>/profiles.json` by default. The numpy backend
+        keeps the profile in the collection's config.json instead.
+        """
         if local_location==None:
             self.client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+        elif local_backend == "numpy":
+            self.client = NumpyVectorStore(location=local_location)
         else:
             self.client = QdrantLocal(location=local_location)
-    def create_collection(self, collection_name:str, embedding_size:int=1536):
+        self.keyword_indexes = {} # collection_name -> BM25Index, see enable_keyword_index
+        self.keyword_index_paths = {}
+        self._keyword_lock = threading.Lock()
+        self.deduplicators = {} # collection_name -> ChunkDeduplicator, see attach_deduplicator
+        self.search_params = {} # collection_name -> models.SearchParams of its profile, see load_profile
+        self.profile_path = profile_path or (os.path.join(local_location, 'profiles.json') if local_location else None)
+        self._profile_lock = threading.Lock()
+
+    def _collection_config(self, embedding_size:int, profile) -> dict:
+        profile = resolve_profile(profile)
+        quantization_config = None
+        if profile["quantization"] == "int8":
+            quantization_config = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=profile["quantile"], always_ram=profile["always_ram"]))
+        elif profile["quantization"] == "binary":
+            quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+                always_ram=profile["always_ram"]))
+        return dict(
+            vectors_config=models.VectorParams(size=embedding_size, distance=models.Distance.COSINE,
+                                               on_disk=profile["on_disk"]),
+            hnsw_config=models.HnswConfigDiff(m=profile["hnsw_m"], ef_construct=profile["hnsw_ef_construct"]),
+            quantization_config=quantization_config,
+        )
+
+    def _apply_profile(self, collection_name:str, profile:dict):
+        quantization = None
+        if profile["quantization"] is not None:
+            quantization = models.QuantizationSearchParams(rescore=profile["rescore"],
+                                                           oversampling=profile["oversampling"])
+        self.search_params[collection_name] = models.SearchParams(hnsw_ef=profile["hnsw_ef"],
+                                                                  quantization=quantization)
+
+    def _read_profiles(self) -> dict:
+        if self.profile_path is None or not os.path.exists(self.profile_path):
+            return {}
+        with open(self.profile_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_profile(self, collection_name:str, profile:dict):
+        if isinstance(self.client, NumpyVectorStore):
+            self.client.get_collection(collection_name).set_config('profile', profile)
+            return
+        if self.profile_path is None:
+            return
+        with self._profile_lock:
+            profiles = self._read_profiles()
+            if profile is None:
+                profiles.pop(collection_name, None)
+            else:
+                profiles[collection_name] = profile
+            tmp_path = self.profile_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profiles, f, indent=2)
+            os.replace(tmp_path, self.profile_path)
+
+    def use_profile(self, collection_name:str, profile="default"):
+        """
+        Sets the search-time part of a profile (hnsw_ef, oversampling, rescore) for an existing collection,
+        and saves it with the collection so other processes search with it too.
+        """
+        profile = resolve_profile(profile)
+        self._apply_profile(collection_name, profile)
+        self._save_profile(collection_name, profile)
+
+    def load_profile(self, collection_name:str) -> dict:
+        """
+        The saved profile of a collection. A collection created without one (older code, another client)
+        gets the defaults of the COLLECTION_PROFILES entry matching its quantization, with a warning.
+        """
+        if isinstance(self.client, NumpyVectorStore):
+            config = self.client.get_collection(collection_name).config
+            profile, quantization = config.get('profile'), config.get('quantization')
+        else:
+            profile = self._read_profiles().get(collection_name)
+            quantization = None
+            if profile is None:
+                quantization_config = self.client.get_collection(collection_name).config.quantization_config
+                if isinstance(quantization_config, models.ScalarQuantization):
+                    quantization = "int8"
+                elif isinstance(quantization_config, models.BinaryQuantization):
+                    quantization = "binary"
+        if profile is None:
+            profile = resolve_profile(quantization or "default")
+            if quantization is not None:
+                print(f"No saved profile for collection {collection_name}, searching with the {quantization} profile defaults")
+        return profile
+
+    def get_search_params(self, collection_name:str) -> models.SearchParams:
+        """SearchParams of the collection's profile, loaded on first use."""
+        if collection_name not in self.search_params:
+            self._apply_profile(collection_name, self.load_profile(collection_name))
+        return self.search_params[collection_name]
+
+    def create_collection(self, collection_name:str, embedding_size:int=1536, profile="default",
+                          payload_indexes:dict=PAYLOAD_INDEX_FIELDS):
+        """
+        profile is a COLLECTION_PROFILES name ("default", "on_disk", "int8", "binary") or a dict of
+        PROFILE_DEFAULTS overrides, e.g. {"base": "int8", "hnsw_m": 32, "oversampling": 3.0}.
+        payload_indexes maps the payload keys used in filters to their schema ("keyword", "integer", ...).
+        """
         try:
             self.client.create_collection(
                     collection_name=collection_name,
-                    vectors_config=models.VectorParams(size=embedding_size, distance=models.Distance.COSINE),
+                    **self._collection_config(embedding_size, profile),
                 )
             print(f"Collection {collection_name} created")
         except:
+            # An existing collection keeps the profile it was created with
             pass
+        else:
+            self.use_profile(collection_name, profile)
+        self.create_payload_indexes(collection_name, payload_indexes)
 
-    def recreate_collection(self, collection_name:str, embedding_size:int=1536):
+    def recreate_collection(self, collection_name:str, embedding_size:int=1536, profile="default",
+                            payload_indexes:dict=PAYLOAD_INDEX_FIELDS):
         self.client.recreate_collection(
                     collection_name=collection_name,
-                    vectors_config=models.VectorParams(size=embedding_size, distance=models.Distance.COSINE),
+                    **self._collection_config(embedding_size, profile),
                 )
         print(f"Collection {collection_name} recreated")
+        if collection_name in self.deduplicators:
+            self.deduplicators[collection_name].clear()
+        self.use_profile(collection_name, profile)
+        self.create_payload_indexes(collection_name, payload_indexes)
+
+    def create_payload_indexes(self, collection_name:str, payload_indexes:dict):
+        """
+        Indexes the filter fields {payload key: schema}, so filtered searches only visit matching points.
+        Creating an existing index is a no-op. QdrantLocal has no payload indexes (it scans), the numpy
+        backend keeps a list of rows per field value.
+        """
+        if not payload_indexes or isinstance(self.client, QdrantLocal):
+            return
+        for field_name, field_schema in payload_indexes.items():
+            self.client.create_payload_index(collection_name, field_name=field_name,
+                                             field_schema=models.PayloadSchemaType(field_schema))
 
     def delete_collection(self, collection_name:str):
         self.client.delete_collection(collection_name=collection_name)
+        if collection_name in self.deduplicators:
+            self.deduplicators[collection_name].clear()
+        self.search_params.pop(collection_name, None)
+        if not isinstance(self.client, NumpyVectorStore):
+            self._save_profile(collection_name, None)
 
     def count_data(self, collection_name:str):
         return self.client.count(collection_name=collection_name)
 
     def upsert_data(self, points:list, collection_name:str):
-        self.client.upsert(collection_name=collection_name, points=points)
+        with tracing.span("qdrant.upsert", collection=collection_name, batch_size=len(points)):
+            self.client.upsert(collection_name=collection_name, points=points)
+        self._index_keywords(collection_name, [(point.id, point.payload) for point in points])
+        if self.keyword_index_paths.get(collection_name):
+            self.save_keyword_index(collection_name)
+
+    def delete_data(self, point_ids:list, collection_name:str):
+        self.client.delete(collection_name=collection_name, points_selector=models.PointIdsList(points=point_ids))
+        if collection_name in self.keyword_indexes:
+            with self._keyword_lock:
+                for point_id in point_ids:
+                    self.keyword_indexes[collection_name].delete(point_id)
+            if self.keyword_index_paths.get(collection_name):
+                self.save_keyword_index(collection_name)
+        if collection_name in self.deduplicators:
+            self.deduplicators[collection_name].forget(point_ids)
+
+    def delete_file_data(self, collection_name:str, file_path:str) -> list:
+        """
+        Deletes the points of one source file, e.g. before re-ingesting it. With an attached deduplicator
+        returns the other files whose duplicate chunks pointed at the deleted ones (see ChunkDeduplicator.forget).
+        """
+        point_ids = [point_id for point_id, _, _ in self.iter_points(
+            collection_name, batch_size=1024, with_payload=False, filters={'file_path': file_path})]
+        orphaned = []
+        if collection_name in self.deduplicators:
+            orphaned = self.deduplicators[collection_name].forget_file(file_path)
+        self.delete_data(point_ids, collection_name)
+        return orphaned
+
+    def attach_deduplicator(self, collection_name:str, deduplicator):
+        """
+        Keeps a ChunkDeduplicator index in step with the collection: deleted points are forgotten and
+        deleting or recreating the collection clears it, so re-ingested chunks are not dropped as duplicates
+        of points that no longer exist.
+        """
+        self.deduplicators[collection_name] = deduplicator
+
+    def set_payload_data(self, collection_name:str, payload:dict, point_ids:list):
+        """Merges payload into the payloads of the given points."""
+        self.client.set_payload(collection_name=collection_name, payload=payload, points=point_ids)
+
+    def bulk_upsert(self, items, collection_name:str, batch_size:int=256, parallel:int=4,
+                    max_retries:int=3, show_progress:bool=False) -> dict:
+        """
+        Upserts any iterable or generator of (id, vector, payload) in batches with bounded memory.
+        Batches go to a server in parallel; local stores are written by a single worker.
+        Returns the BulkLoader throughput report.
+        """
+        def send(batch):
+            points = [
+                models.PointStruct(id=point_id, vector=vector.tolist() if hasattr(vector, "tolist") else vector,
+                                   payload=payload)
+                for point_id, vector, payload in batch
+            ]
+            with tracing.span("qdrant.upsert", collection=collection_name, batch_size=len(points)):
+                self.client.upsert(collection_name=collection_name, points=points, wait=True)
+            self._index_keywords(collection_name, [(point.id, point.payload) for point in points])
+
+        if not isinstance(self.client, QdrantClient):
+            parallel = 1
+        loader = BulkLoader(tracing.bind(send), batch_size=batch_size, parallel=parallel, max_retries=max_retries)
+        with tracing.span("qdrant.bulk_upsert", collection=collection_name) as span:
+            report = loader.load(items, show_progress=show_progress)
+            span.set(items=report['items'], batches=report['batches'])
+        if self.keyword_index_paths.get(collection_name):
+            self.save_keyword_index(collection_name)
+        return report
+
+    def enable_keyword_index(self, collection_name:str, index_path:str=None, rebuild:bool=False):
+        """
+        Attaches a local BM25 index to the collection, kept up to date (and saved to `index_path`) by
+        upsert_data, bulk_upsert and delete_data. It is loaded from `index_path` when that file exists, otherwise built once from
+        the texts already in the collection. Enables hybrid_search.
+        """
+        if index_path is not None and os.path.exists(index_path) and not rebuild:
+            index = BM25Index.load(index_path)
+        else:
+            index = BM25Index()
+            existing = [collection.name for collection in self.client.get_collections().collections]
+            if collection_name in existing:
+                index.add_many((point_id, payload_text(payload))
+                               for point_id, _, payload in self.iter_points(collection_name, batch_size=1024))
+        self.keyword_indexes[collection_name] = index
+        self.keyword_index_paths[collection_name] = index_path
+        if index_path is not None:
+            self.save_keyword_index(collection_name)
+        return index
+
+    def save_keyword_index(self, collection_name:str):
+        with self._keyword_lock:
+            self.keyword_indexes[collection_name].save(self.keyword_index_paths[collection_name])
+
+    def _index_keywords(self, collection_name:str, points:list):
+        index = self.keyword_indexes.get(collection_name)
+        if index is None:
+            return
+        with self._keyword_lock:
+            for point_id, payload in points:
+                index.add(point_id, payload_text(payload))
 
     def scroll_data(self, collection_name:str):
         return self.client.scroll(collection_name)
+
+    def iter_points(self, collection_name:str, batch_size:int=256, with_payload=True, with_vectors:bool=False,
+                    filters=None):
+        """
+        Walks the whole collection page by page, yielding (id, vector, payload).
+        with_payload can be a list of payload keys to project; vector is None unless with_vectors.
+        filters: only the matching points, as in build_filter.
+        """
+        offset = None
+        while True:
+            records, offset = self.client.scroll(collection_name, limit=batch_size, offset=offset,
+                                                 with_payload=with_payload, with_vectors=with_vectors,
+                                                 scroll_filter=build_filter(filters))
+            for record in records:
+                yield record.id, record.vector, record.payload
+            if offset is None:
+                return
+
+    def retrieve_data(self, collection_name:str, point_ids:list, with_payload=True, with_vectors:bool=False):
+        """Points by id; with_payload as in search_data."""
+        return self.client.retrieve(collection_name, ids=point_ids, with_payload=with_payload, with_vectors=with_vectors)
+
+    def export_snapshot(self, collection_name:str, out_dir:str, with_payload=True, batch_size:int=256) -> dict:
+        """Streams the collection into a vectors.npy + payloads.jsonl snapshot (see core.connector.snapshot)."""
+        return export_snapshot(
+            self.iter_points(collection_name, batch_size=batch_size, with_payload=with_payload, with_vectors=True),
+            out_dir,
+        )
     
-    def search_data(self, collection_name:str, query_vector:list, top_k:int=10):
-        return self.client.search(collection_name, query_vector, limit=top_k)
\ No newline at end of file
+    def search_data(self, collection_name:str, query_vector:list, top_k:int=10, with_payload=True,
+                    with_vectors:bool=False, filters=None):
+        """
+        with_payload is True, False or a list of payload keys to return (e.g. payload.CONTEXT_FIELDS).
+        filters restricts the search to matching points, a models.Filter or a dict (see build_filter).
+        """
+        with tracing.span("qdrant.search", collection=collection_name, top_k=top_k, filtered=filters is not None):
+            return self.client.search(collection_name, query_vector, limit=top_k, query_filter=build_filter(filters),
+                                      search_params=self.get_search_params(collection_name),
+                                      with_payload=with_payload, with_vectors=with_vectors)
+
+    def hybrid_search(self, collection_name:str, query:str, query_vector:list, top_k:int=10,
+                      alpha:float=0.5, fusion:str="relative_score", candidates:int=None, with_payload=True,
+                      filters=None):
+        """
+        Keyword + vector search over a collection with an enabled keyword index, fused like Weaviate's
+        hybrid query: alpha=1 is pure vector, alpha=0 pure BM25, fusion is "relative_score" or "ranked".
+        With filters (see build_filter), keyword hits outside the filter are dropped before fusion.
+        Returns ScoredPoints carrying the fused score.
+        """
+        candidates = candidates or 4 * top_k
+        query_filter = build_filter(filters)
+        with tracing.span("qdrant.search", collection=collection_name, top_k=candidates):
+            vector_hits = self.client.search(collection_name, query_vector, limit=candidates, query_filter=query_filter,
+                                             search_params=self.get_search_params(collection_name),
+                                             with_payload=with_payload) if alpha > 0 else []
+        with tracing.span("bm25.search", collection=collection_name, top_k=candidates), self._keyword_lock:
+            keyword_hits = self.keyword_indexes[collection_name].search(query, candidates) if alpha < 1 else []
+        if query_filter is not None and keyword_hits:
+            allowed = self._filter_ids(collection_name, query_filter, [point_id for point_id, _ in keyword_hits])
+            keyword_hits = [(point_id, score) for point_id, score in keyword_hits if point_id in allowed]
+        fused = fuse_scores([(hit.id, hit.score) for hit in vector_hits], keyword_hits, alpha, fusion)[:top_k]
+
+        payloads = {hit.id: hit.payload for hit in vector_hits}
+        missing = [point_id for point_id, _ in fused if point_id not in payloads]
+        if missing:
+            payloads.update((record.id, record.payload)
+                            for record in self.client.retrieve(collection_name, missing, with_payload=with_payload))
+        return [models.ScoredPoint(id=point_id, version=0, score=score, payload=payloads.get(point_id))
+                for point_id, score in fused]
+
+    def _filter_ids(self, collection_name:str, query_filter:models.Filter, point_ids:list) -> set:
+        """The ids among point_ids that match query_filter, answered by the store in one scroll."""
+        records, _ = self.client.scroll(collection_name, limit=len(point_ids), with_payload=False,
+                                        scroll_filter=models.Filter(must=[
+                                            query_filter, models.HasIdCondition(has_id=point_ids)]))
+        return {record.id for record in records}
+
+    def search_batch(self, collection_name:str, query_vectors:list, top_k:int=10, filters=None,
+                     search_params:models.SearchParams=None, with_payload=True, with_vectors:bool=False):
+        """
+        Searches many query vectors in one call and returns one list of hits per query, in order.
+        A server receives a single batched request; the local backends score all queries together.
+        search_params defaults to the collection's profile. filters applies to every query (see build_filter).
+        """
+        filters = build_filter(filters)
+        search_params = search_params or self.get_search_params(collection_name)
+        with tracing.span("qdrant.search_batch", collection=collection_name, top_k=top_k, batch_size=len(query_vectors)):
+            if isinstance(self.client, NumpyVectorStore):
+                return self.client.search_batch(collection_name, query_vectors, limit=top_k, query_filter=filters,
+                                                search_params=search_params, with_payload=with_payload,
+                                                with_vectors=with_vectors)
+            requests = [
+                models.SearchRequest(vector=[float(x) for x in query_vector], limit=top_k, filter=filters,
+                                     with_payload=with_payload, with_vector=with_vectors, params=search_params)
+                for query_vector in query_vectors
+            ]
+            return self.client.search_batch(collection_name, requests)
+
+    def recall_report(self, collection_name:str, query_vectors:list, top_k:int=10, profile=None) -> dict:
+        """
+        Recall@k of the collection's search settings against exact full-precision search on the same
+        collection. Adds the estimated footprint of `profile` under "estimated" when given, and the
+        measured sizes on the numpy backend under "measured" (its count includes tombstoned rows).
+        """
+        exact_params = models.SearchParams(exact=True, quantization=models.QuantizationSearchParams(ignore=True))
+        approximate = self.search_batch(collection_name, query_vectors, top_k, with_payload=False)
+        exact = self.search_batch(collection_name, query_vectors, top_k, search_params=exact_params, with_payload=False)
+        recalls = [len({hit.id for hit in found} & {hit.id for hit in expected}) / max(len(expected), 1)
+                   for found, expected in zip(approximate, exact)]
+        count = self.client.count(collection_name=collection_name).count
+        report = {"collection": collection_name, "count": count, f"recall_at_{top_k}": sum(recalls) / len(recalls)}
+        if profile is not None:
+            report["estimated"] = estimate_memory(count, len(query_vectors[0]), profile)
+        if isinstance(self.client, NumpyVectorStore):
+            report["measured"] = self.client.get_collection(collection_name).memory_report()
+        return report
\ No newline at end of file
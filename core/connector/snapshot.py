@@ -0,0 +1,61 @@
+import os, json, struct
+import numpy as np
+
+# Fixed size of the .npy preamble + header, so the shape can be rewritten in place once known
+NPY_HEADER_SIZE = 128
+
+def _npy_header(shape:tuple) -> bytes:
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': %r, }" % (shape,)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+def export_snapshot(items, out_dir:str) -> dict:
+    """
+    Writes an iterable of (id, vector, payload) to a columnar snapshot directory:
+        vectors.npy    - float32 (n, dim) matrix, loadable with np.load(..., mmap_mode='r')
+        ids.jsonl      - one point id per line, row-aligned with vectors.npy
+        payloads.jsonl - one payload per line, row-aligned with vectors.npy
+        meta.json      - count and dim
+    Items are streamed to disk, so memory use does not depend on the collection size.
+    Vectors may be None (exported without vectors), in which case vectors.npy is not written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    vectors_path = os.path.join(out_dir, "vectors.npy")
+    count, dim = 0, None
+    with open(vectors_path, "wb") as vector_file, \
+         open(os.path.join(out_dir, "ids.jsonl"), "w", encoding="utf-8") as id_file, \
+         open(os.path.join(out_dir, "payloads.jsonl"), "w", encoding="utf-8") as payload_file:
+        vector_file.write(_npy_header((0, 0)))
+        for point_id, vector, payload in items:
+            if vector is not None:
+                vector = np.asarray(vector, dtype="<f4")
+                if dim is None:
+                    dim = len(vector)
+                vector_file.write(vector.tobytes())
+            id_file.write(json.dumps(point_id) + "\n")
+            payload_file.write(json.dumps(payload or {}, ensure_ascii=False) + "\n")
+            count += 1
+        vector_file.seek(0)
+        vector_file.write(_npy_header((count, dim or 0)))
+    if dim is None:
+        os.remove(vectors_path)
+
+    meta = {"count": count, "dim": dim}
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+def load_snapshot_vectors(snapshot_dir:str) -> np.ndarray:
+    """Memory-maps the snapshot's vectors without reading them into RAM."""
+    return np.load(os.path.join(snapshot_dir, "vectors.npy"), mmap_mode="r")
+
+def iter_snapshot(snapshot_dir:str):
+    """Yields (id, vector, payload) back from a snapshot, e.g. to feed MyQdrant.bulk_upsert."""
+    vectors = None
+    if os.path.exists(os.path.join(snapshot_dir, "vectors.npy")):
+        vectors = load_snapshot_vectors(snapshot_dir)
+    with open(os.path.join(snapshot_dir, "ids.jsonl"), encoding="utf-8") as id_file, \
+         open(os.path.join(snapshot_dir, "payloads.jsonl"), encoding="utf-8") as payload_file:
+        for row, (id_line, payload_line) in enumerate(zip(id_file, payload_file)):
+            vector = None if vectors is None else np.array(vectors[row])
+            yield json.loads(id_line), vector, json.loads(payload_line)
@@ -0,0 +1,99 @@
+import time, asyncio
+
+class _StreamMetrics():
+    def __init__(self, start:float=None):
+        self.start = time.perf_counter() if start is None else start
+        self.first_token_at = None
+        self.finished_at = None
+        self.n_tokens = 0
+        self._parts = []
+
+    def _record(self, delta:str):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        # OpenAI streams roughly one token per delta
+        self.n_tokens += 1
+        self._parts.append(delta)
+
+    def _finish(self):
+        if self.finished_at is None:
+            self.finished_at = time.perf_counter()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def time_to_first_token(self) -> float:
+        """Seconds from the call until the first token arrived, None before the first token."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.start
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Generation rate after the first token, None until the stream is exhausted."""
+        if self.finished_at is None or self.first_token_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return self.n_tokens / elapsed if elapsed > 0 else float(self.n_tokens)
+
+    def stats(self) -> dict:
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "tokens_per_second": self.tokens_per_second,
+            "n_tokens": self.n_tokens,
+            "total_time": None if self.finished_at is None else self.finished_at - self.start,
+        }
+
+class TokenStream(_StreamMetrics):
+    """
+    Iterator over the text deltas of a streamed completion.
+    Time-to-first-token is measured from `start` (the moment the call was made), and the
+    full answer is available as `text` once the stream is exhausted.
+    """
+    def __init__(self, deltas, start:float=None, source_nodes:list=None):
+        super().__init__(start)
+        self._deltas = iter(deltas)
+        self.source_nodes = source_nodes or []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            delta = next(self._deltas)
+        except StopIteration:
+            self._finish()
+            raise
+        self._record(delta)
+        return delta
+
+class AsyncTokenStream(_StreamMetrics):
+    """Async counterpart of TokenStream, used with `async for`."""
+    def __init__(self, deltas, start:float=None, source_nodes:list=None):
+        super().__init__(start)
+        self._deltas = deltas.__aiter__()
+        self.source_nodes = source_nodes or []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            delta = await self._deltas.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        self._record(delta)
+        return delta
+
+async def iterate_in_thread(iterator):
+    """Turns a blocking iterator into an async generator without blocking the event loop."""
+    done = object()
+    iterator = iter(iterator)
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
@@ -1,5 +1,8 @@
 import os, weaviate
 import weaviate.classes as wvc
+from core.connector.bulk import BulkLoader
+from core.connector.snapshot import export_snapshot
+from core.monitoring import tracing
 from weaviate.classes.aggregate import GroupByAggregate
 from weaviate.classes.config import (
     Property, 
@@ -104,6 +107,44 @@ class WVCollection(ClientWeaviate):
             # references=wvc.data.Reference("f81bfe5e-16ba-4615-a516-46c2ae2e5a80"),  # If you want to add a reference (if configured in the collection definition)
         )
 
+    def bulk_insert(self, items, batch_size:int=100, parallel:int=2, max_retries:int=3, show_progress:bool=False):
+        """
+        Inserts any iterable or generator of (uuid, vector, properties) through Weaviate's batch endpoint
+        with bounded memory and parallel, retried batches. Returns the BulkLoader throughput report.
+        """
+        def send(batch):
+            with tracing.span("weaviate.insert_many", collection=self.collection_name, batch_size=len(batch)):
+                result = self.collection.data.insert_many([
+                    wvc.data.DataObject(uuid=obj_uuid, properties=properties,
+                                        vector=vector.tolist() if hasattr(vector, "tolist") else vector)
+                    for obj_uuid, vector, properties in batch
+                ])
+            if result.has_errors:
+                # Objects are keyed by uuid, so retrying the whole batch is safe
+                raise RuntimeError(f"{len(result.errors)} objects failed: {next(iter(result.errors.values()))}")
+
+        loader = BulkLoader(tracing.bind(send), batch_size=batch_size, parallel=parallel, max_retries=max_retries)
+        with tracing.span("weaviate.bulk_insert", collection=self.collection_name) as span:
+            report = loader.load(items, show_progress=show_progress)
+            span.set(items=report['items'], batches=report['batches'])
+        self.total_count = self.collection.aggregate.over_all(total_count=True).total_count
+        return report
+
+    def iter_objects(self, properties:list=None, with_vectors:bool=False):
+        """
+        Walks the whole collection with Weaviate's cursor-based iterator, yielding (uuid, vector, properties).
+        properties selects which properties to return (all if None).
+        """
+        for obj in self.collection.iterator(include_vector=with_vectors, return_properties=properties):
+            vector = obj.vector
+            if isinstance(vector, dict):
+                vector = vector.get("default")
+            yield str(obj.uuid), vector, obj.properties
+
+    def export_snapshot(self, out_dir:str, properties:list=None) -> dict:
+        """Streams the collection into a vectors.npy + payloads.jsonl snapshot (see core.connector.snapshot)."""
+        return export_snapshot(self.iter_objects(properties=properties, with_vectors=True), out_dir)
+
     def get_object_by_id(self, obj_uuid):
         return self.collection.query.fetch_object_by_id(uuid=obj_uuid)
         
@@ -132,15 +173,16 @@ class WVCollection(ClientWeaviate):
                auto_limit:int=1, 
                filters:wvc.query.Filter=None, 
                ):
-        return self.collection.query.hybrid(
-            query=user_query,
-            # query_properties=["question^2", "answer"], #Specify properties to keyword search - '^2' is a boost/weight factor
-            vector=query_vector,
-            limit=limit,
-            alpha=alpha, #Balance keyword and vector search, 1 is a pure vector search, 0 is a pure keyword search
-            fusion_type=wvc.query.HybridFusion.RELATIVE_SCORE, #Change the ranking method - "RANKED" or "RELATIVE_SCORE
-            # auto_limit=auto_limit, #Limit results to groups with similar distances from the query,
-            filters=filters,
-            # filters=wvc.query.Filter.by_property("round").contains_any(["Double Jeopardy!"]), #https://weaviate.io/developers/weaviate/api/graphql/filters#filter-structure
-            return_metadata=wvc.query.MetadataQuery(score=True, explain_score=True),
-        )
\ No newline at end of file
+        with tracing.span("weaviate.search", collection=self.collection_name, limit=limit):
+            return self.collection.query.hybrid(
+                query=user_query,
+                # query_properties=["question^2", "answer"], #Specify properties to keyword search - '^2' is a boost/weight factor
+                vector=query_vector,
+                limit=limit,
+                alpha=alpha, #Balance keyword and vector search, 1 is a pure vector search, 0 is a pure keyword search
+                fusion_type=wvc.query.HybridFusion.RELATIVE_SCORE, #Change the ranking method - "RANKED" or "RELATIVE_SCORE
+                # auto_limit=auto_limit, #Limit results to groups with similar distances from the query,
+                filters=filters,
+                # filters=wvc.query.Filter.by_property("round").contains_any(["Double Jeopardy!"]), #https://weaviate.io/developers/weaviate/api/graphql/filters#filter-structure
+                return_metadata=wvc.query.MetadataQuery(score=True, explain_score=True),
+            )
\ No newline at end of file
@@ -1,42 +1,41 @@
-import os, json
+import os, json, time
 from core.connector.open_ai import MyOAI
 from core.connector.qdrantdb import MyQdrant
+from core.connector.embedding_cache import EmbeddingCache
+from core.connector.payload import CONTEXT_FIELDS
+from core.rag.context import ContextPacker, REFERENCES_PROMPT, format_references as pack_references
 from dotenv import load_dotenv
 load_dotenv()
 
 QDRANT_DB_PATH='database'
 COLLECTION_NAME='tndksh'
+EMBEDDING_CACHE_PATH='database/embedding_cache.sqlite'
+CONTEXT_TOKEN_BUDGET=3000
 OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 
 #Check and Delete file "database/.lock"
 if os.path.exists(QDRANT_DB_PATH + '/.lock'):
     os.remove(QDRANT_DB_PATH + '/.lock')
 
-OAIClient = MyOAI(api_key=OPENAI_API_KEY)
+OAIClient = MyOAI(api_key=OPENAI_API_KEY, cache=EmbeddingCache(EMBEDDING_CACHE_PATH))
 QDClient = MyQdrant(local_location=QDRANT_DB_PATH)
+Packer = ContextPacker(token_budget=CONTEXT_TOKEN_BUDGET)
 
-PROMPT = """
-References information is below.\n---------------------\n{context_str}\n---------------------\n
-Using both the references information and also using your own knowledge, answer the question: 
-{query_str}\n
-If the context isn't helpful, you must answer that you dont know.\n
-Always answer in Vietnamese.
-"""
+PROMPT = REFERENCES_PROMPT
 
-def retrieve_references(query:str):
+def retrieve_references(query:str, query_vector:list=None):
+    if query_vector is None:
+        query_vector = OAIClient.get_embedding(query)
     search_res = QDClient.search_data(
         collection_name=COLLECTION_NAME,
-        query_vector=OAIClient.get_embedding(query),
+        query_vector=query_vector,
         top_k=3,
+        with_payload=CONTEXT_FIELDS,
     )
-    references = ""
-    references_list = []
-    for i, item in enumerate(search_res):
-        node = json.loads(item.payload['_node_content'])
-        node_content = node['text'].replace('\n', ' ')
-        references += f"Reference {i+1}:\n" + node_content + "\n\n"
-        references_list.append(node_content)
-    return references, references_list
+    return format_references(search_res)
+
+def format_references(search_res:list):
+    return pack_references(search_res, Packer)
 
 ## This is an example of how to use the chatbot
 # references =retrieve_references(query)
@@ -45,6 +44,7 @@ def retrieve_references(query:str):
 #================================================================================================
 # Load json file from data/dataset_utf8.json
 import json, random
+random.seed(0) # Pick the same questions on every run so the checkpoint can be resumed
 
 with open('data/dataset_utf8.json') as f:
     data = json.load(f)
@@ -56,25 +56,41 @@ ground_truths_list = []
 ground_contexts = []
 
 for i in range(len(data)):
-    #Create random number in [1,2,3]
-    question_num = f"q{random.randint(1, 3)}"
+    # Random question of the chunk, deduplication can leave fewer than three
+    question_num = random.choice(sorted(data[f"doc_{i}"]['questions']))
     question_list.append(data[f"doc_{i}"]['questions'][question_num])
     ground_contexts.append(data[f"doc_{i}"]['context'])
 
-for i in range(len(question_list)):
-    references, references_list =retrieve_references(question_list[i])
-
-    answer = OAIClient.get_chat(prompt=PROMPT.format(context_str=references, query_str=question_list[i]))
-    ground_truth = OAIClient.get_chat(prompt=PROMPT.format(context_str=ground_contexts[i], query_str=question_list[i]))
-
-    answer_list.append(answer)
-    contexts_list.append(references_list)
-    ground_truths_list.append(ground_truth)
-
-    print(f"Question {i+1}: {question_list[i]}")
-    print(f"GroundTruth: {ground_truth}")
-    print(f"Answer: {answer}")
-    print('-----------------------------------')
+# Embed all questions up front in a few batched requests instead of one request per question,
+# then retrieve references for every question with a single batched search
+start = time.perf_counter()
+question_vectors = OAIClient.get_embeddings(question_list)
+embed_seconds = time.perf_counter() - start
+start = time.perf_counter()
+search_results = QDClient.search_batch(COLLECTION_NAME, question_vectors, top_k=3, with_payload=CONTEXT_FIELDS)
+search_seconds = time.perf_counter() - start
+
+# Generate answers and ground truths concurrently, checkpointing every finished row for resume
+from core.evaluation.runner import EvaluationRunner
+runner = EvaluationRunner(
+    oai_client=OAIClient,
+    retrieve_fn=lambda question, search_res: format_references(search_res),
+    prompt=PROMPT,
+    checkpoint_path='data/dataset_w_ans.jsonl',
+    max_workers=8,
+    tokens_per_minute=160000,
+)
+rows = runner.run(question_list, ground_contexts, search_results)
+# Retrieval ran once for all questions, so it is reported as batch totals next to the per-row stages
+latency_report = runner.latency_report(rows)
+latency_report['batched_retrieval'] = {'questions': len(question_list), 'embed': embed_seconds,
+                                       'search': search_seconds,
+                                       'per_question': (embed_seconds + search_seconds) / max(len(question_list), 1)}
+print(latency_report)
+
+answer_list = [row['answer'] for row in rows]
+contexts_list = [row['context'] for row in rows]
+ground_truths_list = [row['ground_truth'] for row in rows]
 
 data_dict = {'question': question_list, 'answer': answer_list, 'context': contexts_list, 'ground_truth': ground_truths_list}
 # Save the data_dict to a json file
@@ -101,14 +117,8 @@ df_dataset.head()
 #================================================================================================
 import os
 import pandas as pd
-from ragas import evaluate
-from ragas.metrics import (
-    answer_relevancy,
-    faithfulness,
-    context_recall,
-    context_precision,
-)
 from langchain_openai.chat_models import ChatOpenAI
+from core.evaluation.scoring import RagasScorer
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -117,16 +127,16 @@ OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 
 llm = ChatOpenAI(model_name="gpt-3.5-turbo-1106", api_key=OPENAI_API_KEY, temperature=0.0, max_tokens=4000)
 
-eval_df = evaluate(dataset, metrics=[context_recall], llm=llm).to_pandas()
-con_preci_eval_df = evaluate(dataset, metrics=[context_precision], llm=llm).to_pandas()
-faithf_eval_df = evaluate(dataset, metrics=[faithfulness, answer_relevancy], llm=llm).to_pandas()
-
-#Concatenate "context_precision" column of con_preci_eval_df to eval_df
-_eval_df = pd.concat([eval_df, con_preci_eval_df['context_precision']], axis=1)
-_eval_df = pd.concat([_eval_df, faithf_eval_df['faithfulness']], axis=1)
-_eval_df = pd.concat([_eval_df, faithf_eval_df['answer_relevancy']], axis=1)
-# Drop "ground_truths" column
-_eval_df.drop(columns=['ground_truths'], inplace=True)
+# All four metrics in one pass; judge calls are cached on disk and scored rows kept in the JSONL,
+# so re-scoring after a retrieval change only pays for the rows whose answer or contexts changed
+scorer = RagasScorer(
+    llm=llm,
+    results_path='data/evaluation_scores.jsonl',
+    cache_path='database/judge_cache.sqlite',
+    max_workers=16,
+)
+_eval_df = scorer.score(
+    loaded_data['question'], loaded_data['answer'], loaded_data['context'], loaded_data['ground_truth'])
 _eval_df.head()
 # Save the _eval_df to a excel file
 _eval_df.to_excel('data/evaluation_result.xlsx', index=False)
@@ -0,0 +1,142 @@
+import os, json, time, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from core.connector.open_ai import token_count
+
+def read_checkpoint(path:str) -> list:
+    """
+    Rows of a JSONL checkpoint, in file order. A crash can leave a partially written last line:
+    it is cut off, otherwise the next appended row would be glued to it and lost.
+    """
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, 'rb+') as f:
+        complete = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            complete += len(line)
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        f.truncate(complete)
+    return rows
+
+class TokenRateLimiter():
+    """
+    Thread-safe token bucket limiting the number of LLM tokens sent per minute.
+    acquire() blocks until the requested number of tokens is available.
+    """
+    def __init__(self, tokens_per_minute:int=90000):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens:int):
+        # A request larger than the whole bucket is let through once the bucket is full
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+class EvaluationRunner():
+    """
+    Generates answers and ground truths for an evaluation set with a bounded thread pool.
+    Every finished row is appended to a JSONL checkpoint, so an interrupted run resumes
+    where it stopped, and the latency of each stage (format, answer, ground_truth) is recorded.
+    The format stage is retrieve_fn: only string formatting when the searches were batched up front,
+    whose time the caller measures itself.
+    """
+    STAGES = ('format', 'answer', 'ground_truth')
+
+    def __init__(self, oai_client, retrieve_fn, prompt:str, checkpoint_path:str,
+                 max_workers:int=8, tokens_per_minute:int=90000, max_tokens:int=2000):
+        self.oai_client = oai_client
+        self.retrieve_fn = retrieve_fn # retrieve_fn(question, retrieve_arg) -> (references, references_list)
+        self.prompt = prompt
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.max_tokens = max_tokens
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute)
+        self._write_lock = threading.Lock()
+
+    def load_checkpoint(self) -> dict:
+        return {(row['index'], row['question']): row for row in read_checkpoint(self.checkpoint_path)}
+
+    def _chat(self, prompt:str):
+        # Reserve the prompt tokens plus a completion estimate before sending the request
+        self.rate_limiter.acquire(token_count(prompt) + self.max_tokens // 4)
+        return self.oai_client.get_chat(prompt=prompt, max_tokens=self.max_tokens)
+
+    def _process(self, index:int, question:str, ground_context:str, retrieve_arg=None) -> dict:
+        latency = {}
+        start = time.perf_counter()
+        references, references_list = self.retrieve_fn(question, retrieve_arg)
+        latency['format'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        answer = self._chat(self.prompt.format(context_str=references, query_str=question))
+        latency['answer'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ground_truth = self._chat(self.prompt.format(context_str=ground_context, query_str=question))
+        latency['ground_truth'] = time.perf_counter() - start
+
+        row = {'index': index, 'question': question, 'answer': answer, 'context': references_list,
+               'ground_truth': ground_truth, 'latency': latency}
+        # Checkpoint from the worker so finished rows are kept even if another row fails
+        self._append(row)
+        return row
+
+    def _append(self, row:dict):
+        with self._write_lock:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                f.flush()
+
+    def run(self, questions:list, ground_contexts:list, retrieve_args:list=None) -> list:
+        """
+        Returns one row per question, in input order, reusing rows already in the checkpoint.
+        retrieve_args[i] (e.g. a precomputed query vector or search result) is passed to retrieve_fn.
+        """
+        done = self.load_checkpoint()
+        rows = [done.get((i, question)) for i, question in enumerate(questions)]
+        todo = [i for i, row in enumerate(rows) if row is None]
+        print(f"{len(questions) - len(todo)} rows restored from {self.checkpoint_path}, {len(todo)} to generate")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._process, i, questions[i], ground_contexts[i],
+                                None if retrieve_args is None else retrieve_args[i]): i
+                for i in todo
+            }
+            for n, future in enumerate(as_completed(futures), start=1):
+                row = future.result()
+                rows[row['index']] = row
+                print(f"[{n}/{len(todo)}] Question {row['index']+1}: {row['question']}")
+        return rows
+
+    def latency_report(self, rows:list) -> dict:
+        """Mean, p50 and p95 latency in seconds per stage."""
+        report = {}
+        for stage in self.STAGES:
+            # Rows restored from older checkpoints may lack a stage
+            values = np.array([row['latency'][stage] for row in rows
+                               if row is not None and stage in row['latency']])
+            if len(values) == 0:
+                continue
+            report[stage] = {'mean': float(values.mean()),
+                             'p50': float(np.percentile(values, 50)),
+                             'p95': float(np.percentile(values, 95))}
+        return report
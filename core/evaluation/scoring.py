@@ -0,0 +1,118 @@
+import os, json, hashlib, inspect, threading
+import pandas as pd
+from core.evaluation.runner import read_checkpoint
+
+METRIC_NAMES = ('context_recall', 'context_precision', 'faithfulness', 'answer_relevancy')
+
+def row_key(question:str, answer:str, contexts:list, ground_truth:str, judge:str=None) -> str:
+    """
+    Hash of everything a row's scores depend on: a changed answer, retrieval or judge model gives a new key.
+    """
+    data = json.dumps([question, answer, contexts, ground_truth, judge], ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def judge_name(llm) -> str:
+    """Model name of the judge LLM, a langchain chat model or ragas' wrapper around one."""
+    llm = getattr(llm, 'langchain_llm', llm)
+    for attribute in ('model_name', 'model', 'deployment_name'):
+        name = getattr(llm, attribute, None)
+        if isinstance(name, str) and name:
+            return name
+    return type(llm).__name__
+
+class RagasScorer():
+    """
+    Scores context_recall, context_precision, faithfulness and answer_relevancy in a single ragas pass,
+    instead of one evaluate() call per metric group.
+    - Rows are scored in batches of `batch_size`, all metrics of a batch concurrently (`max_workers`).
+    - Every scored row is appended to the JSONL `results_path` under a hash of its question, answer,
+      contexts, ground truth and judge model, so a re-run only scores new or changed rows, and rows
+      stored without one of the current metrics.
+    - With `cache_path`, judge-LLM calls go through langchain's SQLite LLM cache, keyed by prompt and
+      model settings: rows whose failed metrics are retried do not pay again for the ones that succeeded.
+    Rows with a failed metric (NaN) are not written to the results, so they are retried next run.
+    """
+    def __init__(self, llm, results_path:str, cache_path:str=None, embeddings=None, metrics:list=None,
+                 batch_size:int=16, max_workers:int=16):
+        from ragas.metrics import answer_relevancy, faithfulness, context_recall, context_precision
+        self.llm = llm
+        self.embeddings = embeddings
+        self.metrics = metrics or [context_recall, context_precision, faithfulness, answer_relevancy]
+        self.results_path = results_path
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._write_lock = threading.Lock()
+        if cache_path is not None:
+            from langchain.globals import set_llm_cache
+            from langchain_community.cache import SQLiteCache
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            set_llm_cache(SQLiteCache(database_path=cache_path))
+
+    @property
+    def metric_names(self) -> list:
+        return [metric.name for metric in self.metrics]
+
+    def load_results(self) -> dict:
+        return {row['key']: row for row in read_checkpoint(self.results_path)}
+
+    def _append(self, rows:list):
+        with self._write_lock:
+            with open(self.results_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                f.flush()
+
+    def _evaluate(self, dataset):
+        from ragas import evaluate
+        kwargs = dict(metrics=self.metrics, llm=self.llm, raise_exceptions=False)
+        if self.embeddings is not None:
+            kwargs['embeddings'] = self.embeddings
+        # ragas 0.1.0-0.1.3 take max_workers directly, later 0.1 releases a RunConfig
+        parameters = inspect.signature(evaluate).parameters
+        if 'max_workers' in parameters:
+            kwargs.update(is_async=True, max_workers=self.max_workers)
+        elif 'run_config' in parameters:
+            from ragas.run_config import RunConfig
+            kwargs['run_config'] = RunConfig(max_workers=self.max_workers)
+        return evaluate(dataset, **kwargs).to_pandas()
+
+    def score(self, questions:list, answers:list, contexts:list, ground_truths:list) -> pd.DataFrame:
+        """
+        Returns one row per question, in input order, with the question, answer, contexts, ground_truth
+        and one column per metric; rows already in `results_path` are reused.
+        """
+        from datasets import Dataset
+        judge = judge_name(self.llm)
+        keys = [row_key(*row, judge=judge) for row in zip(questions, answers, contexts, ground_truths)]
+        done = self.load_results()
+        todo = [i for i, key in enumerate(keys)
+                if key not in done or any(name not in done[key] for name in self.metric_names)]
+        print(f"{len(keys) - len(todo)} rows restored from {self.results_path}, {len(todo)} to score")
+
+        for start in range(0, len(todo), self.batch_size):
+            batch = todo[start:start + self.batch_size]
+            dataset = Dataset.from_dict({
+                'question': [questions[i] for i in batch],
+                'answer': [answers[i] for i in batch],
+                'contexts': [list(contexts[i]) for i in batch],
+                'ground_truth': [ground_truths[i] for i in batch],
+            })
+            scored = self._evaluate(dataset)
+            rows = []
+            for i, record in zip(batch, scored.to_dict('records')):
+                scores = {name: record.get(name) for name in self.metric_names}
+                if any(value is None or pd.isna(value) for value in scores.values()):
+                    continue
+                row = {'key': keys[i], 'index': i, 'question': questions[i], **{k: float(v) for k, v in scores.items()}}
+                done[keys[i]] = row
+                rows.append(row)
+            self._append(rows)
+            print(f"[{min(start + self.batch_size, len(todo))}/{len(todo)}] rows scored")
+
+        records = []
+        for i, key in enumerate(keys):
+            row = done.get(key, {})
+            records.append({'question': questions[i], 'answer': answers[i], 'contexts': contexts[i],
+                            'ground_truth': ground_truths[i], **{name: row.get(name) for name in self.metric_names}})
+        return pd.DataFrame(records)
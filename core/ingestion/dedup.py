@@ -0,0 +1,279 @@
+import os, re, json, zlib, hashlib, sqlite3
+import numpy as np
+from llama_index.schema import MetadataMode
+
+# Metadata keys listing the duplicates of a canonical chunk (at most `max_aliases`) and counting all of
+# them, excluded from the embedded and prompt text
+ALIASES_KEY = "aliases"
+ALIAS_COUNT_KEY = "alias_count"
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def normalize(text:str) -> list:
+    """Lower-cased words, so spacing, punctuation and case differences do not matter."""
+    return WORD_RE.findall(text.lower())
+
+def shingle_hashes(words:list, shingle_size:int=5) -> np.ndarray:
+    """32-bit hashes of the word `shingle_size`-grams, combined from per-word CRC32s without building strings."""
+    if len(words) == 0:
+        return np.zeros(1, dtype=np.uint64)
+    word_hashes = np.array([zlib.crc32(word.encode('utf-8')) for word in words], dtype=np.uint64)
+    if len(words) <= shingle_size:
+        shingle_size = len(words)
+    n = len(words) - shingle_size + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(shingle_size):
+        # Polynomial rolling combination, wrapping in uint64 then folded to 32 bits
+        hashes = hashes * np.uint64(1000003) + word_hashes[j:j + n]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+class ChunkDeduplicator():
+    """
+    Drops exact and near-duplicate chunks between a splitter and the vector store, so repeated
+    boilerplate, tables of contents and overlapping report versions are embedded and stored once.
+
+    Exact duplicates are found by the SHA-1 of the normalized words. Near duplicates by MinHash over
+    word shingles with LSH banding: `num_perm` hash values split in `bands` bands, chunks sharing a band
+    are candidates, and a candidate is a duplicate when the estimated Jaccard similarity of the shingle
+    sets is >= `threshold`. The first chunk of a group is kept as canonical and its first `max_aliases`
+    duplicates are listed in its `aliases` metadata ({node_id, doc_id, file_path}), with the total number
+    in `alias_count`, so a paragraph repeated thousands of times does not bloat one payload.
+
+    The digests, band keys and signatures of the canonical chunks live in SQLite (`index_path`, in memory
+    by default), and chunks are processed in batches of `batch_size`, so memory does not grow with the
+    corpus and an on-disk index also dedups across ingestion runs. Canonical chunks are only yielded once
+    their batch is done; a duplicate of a chunk from an earlier batch is recorded in the index and
+    written to the stored point afterwards with apply_aliases().
+
+    The index must follow the vector store: forget() / forget_file() drop canonical chunks whose points
+    were deleted and clear() empties it when the collection is recreated. MyQdrant.attach_deduplicator()
+    does this automatically for delete_data, delete_collection and recreate_collection.
+    """
+    def __init__(self, index_path:str=":memory:", threshold:float=0.8, num_perm:int=128, bands:int=16,
+                 shingle_size:int=5, batch_size:int=1024, seed:int=1, max_aliases:int=100):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.batch_size = batch_size
+        self.max_aliases = max_aliases
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._band_mult = rng.integers(1, 1 << 63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+        self.stats = {'chunks': 0, 'exact_duplicates': 0, 'near_duplicates': 0, 'chars_saved': 0}
+
+        if index_path != ":memory:" and os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS exact (digest BLOB PRIMARY KEY, chunk_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS exact_chunk ON exact (chunk_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (band_key INTEGER NOT NULL, chunk_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (band_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_chunk ON bands (chunk_id)")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS signatures (
+                                chunk_id TEXT PRIMARY KEY,
+                                signature BLOB NOT NULL,
+                                file_path TEXT)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS signatures_file ON signatures (file_path)")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS aliases (
+                                chunk_id TEXT NOT NULL,
+                                alias TEXT NOT NULL,
+                                file_path TEXT,
+                                pending INTEGER NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS aliases_chunk ON aliases (chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS aliases_pending ON aliases (pending)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS aliases_file ON aliases (file_path)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emptied (chunk_id TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def signature(self, words:list) -> np.ndarray:
+        hashes = shingle_hashes(words, self.shingle_size)
+        return ((self._a * hashes[None, :] + self._b) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature:np.ndarray) -> list:
+        """One signed 64-bit key per band, mixing the band number so equal values in different bands differ."""
+        rows = signature.astype(np.uint64).reshape(self.bands, -1)
+        keys = (rows * self._band_mult[None, :]).sum(axis=1) + np.arange(self.bands, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        return keys.view(np.int64).tolist()
+
+    def _select(self, query:str, values:list) -> list:
+        rows = []
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            rows += self._conn.execute(query.format(','.join('?' * len(chunk))), chunk).fetchall()
+        return rows
+
+    @staticmethod
+    def _alias(node) -> dict:
+        alias = {'node_id': node.node_id, 'doc_id': node.ref_doc_id}
+        if 'file_path' in node.metadata:
+            alias['file_path'] = node.metadata['file_path']
+        return alias
+
+    def _process_batch(self, nodes:list) -> list:
+        words = [normalize(node.get_content(metadata_mode=MetadataMode.NONE)) for node in nodes]
+        digests = [hashlib.sha1(" ".join(w).encode('utf-8')).digest() for w in words]
+        signatures = [self.signature(w) for w in words]
+        band_keys = [self.band_keys(s) for s in signatures]
+
+        known_digests = dict(self._select("SELECT digest, chunk_id FROM exact WHERE digest IN ({})", digests))
+        known_bands = {}
+        for band_key, chunk_id in self._select("SELECT band_key, chunk_id FROM bands WHERE band_key IN ({})",
+                                               sorted({key for keys in band_keys for key in keys})):
+            known_bands.setdefault(band_key, []).append(chunk_id)
+        known_signatures = {chunk_id: np.frombuffer(signature, dtype=np.uint32) for chunk_id, signature in self._select(
+            "SELECT chunk_id, signature FROM signatures WHERE chunk_id IN ({})",
+            sorted({chunk_id for ids in known_bands.values() for chunk_id in ids}))}
+
+        canonical, new_aliases = {}, []
+        for node, digest, signature, keys in zip(nodes, digests, signatures, band_keys):
+            self.stats['chunks'] += 1
+            target = known_digests.get(digest)
+            if target is not None:
+                self.stats['exact_duplicates'] += 1
+            else:
+                best = 0.0
+                for chunk_id in {chunk_id for key in keys for chunk_id in known_bands.get(key, ())}:
+                    similarity = float(np.mean(known_signatures[chunk_id] == signature))
+                    if similarity >= self.threshold and similarity > best:
+                        target, best = chunk_id, similarity
+                if target is not None:
+                    self.stats['near_duplicates'] += 1
+            if target is not None:
+                self.stats['chars_saved'] += len(node.get_content(metadata_mode=MetadataMode.NONE))
+                alias = self._alias(node)
+                new_aliases.append((target, json.dumps(alias, ensure_ascii=False), alias.get('file_path'),
+                                    int(target not in canonical)))
+                if target in canonical:
+                    metadata = canonical[target].metadata
+                    metadata[ALIAS_COUNT_KEY] = metadata.get(ALIAS_COUNT_KEY, 0) + 1
+                    if len(metadata.setdefault(ALIASES_KEY, [])) < self.max_aliases:
+                        metadata[ALIASES_KEY].append(alias)
+                continue
+            # A new canonical chunk, visible to the rest of the batch too
+            canonical[node.node_id] = node
+            known_digests[digest] = node.node_id
+            known_signatures[node.node_id] = signature
+            for key in keys:
+                known_bands.setdefault(key, []).append(node.node_id)
+            for excluded in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                excluded.extend(key for key in (ALIASES_KEY, ALIAS_COUNT_KEY) if key not in excluded)
+
+        self._conn.executemany("INSERT OR IGNORE INTO exact VALUES (?, ?)",
+                               [(digest, node.node_id) for node, digest in zip(nodes, digests) if node.node_id in canonical])
+        self._conn.executemany("INSERT INTO bands VALUES (?, ?)",
+                               [(key, node.node_id) for node, keys in zip(nodes, band_keys)
+                                if node.node_id in canonical for key in keys])
+        self._conn.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+                               [(node.node_id, signature.tobytes(), node.metadata.get('file_path'))
+                                for node, signature in zip(nodes, signatures) if node.node_id in canonical])
+        self._conn.executemany("INSERT INTO aliases VALUES (?, ?, ?, ?)", new_aliases)
+        self._conn.commit()
+        return list(canonical.values())
+
+    def filter(self, nodes):
+        """Yields the canonical nodes of any iterable of nodes, e.g. a splitter with stream=True."""
+        batch = []
+        for node in nodes:
+            batch.append(node)
+            if len(batch) >= self.batch_size:
+                yield from self._process_batch(batch)
+                batch = []
+        if batch:
+            yield from self._process_batch(batch)
+
+    def dedupe(self, nodes:list) -> list:
+        return list(self.filter(nodes))
+
+    def pending_aliases(self) -> dict:
+        """
+        {canonical chunk id: {'aliases': its first max_aliases aliases, 'alias_count': all of them}} for
+        canonicals whose aliases changed after they were yielded.
+        """
+        ids = [row[0] for row in self._conn.execute("SELECT DISTINCT chunk_id FROM aliases WHERE pending = 1")]
+        ids += [row[0] for row in self._conn.execute("SELECT chunk_id FROM emptied")]
+        payloads = {chunk_id: {ALIASES_KEY: [], ALIAS_COUNT_KEY: 0} for chunk_id in ids}
+        for chunk_id, count in self._select(
+                "SELECT chunk_id, COUNT(*) FROM aliases WHERE chunk_id IN ({}) GROUP BY chunk_id", ids):
+            payloads[chunk_id][ALIAS_COUNT_KEY] = count
+        for chunk_id, alias in self._select(
+                f"""SELECT chunk_id, alias FROM (
+                        SELECT chunk_id, alias, ROW_NUMBER() OVER (PARTITION BY chunk_id ORDER BY rowid) AS n
+                        FROM aliases WHERE chunk_id IN ({{}}))
+                    WHERE n <= {int(self.max_aliases)}""", ids):
+            payloads[chunk_id][ALIASES_KEY].append(json.loads(alias))
+        return payloads
+
+    def apply_aliases(self, qdrant, collection_name:str) -> int:
+        """
+        Writes pending aliases to the `aliases` and `alias_count` payload keys of the stored canonical
+        points (a MyQdrant). Canonicals no longer in the collection are forgotten instead.
+        Returns the number of points updated.
+        """
+        payloads = self.pending_aliases()
+        ids = list(payloads)
+        stored = set()
+        for start in range(0, len(ids), 500):
+            stored.update(str(record.id) for record in
+                          qdrant.retrieve_data(collection_name, ids[start:start + 500], with_payload=False))
+        for chunk_id in stored:
+            qdrant.set_payload_data(collection_name, payloads[chunk_id], [chunk_id])
+        self.forget([chunk_id for chunk_id in ids if chunk_id not in stored])
+        self._conn.execute("UPDATE aliases SET pending = 0 WHERE pending = 1")
+        self._conn.execute("DELETE FROM emptied")
+        self._conn.commit()
+        return len(stored)
+
+    def forget(self, chunk_ids:list) -> list:
+        """
+        Drops canonical chunks whose points were deleted, so chunks with the same text are kept again
+        by later runs. Returns the file paths of their aliases: that text is no longer stored anywhere,
+        so those files need to be re-ingested.
+        """
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        orphaned = {file_path for (file_path,) in self._select(
+            "SELECT DISTINCT file_path FROM aliases WHERE chunk_id IN ({})", chunk_ids) if file_path is not None}
+        for table in ("exact", "bands", "signatures", "aliases", "emptied"):
+            for start in range(0, len(chunk_ids), 500):
+                chunk = chunk_ids[start:start + 500]
+                self._conn.execute(f"DELETE FROM {table} WHERE chunk_id IN ({','.join('?' * len(chunk))})", chunk)
+        self._conn.commit()
+        return sorted(orphaned)
+
+    def forget_file(self, file_path:str) -> list:
+        """
+        forget() for every canonical chunk of a file whose points are deleted, e.g. a changed or removed
+        file. Its duplicates of chunks in other files are removed from their aliases by the next
+        apply_aliases(). Returns the other files to re-ingest, as forget().
+        """
+        chunk_ids = [row[0] for row in self._conn.execute(
+            "SELECT chunk_id FROM signatures WHERE file_path = ?", (file_path,))]
+        # Canonicals left without any alias still need their payload emptied by apply_aliases()
+        self._conn.execute("""INSERT OR IGNORE INTO emptied
+                              SELECT DISTINCT chunk_id FROM aliases WHERE file_path = ?""", (file_path,))
+        self._conn.execute("""UPDATE aliases SET pending = 1 WHERE chunk_id IN (
+                                SELECT chunk_id FROM aliases WHERE file_path = ?)""", (file_path,))
+        self._conn.execute("DELETE FROM aliases WHERE file_path = ?", (file_path,))
+        return [path for path in self.forget(chunk_ids) if path != file_path]
+
+    def clear(self):
+        """Empties the index, for a recreated or deleted collection."""
+        for table in ("exact", "bands", "signatures", "aliases", "emptied"):
+            self._conn.execute(f"DELETE FROM {table}")
+        self._conn.commit()
+
+    def report(self, embedding_size:int=1536) -> dict:
+        """Chunks seen and dropped, and the embeddings, vector bytes and text characters that were not stored."""
+        duplicates = self.stats['exact_duplicates'] + self.stats['near_duplicates']
+        return dict(self.stats, duplicates=duplicates, kept=self.stats['chunks'] - duplicates,
+                    embeddings_saved=duplicates, vector_bytes_saved=duplicates * embedding_size * 4,
+                    duplicate_ratio=duplicates / self.stats['chunks'] if self.stats['chunks'] else 0.0)
+
+    def close(self):
+        self._conn.close()
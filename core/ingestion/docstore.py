@@ -0,0 +1,106 @@
+import os, json, sqlite3, threading
+from collections import OrderedDict
+from llama_index.storage.docstore.utils import doc_to_json, json_to_doc
+
+class HierarchicalDocStore():
+    """
+    Persistent parent/child graph of hierarchical_splitter nodes in a single SQLite file.
+    Every node is stored once with its parent id and number of children. The (parent id, children)
+    structure of all nodes is loaded into a dict on first use, so merge decisions are O(1) lookups;
+    full nodes are only read, in one batched query per merge round, for the parents actually merged.
+    """
+    def __init__(self, path:str, cache_size:int=4096):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._structure = None # node_id -> (parent_id, n_children)
+        self._cache = OrderedDict() # node_id -> decoded node, LRU
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS nodes (
+                                node_id TEXT PRIMARY KEY,
+                                parent_id TEXT,
+                                n_children INTEGER NOT NULL,
+                                node TEXT NOT NULL)""")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def add_nodes(self, nodes:list):
+        rows = []
+        for node in nodes:
+            parent = node.parent_node
+            children = node.child_nodes or []
+            rows.append((node.node_id, parent.node_id if parent is not None else None, len(children),
+                         json.dumps(doc_to_json(node), ensure_ascii=False)))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            if self._structure is not None:
+                self._structure.update((node_id, (parent_id, n_children)) for node_id, parent_id, n_children, _ in rows)
+            for node_id, *_ in rows:
+                self._cache.pop(node_id, None)
+
+    @property
+    def structure(self) -> dict:
+        if self._structure is None:
+            with self._lock:
+                self._structure = {node_id: (parent_id, n_children) for node_id, parent_id, n_children
+                                   in self._conn.execute("SELECT node_id, parent_id, n_children FROM nodes")}
+        return self._structure
+
+    def parent_id(self, node_id:str):
+        entry = self.structure.get(node_id)
+        return entry[0] if entry is not None else None
+
+    def n_children(self, node_id:str) -> int:
+        entry = self.structure.get(node_id)
+        return entry[1] if entry is not None else 0
+
+    def get_nodes(self, node_ids:list) -> dict:
+        """Returns {node_id: node} for the given ids, reading the uncached ones in batched queries."""
+        found = {}
+        with self._lock:
+            missing = []
+            for node_id in node_ids:
+                if node_id in self._cache:
+                    self._cache.move_to_end(node_id)
+                    found[node_id] = self._cache[node_id]
+                else:
+                    missing.append(node_id)
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT node_id, node FROM nodes WHERE node_id IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                for node_id, node_json in rows:
+                    found[node_id] = self._cache[node_id] = json_to_doc(json.loads(node_json))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def get_meta(self, key:str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key:str, value:str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+            self._structure = None
+            self._cache.clear()
+
+    def close(self):
+        self._conn.close()
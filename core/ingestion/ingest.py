@@ -1,4 +1,7 @@
 import os.path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from core.monitoring import tracing
 from llama_index.embeddings import OpenAIEmbedding 
 from qdrant_client.local.qdrant_local import QdrantLocal
 from llama_index.vector_stores import QdrantVectorStore, MetadataFilters, ExactMatchFilter
@@ -8,35 +11,117 @@ from llama_index import (
     StorageContext,
 )
 
+def iter_files(root:str, recursive:bool=False):
+    """Yields the files SimpleDirectoryReader would read under `root` (hidden files skipped), one at a time."""
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                if recursive:
+                    yield from iter_files(entry.path, recursive)
+            else:
+                yield entry.path
+
+def load_file(file_path:str) -> list:
+    """Parses one file into Documents (one per page for PDFs). Runs in the worker processes."""
+    return SimpleDirectoryReader(input_files=[file_path]).load_data()
+
 class DocumentParser:
-    def __init__(self, local_path:str):
+    """
+    Loads the documents under `local_path` and splits them into nodes.
+    The splitters return every node at once by default. With stream=True they return a generator
+    instead: files are discovered lazily, parsed in a process pool and their nodes yielded file by
+    file, so embedding and upserting can start before parsing is done. At most `max_pending` parsed
+    files are held in memory at any time.
+    With a ChunkDeduplicator (core.ingestion.dedup), exact and near-duplicate chunks are dropped from the
+    splitter output before they reach the vector store. Not for hierarchical_splitter, whose parent/child
+    graph needs every node.
+    """
+    def __init__(self, local_path:str, max_workers:int=None, max_pending:int=None, recursive:bool=False,
+                 deduplicator=None):
         self.PERSIST_DIR = local_path
-        self.documents = SimpleDirectoryReader(self.PERSIST_DIR).load_data()
-        
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.recursive = recursive
+        self.deduplicator = deduplicator
+        self._documents = None
+
+    @property
+    def documents(self):
+        # Only parsed on first use, the streaming mode never loads the whole directory
+        if self._documents is None:
+            with tracing.span("parser.load", path=self.PERSIST_DIR) as span:
+                self._documents = SimpleDirectoryReader(self.PERSIST_DIR, recursive=self.recursive).load_data()
+                span.set(documents=len(self._documents))
+        return self._documents
+
     def get_nodes(self):
-        self.nodes = self.node_parser.get_nodes_from_documents(
-            self.documents, show_progress=False)
+        documents = self.documents
+        with tracing.span("parser.split", splitter=type(self.node_parser).__name__, documents=len(documents)) as span:
+            self.nodes = self.node_parser.get_nodes_from_documents(
+                documents, show_progress=False)
+            span.set(nodes=len(self.nodes))
+        return self.nodes
+
+    def iter_documents(self):
+        """Yields the Documents of each file in directory order, parsing up to `max_workers` files in parallel."""
+        files = iter_files(self.PERSIST_DIR, self.recursive)
+        if self.max_workers == 1:
+            for file_path in files:
+                yield load_file(file_path)
+            return
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for file_path in files:
+                pending.append(executor.submit(load_file, file_path))
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def iter_nodes(self):
+        """Yields the nodes of the current splitter, one file at a time."""
+        for documents in self.iter_documents():
+            with tracing.span("parser.split", splitter=type(self.node_parser).__name__, documents=len(documents)) as span:
+                nodes = self.node_parser.get_nodes_from_documents(documents, show_progress=False)
+                span.set(nodes=len(nodes))
+            yield from nodes
+
+    def _split(self, stream:bool):
+        if self.deduplicator is None:
+            return self.iter_nodes() if stream else self.get_nodes()
+        if stream:
+            return self.deduplicator.filter(self.iter_nodes())
+        self.nodes = self.deduplicator.dedupe(self.get_nodes())
         return self.nodes
     
-    def sentence_splitter(self, chunk_size:int=1024, chunk_overlap:int=20):
+    def sentence_splitter(self, chunk_size:int=1024, chunk_overlap:int=20, stream:bool=False):
         """
         The SentenceSplitter attempts to split text while respecting the boundaries of sentences.
         """
         from llama_index.node_parser import SentenceSplitter
 
         self.node_parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        return self.get_nodes()
+        return self._split(stream)
     
-    def sentence_window_splitter(self, window_size:int=3):
+    def sentence_window_splitter(self, window_size:int=3, stream:bool=False, text_buffer=None):
         """
         Spliting all documents into individual sentences.
         Nodes contain the surrounding “window” of sentences around each node in the metadata.
-        This is most useful for generating embeddings that have a very specific scope. 
-        Then, combined with a MetadataReplacementNodePostProcessor, you can replace the sentence 
+        This is most useful for generating embeddings that have a very specific scope.
+        Then, combined with a MetadataReplacementNodePostProcessor, you can replace the sentence
         with its surrounding context before sending the node to the LLM.
+        Pass a TextBuffer for the compact mode: nodes only keep the byte offsets of their window and
+        WindowReplacementPostProcessor replaces MetadataReplacementNodePostProcessor (see windows.py).
         """
         from llama_index.node_parser import SentenceWindowNodeParser
 
+        if text_buffer is not None:
+            from core.ingestion.windows import CompactWindowNodeParser
+            self.node_parser = CompactWindowNodeParser(text_buffer, window_size=window_size)
+            return self._split(stream)
+
         self.node_parser = SentenceWindowNodeParser.from_defaults(
                         # how many sentences on either side to capture
                         window_size=window_size,
@@ -45,24 +130,28 @@ class DocumentParser:
                         # the metadata key that holds the original sentence
                         original_text_metadata_key="original_sentence",
                     )
-        return self.get_nodes()
+        return self._split(stream)
 
-    def semantic_splitter(self, openai_api_key:str):
+    def semantic_splitter(self, openai_api_key:str, embedding_cache=None, stream:bool=False,
+                          chunk_embedding:str="exact"):
         """
         Instead of chunking text with a fixed chunk size, the semantic splitter adaptively picks the 
         breakpoint in-between sentences using embedding similarity. 
         This ensures that a “chunk” contains sentences that are semantically related to each other.
         https://youtu.be/8OJC21T2SL4?t=1933
+        Pass an EmbeddingCache to avoid re-embedding the same sentence groups on every run.
+        Nodes come back already embedded (see SemanticChunker for chunk_embedding).
         """
-        from llama_index.node_parser import SemanticSplitterNodeParser
+        from core.connector.open_ai import MyOAI
+        from core.ingestion.semantic import SemanticChunker
 
-        embed_model = OpenAIEmbedding(api_key=openai_api_key)
-        self.node_parser = SemanticSplitterNodeParser(
-            buffer_size=1, breakpoint_percentile_threshold=95, embed_model=embed_model
+        oai_client = MyOAI(api_key=openai_api_key, cache=embedding_cache)
+        self.node_parser = SemanticChunker(
+            oai_client, buffer_size=1, breakpoint_percentile_threshold=95, chunk_embedding=chunk_embedding
         )
-        return self.get_nodes()
+        return self._split(stream)
 
-    def hierarchical_splitter(self):
+    def hierarchical_splitter(self, stream:bool=False):
         """
         The HierarchicalSplitter is a node parser, this will return a hierarchy of nodes in a flat list, 
         where there will be overlap between parent nodes (e.g. with a bigger chunk size), and child nodes 
@@ -73,7 +162,7 @@ class DocumentParser:
         self.node_parser = HierarchicalNodeParser.from_defaults(
                             chunk_sizes=[2048, 512, 128]
                         )
-        return self.get_nodes()
+        return self._split(stream)
     
     def parent_child_splitter(self):
         
@@ -93,49 +182,59 @@ class DocumentParser:
         Reference: https://youtu.be/8OJC21T2SL4?si=pbiIva_ztjs3z_jV&t=1540
         """
 
-def auto_merging_retrieval(nodes):
-    from llama_index.node_parser import get_leaf_nodes, get_root_nodes
-    leaf_nodes = get_leaf_nodes(nodes)
-    # Load into Storage
-    # define storage context
-    from llama_index.storage.docstore import SimpleDocumentStore
-    from llama_index.storage import StorageContext
+# (db path, collection name) -> (docstore, vector store), so the stores are opened once per process
+_HIERARCHY_STORES = {}
+
+def open_auto_merging_retriever(nodes:list=None, db_path:str='database', collection_name:str='auto_merging',
+                                service_context=None, similarity_top_k:int=6):
+    """
+    HierarchicalRetriever over hierarchical_splitter nodes. The parent/child graph is persisted in
+    `<db_path>/<collection_name>_docstore.sqlite` and the leaves in the Qdrant collection. Both are built
+    on first use and opened once per process. When `nodes` are given and their content differs from the
+    stored hierarchy, both stores are rebuilt from them; nodes=None serves what is stored.
+    """
     from llama_index import ServiceContext
     from llama_index.llms import OpenAI
+    from core.ingestion.docstore import HierarchicalDocStore
+    from core.rag.auto_merging import build_hierarchical_index, load_hierarchical_retriever, hierarchy_fingerprint
 
-    docstore = SimpleDocumentStore()
-
-    # insert nodes into docstore
-    docstore.add_documents(nodes)
-
-    # define storage context (will include vector store by default too)
-    storage_context = StorageContext.from_defaults(docstore=docstore)
-
-    service_context = ServiceContext.from_defaults(
-        llm=OpenAI(model="gpt-3.5-turbo")
-    )
-
-
-    ## Load index into vector index
-    from llama_index import VectorStoreIndex
-
-    base_index = VectorStoreIndex(
-        leaf_nodes,
-        storage_context=storage_context,
-        service_context=service_context,
-    )
-
-    # Define Retriever
-    from llama_index.retrievers.auto_merging_retriever import AutoMergingRetriever
-    base_retriever = base_index.as_retriever(similarity_top_k=6)
-    retriever = AutoMergingRetriever(base_retriever, storage_context, verbose=True)
-    # query_str = "What were some lessons learned from red-teaming?"
-    # query_str = "Can you tell me about the key concepts for safety finetuning"
-    query_str = (
-        "What could be the potential outcomes of adjusting the amount of safety"
-        " data used in the RLHF stage?"
-    )
-
-    nodes = retriever.retrieve(query_str)
-    base_nodes = base_retriever.retrieve(query_str)
-
+    if service_context is None:
+        service_context = ServiceContext.from_defaults(
+            llm=OpenAI(model="gpt-3.5-turbo")
+        )
+    key = (os.path.abspath(db_path), collection_name)
+    if key not in _HIERARCHY_STORES:
+        _HIERARCHY_STORES[key] = (
+            HierarchicalDocStore(os.path.join(db_path, f"{collection_name}_docstore.sqlite")),
+            QdrantVectorStore(client=QdrantLocal(location=db_path), collection_name=collection_name),
+        )
+    docstore, vector_store = _HIERARCHY_STORES[key]
+    if nodes:
+        fingerprint = hierarchy_fingerprint(nodes)
+        if docstore.get_meta("fingerprint") != fingerprint:
+            if len(docstore):
+                print(f"The nodes differ from the stored hierarchy of {collection_name}, rebuilding it")
+                docstore.clear()
+            # Also drops leaves left by an interrupted build; a new QdrantVectorStore recreates the collection
+            vector_store.client.delete_collection(collection_name)
+            vector_store = QdrantVectorStore(client=vector_store.client, collection_name=collection_name)
+            _HIERARCHY_STORES[key] = (docstore, vector_store)
+            build_hierarchical_index(nodes, docstore, vector_store, service_context)
+    elif not len(docstore):
+        raise ValueError(f"No hierarchy stored for {collection_name}, pass the hierarchical_splitter nodes")
+
+    return load_hierarchical_retriever(docstore, vector_store, service_context,
+                                       similarity_top_k=similarity_top_k)
+
+def auto_merging_retrieval(nodes:list, query_str:str, db_path:str='database', collection_name:str='auto_merging',
+                           service_context=None, similarity_top_k:int=6, retriever=None):
+    """
+    Auto-merging retrieval over hierarchical_splitter nodes, see open_auto_merging_retriever. Pass the
+    `retriever` it returns to skip the store checks on repeated queries (nodes may then be None).
+    Returns (merged nodes, leaf nodes, timings) from a single retrieval; timings has the leaf retrieval
+    and merge latencies in milliseconds.
+    """
+    if retriever is None:
+        retriever = open_auto_merging_retriever(nodes, db_path, collection_name, service_context, similarity_top_k)
+    merged_nodes = retriever.retrieve(query_str)
+    return merged_nodes, retriever.last_leaves, retriever.last_timings
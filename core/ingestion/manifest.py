@@ -0,0 +1,59 @@
+import os, json, hashlib
+
+def file_hash(file_path:str, block_size:int=1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+class FileManifest():
+    """
+    Records (size, mtime, sha256) for every ingested file so that re-ingestion can skip unchanged files.
+    Files whose size and mtime are unchanged are trusted without hashing; a touched file whose
+    content hash is unchanged is also treated as unchanged.
+    """
+    def __init__(self, manifest_path:str):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def diff(self, file_paths:list) -> dict:
+        """Compares the given files with the manifest, returns {'new', 'changed', 'removed', 'unchanged'} path lists."""
+        report = {'new': [], 'changed': [], 'removed': [], 'unchanged': []}
+        seen = set()
+        for file_path in map(str, file_paths):
+            seen.add(file_path)
+            stat = os.stat(file_path)
+            entry = self.entries.get(file_path)
+            if entry is None:
+                report['new'].append(file_path)
+            elif entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                report['unchanged'].append(file_path)
+            elif entry['size'] == stat.st_size and entry['sha256'] == file_hash(file_path):
+                entry['mtime'] = stat.st_mtime
+                report['unchanged'].append(file_path)
+            else:
+                report['changed'].append(file_path)
+        report['removed'] = [file_path for file_path in self.entries if file_path not in seen]
+        return report
+
+    def update(self, file_path:str):
+        stat = os.stat(file_path)
+        self.entries[str(file_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': file_hash(file_path),
+        }
+
+    def remove(self, file_path:str):
+        self.entries.pop(str(file_path), None)
+
+    def save(self):
+        # Write to a temporary file first so an interrupted ingest never leaves a truncated manifest
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
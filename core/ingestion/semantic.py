@@ -0,0 +1,86 @@
+import numpy as np
+from llama_index.schema import MetadataMode
+from llama_index.node_parser.node_utils import build_nodes_from_splits
+from llama_index.node_parser.text.utils import split_by_sentence_tokenizer
+
+def sentence_windows(sentences:list, buffer_size:int=1) -> list:
+    """Each sentence joined with `buffer_size` neighbours on either side, the unit being embedded."""
+    return [
+        "".join(sentences[max(0, i - buffer_size):i + 1 + buffer_size])
+        for i in range(len(sentences))
+    ]
+
+def breakpoints(embeddings:np.ndarray, percentile:float=95) -> np.ndarray:
+    """
+    Positions i where the cosine distance between windows i and i+1 is above the given percentile
+    of all adjacent distances, i.e. a chunk ends after sentence i.
+    """
+    if len(embeddings) < 2:
+        return np.empty(0, dtype=np.int64)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.maximum(norms, 1e-12)
+    distances = 1.0 - np.einsum('ij,ij->i', normalized[:-1], normalized[1:])
+    return np.flatnonzero(distances > np.percentile(distances, percentile))
+
+class SemanticChunker():
+    """
+    Semantic splitting with batched embeddings, a drop-in for SemanticSplitterNodeParser in DocumentParser.
+    All sentence windows of a document are embedded in one MyOAI.get_embeddings call (token-packed
+    batches, concurrent requests, EmbeddingCache lookups), and the breakpoints are computed on the
+    whole embedding matrix at once.
+
+    chunk_embedding selects how the resulting nodes get their vectors:
+        "exact" - every chunk is embedded in one more batched call, as the vector index would do,
+        "mean"  - the normalized mean of the chunk's window embeddings, no extra requests,
+        None    - left empty for the index to embed.
+    """
+    def __init__(self, oai_client, buffer_size:int=1, breakpoint_percentile_threshold:float=95,
+                 chunk_embedding:str="exact", sentence_splitter=None):
+        self.oai_client = oai_client
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile_threshold = breakpoint_percentile_threshold
+        self.chunk_embedding = chunk_embedding
+        self.sentence_splitter = sentence_splitter or split_by_sentence_tokenizer()
+
+    def split_text(self, text:str) -> tuple:
+        """Returns (chunk texts, chunk sentence ranges [(start, end)], window embeddings)."""
+        sentences = self.sentence_splitter(text)
+        if len(sentences) == 0:
+            return [], [], None
+        embeddings = self.oai_client.get_embeddings(sentence_windows(sentences, self.buffer_size))
+        ends = list(breakpoints(embeddings, self.breakpoint_percentile_threshold) + 1) + [len(sentences)]
+        ranges, start = [], 0
+        for end in ends:
+            if end > start:
+                ranges.append((start, end))
+                start = end
+        chunks = ["".join(sentences[start:end]) for start, end in ranges]
+        return chunks, ranges, embeddings
+
+    def get_nodes_from_documents(self, documents:list, show_progress:bool=False) -> list:
+        all_nodes = []
+        for doc in documents:
+            chunks, ranges, embeddings = self.split_text(doc.text)
+            nodes = build_nodes_from_splits(chunks, doc)
+            offset = 0
+            for node in nodes:
+                # Done by NodeParser.get_nodes_from_documents for the llama_index parsers
+                node.metadata.update(doc.metadata)
+                start = doc.text.find(node.text, offset)
+                if start >= 0:
+                    node.start_char_idx, node.end_char_idx = start, start + len(node.text)
+                    offset = node.end_char_idx
+
+            if self.chunk_embedding == "mean":
+                for node, (start, end) in zip(nodes, ranges):
+                    vector = embeddings[start:end].mean(axis=0)
+                    node.embedding = (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+            all_nodes.extend(nodes)
+
+        if self.chunk_embedding == "exact" and all_nodes:
+            # Same text the vector index would embed, so cached vectors are shared with it
+            vectors = self.oai_client.get_embeddings(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in all_nodes])
+            for node, vector in zip(all_nodes, vectors):
+                node.embedding = vector.tolist()
+        return all_nodes
@@ -0,0 +1,161 @@
+import os, mmap, sqlite3, threading
+from llama_index.bridge.pydantic import Field, PrivateAttr
+from llama_index.node_parser.node_utils import build_nodes_from_splits
+from llama_index.node_parser.text.utils import split_by_sentence_tokenizer
+from llama_index.postprocessor.types import BaseNodePostprocessor
+from llama_index.schema import MetadataMode
+
+WINDOW_START_KEY = "window_start"
+WINDOW_END_KEY = "window_end"
+# Add these to LeanQdrantVectorStore.metadata_fields when the collection uses lean payloads
+WINDOW_METADATA_KEYS = [WINDOW_START_KEY, WINDOW_END_KEY]
+
+def sentence_offsets(text:str, sentences:list) -> tuple:
+    """(char starts, byte starts, byte ends) of each sentence in text, byte offsets being UTF-8."""
+    char_starts, byte_starts, byte_ends = [], [], []
+    char, byte = 0, 0
+    for sentence in sentences:
+        start = text.find(sentence, char)
+        if start < 0:
+            start = char
+        byte += len(text[char:start].encode("utf-8"))
+        char_starts.append(start)
+        byte_starts.append(byte)
+        byte += len(sentence.encode("utf-8"))
+        byte_ends.append(byte)
+        char = start + len(sentence)
+    return char_starts, byte_starts, byte_ends
+
+class TextBuffer():
+    """
+    Append-only store of document texts: every text is written once to `<path>/text.bin` and read back
+    through a memory map, with the (offset, length) of each document id kept in SQLite and in a dict.
+    Reading a window is a slice of the map, the document is never decoded whole.
+    """
+    def __init__(self, path:str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._data_path = os.path.join(path, "text.bin")
+        open(self._data_path, "ab").close()
+        self._file = None
+        self._mmap = None
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+                                doc_id TEXT PRIMARY KEY,
+                                offset INTEGER NOT NULL,
+                                length INTEGER NOT NULL)""")
+        self._conn.commit()
+        self._index = {doc_id: (offset, length) for doc_id, offset, length
+                       in self._conn.execute("SELECT doc_id, offset, length FROM documents")}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, doc_id:str):
+        return doc_id in self._index
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(self._data_path)
+
+    def _slice(self, start:int, end:int) -> bytes:
+        if self._mmap is None or end > len(self._mmap):
+            # The file grew since it was mapped
+            if self._mmap is not None:
+                self._mmap.close()
+                self._file.close()
+            self._file = open(self._data_path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end]
+
+    def add(self, doc_id:str, text:str):
+        data = text.encode("utf-8")
+        with self._lock:
+            entry = self._index.get(doc_id)
+            if entry is not None and entry[1] == len(data) and self._slice(entry[0], entry[0] + entry[1]) == data:
+                return
+            with open(self._data_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(data)
+            self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (doc_id, offset, len(data)))
+            self._conn.commit()
+            self._index[doc_id] = (offset, len(data))
+
+    def read(self, doc_id:str, start:int=0, end:int=None) -> str:
+        """Text of the document between the byte offsets start and end (relative to the document)."""
+        offset, length = self._index[doc_id]
+        end = length if end is None else min(end, length)
+        with self._lock:
+            data = self._slice(offset + start, offset + end)
+        return data.decode("utf-8", errors="ignore")
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._file.close()
+                self._mmap = None
+            self._conn.close()
+
+class CompactWindowNodeParser():
+    """
+    Sentence-window splitting without the duplicated window text, a drop-in for SentenceWindowNodeParser
+    in DocumentParser. One node per sentence as before, but instead of the `window` and original sentence
+    metadata (the window_size=3 default stores every sentence about seven times), each node keeps the
+    UTF-8 byte range of its window in the source document, whose text is written once to a TextBuffer.
+    WindowReplacementPostProcessor rebuilds the window at query time.
+    """
+    def __init__(self, text_buffer:TextBuffer, window_size:int=3, sentence_splitter=None):
+        self.text_buffer = text_buffer
+        self.window_size = window_size
+        self.sentence_splitter = sentence_splitter or split_by_sentence_tokenizer()
+
+    def get_nodes_from_documents(self, documents:list, show_progress:bool=False) -> list:
+        all_nodes = []
+        for doc in documents:
+            sentences = self.sentence_splitter(doc.text)
+            nodes = build_nodes_from_splits(sentences, doc)
+            self.text_buffer.add(doc.doc_id, doc.text)
+            char_starts, byte_starts, byte_ends = sentence_offsets(doc.text, sentences)
+            for i, node in enumerate(nodes):
+                # Done by NodeParser.get_nodes_from_documents for the llama_index parsers
+                node.metadata.update(doc.metadata)
+                node.start_char_idx, node.end_char_idx = char_starts[i], char_starts[i] + len(sentences[i])
+                # Same sentences as SentenceWindowNodeParser's nodes[i - window_size:i + window_size]
+                node.metadata[WINDOW_START_KEY] = byte_starts[max(0, i - self.window_size)]
+                node.metadata[WINDOW_END_KEY] = byte_ends[min(i + self.window_size, len(nodes)) - 1]
+                node.excluded_embed_metadata_keys.extend(WINDOW_METADATA_KEYS)
+                node.excluded_llm_metadata_keys.extend(WINDOW_METADATA_KEYS)
+            all_nodes.extend(nodes)
+        return all_nodes
+
+class WindowReplacementPostProcessor(BaseNodePostprocessor):
+    """
+    Replaces each node's sentence with its window read from the TextBuffer, in place of
+    MetadataReplacementPostProcessor(target_metadata_key="window"). Nodes without window offsets,
+    e.g. from a collection built by SentenceWindowNodeParser, fall back to that metadata key.
+    """
+    target_metadata_key: str = Field(default="window")
+    _text_buffer: TextBuffer = PrivateAttr()
+
+    def __init__(self, text_buffer:TextBuffer, target_metadata_key:str="window"):
+        super().__init__(target_metadata_key=target_metadata_key)
+        self._text_buffer = text_buffer
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "WindowReplacementPostProcessor"
+
+    def _postprocess_nodes(self, nodes:list, query_bundle=None) -> list:
+        for n in nodes:
+            metadata = n.node.metadata
+            doc_id = n.node.ref_doc_id
+            if WINDOW_START_KEY in metadata and doc_id in self._text_buffer:
+                n.node.set_content(self._text_buffer.read(doc_id, metadata[WINDOW_START_KEY], metadata[WINDOW_END_KEY]))
+            else:
+                n.node.set_content(metadata.get(self.target_metadata_key,
+                                                n.node.get_content(metadata_mode=MetadataMode.NONE)))
+        return nodes
@@ -0,0 +1,215 @@
+"""
+Lightweight tracing for the RAG pipeline.
+
+    from core.monitoring import tracing
+    tracing.enable(jsonl_path="logs/spans.jsonl")
+    ...
+    tracing.write_prometheus("logs/metrics.prom")   # or tracing.serve_prometheus(9464)
+
+Every instrumented stage (embedding, search, payload decoding, generation, parsing) opens a span with
+`with tracing.span("openai.chat", model=...) as s: ... s.set(prompt_tokens=...)`. Spans nest per thread
+and per asyncio task, and each finished span is appended to the JSONL file and aggregated into
+Prometheus metrics: a duration histogram per span name and a counter per attribute that is a quantity
+(COUNTER_ATTRIBUTES: tokens, documents, cache hits...). Settings such as top_k, limit or batch_size are
+kept in the JSONL spans only, since their sum means nothing; tracing.count_attributes("name") adds a counter.
+While tracing is disabled, span() returns a shared no-op object.
+"""
+import os, json, time, uuid, threading, contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus histogram buckets for span durations, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Span attributes whose values add up across spans; True counts as 1
+COUNTER_ATTRIBUTES = frozenset({
+    "documents", "nodes", "leaves", "parents", "chunks", "hits", "texts", "items", "batches", "requests",
+    "cache_hits", "tokens", "tokens_saved", "prompt_tokens", "completion_tokens", "filtered",
+})
+
+class _NoopSpan():
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Span():
+    def __init__(self, tracer, name:str, attributes:dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = None
+        self.parent_id = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start": self.start, "duration": self.duration,
+                "attributes": self.attributes}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Tracer():
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_path = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._histograms = {} # span name -> [bucket counts..., count, sum]
+        self._counters = {} # (span name, attribute) -> total
+        self.counter_attributes = set(COUNTER_ATTRIBUTES)
+        self._server = None
+
+    def enable(self, jsonl_path:str=None):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.jsonl_path = jsonl_path
+            if jsonl_path is not None:
+                os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+                self._file = open(jsonl_path, "a", encoding="utf-8")
+            self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def count_attributes(self, *names:str):
+        """Aggregates these span attributes into Prometheus counters too."""
+        with self._lock:
+            self.counter_attributes.update(names)
+
+    def reset(self):
+        """Clears the aggregated metrics."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def span(self, name:str, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def bind(self, fn):
+        """
+        Wraps fn so that spans it opens in another thread (e.g. a ThreadPoolExecutor worker)
+        are children of the span that is current here.
+        """
+        if not self.enabled:
+            return fn
+        parent = _current_span.get()
+        def run(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return run
+
+    def _finish(self, span:Span):
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            for key, value in span.attributes.items():
+                if key not in self.counter_attributes:
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._counters[(span.name, key)] = self._counters.get((span.name, key), 0) + value
+                elif value is True:
+                    self._counters[(span.name, key)] = self._counters.get((span.name, key), 0) + 1
+            if self._file is not None:
+                self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+    def summary(self) -> dict:
+        """{span name: {'count', 'total_seconds', 'mean_ms'}}, for a quick look without Prometheus."""
+        with self._lock:
+            return {name: {"count": h[-2], "total_seconds": h[-1], "mean_ms": 1000 * h[-1] / h[-2] if h[-2] else 0.0}
+                    for name, h in self._histograms.items()}
+
+    def prometheus_text(self) -> str:
+        lines = ["# HELP rag_span_duration_seconds Duration of pipeline stages.",
+                 "# TYPE rag_span_duration_seconds histogram"]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(BUCKETS, histogram):
+                    lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'rag_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram[-2]}')
+                lines.append(f'rag_span_duration_seconds_count{{span="{name}"}} {histogram[-2]}')
+                lines.append(f'rag_span_duration_seconds_sum{{span="{name}"}} {histogram[-1]}')
+            lines += ["# HELP rag_span_attribute_total Sum of quantity span attributes (tokens, documents, cache hits).",
+                      "# TYPE rag_span_attribute_total counter"]
+            for (name, key), total in sorted(self._counters.items()):
+                lines.append(f'rag_span_attribute_total{{span="{name}",attribute="{key}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path:str):
+        """Writes the metrics for node_exporter's textfile collector, atomically."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port:int=9464, host:str="0.0.0.0"):
+        """Serves GET /metrics from a daemon thread. Returns the server (call shutdown() to stop)."""
+        tracer = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+tracer = Tracer()
+enable = tracer.enable
+disable = tracer.disable
+span = tracer.span
+bind = tracer.bind
+count_attributes = tracer.count_attributes
+summary = tracer.summary
+prometheus_text = tracer.prometheus_text
+write_prometheus = tracer.write_prometheus
+serve_prometheus = tracer.serve_prometheus
@@ -0,0 +1,91 @@
+import time, threading
+from collections import OrderedDict
+import numpy as np
+
+class SemanticAnswerCache():
+    """
+    In-memory answer cache keyed by query embedding.
+    A query whose cosine similarity to a cached query is at least `threshold` gets the cached answer
+    and sources back. Entries expire after `ttl_seconds`, the least recently used entry is evicted
+    beyond `max_entries`, and everything is dropped when `version_fn()` (e.g. the collection's last
+    ingest time) returns a different value than when the entries were stored.
+    """
+    def __init__(self, threshold:float=0.95, max_entries:int=1024, ttl_seconds:float=24 * 3600,
+                 version_fn=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None # (max_entries, dim) normalized query embeddings, one row per slot
+        self._entries = OrderedDict() # slot -> entry, in LRU order
+        self._free = list(range(max_entries))
+        self._version = None
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._free = list(range(self.max_entries))
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query_vector) -> dict:
+        """Returns the cached entry {'query', 'answer', 'sources', 'similarity'} or None."""
+        with self._lock:
+            self._check_version()
+            if not self._entries:
+                self.misses += 1
+                return None
+            now = time.time()
+            for slot in [slot for slot, entry in self._entries.items() if now - entry['created'] > self.ttl_seconds]:
+                del self._entries[slot]
+                self._free.append(slot)
+            slots = np.fromiter(self._entries.keys(), dtype=np.int64)
+            if len(slots) == 0:
+                self.misses += 1
+                return None
+            similarities = self._vectors[slots] @ self._normalize(query_vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            slot = int(slots[best])
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return dict(self._entries[slot], similarity=float(similarities[best]))
+
+    def store(self, query:str, query_vector, answer, sources:list=None):
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._check_version()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if not self._free:
+                slot, _ = self._entries.popitem(last=False)
+                self._free.append(slot)
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {'query': query, 'answer': answer, 'sources': sources or [],
+                                   'created': time.time()}
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,101 @@
+import time, hashlib
+from collections import defaultdict
+from llama_index import VectorStoreIndex, StorageContext, QueryBundle
+from llama_index.node_parser import get_leaf_nodes
+from llama_index.retrievers import BaseRetriever
+from llama_index.schema import NodeWithScore
+from core.ingestion.docstore import HierarchicalDocStore
+from core.monitoring import tracing
+
+def hierarchy_fingerprint(nodes:list) -> str:
+    """Hash of the node contents and tree shape, stable across re-parses that only change node ids."""
+    sha = hashlib.sha256()
+    for node in nodes:
+        sha.update(f"{node.hash}:{len(node.child_nodes or [])}\n".encode('utf-8'))
+    return sha.hexdigest()
+
+def build_hierarchical_index(nodes:list, docstore:HierarchicalDocStore, vector_store, service_context) -> VectorStoreIndex:
+    """
+    Stores the whole hierarchical_splitter graph in the docstore and embeds only the leaves into the
+    vector store. Run once per corpus; afterwards load_hierarchical_retriever() only reads both stores.
+    """
+    with tracing.span("rag.build_hierarchy", nodes=len(nodes)) as span:
+        docstore.add_nodes(nodes)
+        docstore.set_meta("fingerprint", hierarchy_fingerprint(nodes))
+        leaf_nodes = get_leaf_nodes(nodes)
+        index = VectorStoreIndex(
+            leaf_nodes,
+            storage_context=StorageContext.from_defaults(vector_store=vector_store),
+            service_context=service_context,
+        )
+        span.set(leaves=len(leaf_nodes))
+    return index
+
+def load_hierarchical_retriever(docstore:HierarchicalDocStore, vector_store, service_context,
+                                similarity_top_k:int=6, simple_ratio_thresh:float=0.5):
+    index = VectorStoreIndex.from_vector_store(vector_store, service_context=service_context)
+    return HierarchicalRetriever(index.as_retriever(similarity_top_k=similarity_top_k), docstore,
+                                 simple_ratio_thresh=simple_ratio_thresh)
+
+class HierarchicalRetriever(BaseRetriever):
+    """
+    Auto-merging retrieval over a persistent HierarchicalDocStore. Same rule as llama_index's
+    AutoMergingRetriever: when more than `simple_ratio_thresh` of a parent's children are retrieved,
+    they are replaced by the parent scored with their average, repeated up the hierarchy. Parent ids
+    and child counts come from the docstore, not from the hit payloads, so lean payloads work too, and
+    each level fetches all merged parents in one query instead of one docstore read per parent.
+    Timings of the last call are kept in `last_timings` and its unmerged leaf hits in `last_leaves`.
+    """
+    def __init__(self, vector_retriever:BaseRetriever, docstore:HierarchicalDocStore,
+                 simple_ratio_thresh:float=0.5, verbose:bool=False):
+        self.vector_retriever = vector_retriever
+        self._docstore = docstore
+        self._simple_ratio_thresh = simple_ratio_thresh
+        self.last_timings = {}
+        self.last_leaves = []
+        super().__init__(verbose=verbose)
+
+    def _merge_level(self, nodes:list):
+        by_parent = defaultdict(list)
+        for node in nodes:
+            parent_id = self._docstore.parent_id(node.node.node_id)
+            if parent_id is not None:
+                by_parent[parent_id].append(node)
+        merge_ids = [parent_id for parent_id, children in by_parent.items()
+                     if len(children) / max(self._docstore.n_children(parent_id), 1) > self._simple_ratio_thresh]
+        if not merge_ids:
+            return nodes, 0
+        parents = self._docstore.get_nodes(merge_ids)
+        merged, replaced = [], set()
+        for parent_id, parent in parents.items():
+            children = by_parent[parent_id]
+            replaced.update(child.node.node_id for child in children)
+            score = sum(child.score or 0.0 for child in children) / len(children)
+            merged.append(NodeWithScore(node=parent, score=score))
+            if self._verbose:
+                print(f"> Merging {len(children)} nodes into parent node.\n> Parent node id: {parent_id}.")
+        return [node for node in nodes if node.node.node_id not in replaced] + merged, len(parents)
+
+    def _retrieve(self, query_bundle:QueryBundle) -> list:
+        start = time.perf_counter()
+        nodes = self.vector_retriever.retrieve(query_bundle)
+        retrieved = time.perf_counter()
+        self.last_leaves = list(nodes)
+        with tracing.span("rag.merge", leaves=len(nodes)) as span:
+            parents_fetched, levels = 0, 0
+            while True:
+                nodes, fetched = self._merge_level(nodes)
+                if not fetched:
+                    break
+                parents_fetched += fetched
+                levels += 1
+            nodes = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+            span.set(parents=parents_fetched, levels=levels)
+        end = time.perf_counter()
+        self.last_timings = {
+            "retrieve_ms": 1000 * (retrieved - start),
+            "merge_ms": 1000 * (end - retrieved),
+            "parents_fetched": parents_fetched,
+            "levels": levels,
+        }
+        return nodes
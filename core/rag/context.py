@@ -0,0 +1,139 @@
+import json
+from core.connector.open_ai import get_encoding
+from core.monitoring import tracing
+
+REFERENCES_PROMPT = """
+References information is below.\n---------------------\n{context_str}\n---------------------\n
+Using both the references information and also using your own knowledge, answer the question: 
+{query_str}\n
+If the context isn't helpful, you must answer that you dont know.\n
+Always answer in Vietnamese.
+"""
+
+def hits_to_chunks(search_res:list) -> list:
+    """
+    Converts Qdrant hits into chunk dicts {text, score, doc_id, start, end} for the ContextPacker.
+    Reads either a plain `text` payload key or the llama_index `_node_content` blob.
+    """
+    chunks = []
+    with tracing.span("payload.decode", hits=len(search_res)):
+        for item in search_res:
+            payload = item.payload or {}
+            if 'text' in payload:
+                node = payload
+            else:
+                node = json.loads(payload['_node_content'])
+            chunks.append({
+                'text': node['text'],
+                'score': item.score,
+                'doc_id': payload.get('doc_id') or node.get('ref_doc_id'),
+                'start': node.get('start_char_idx'),
+                'end': node.get('end_char_idx'),
+            })
+    return chunks
+
+def format_references(search_res:list, packer) -> tuple:
+    """(prompt context string, list of reference texts) from Qdrant hits, packed by a ContextPacker."""
+    # Merge overlapping chunks, drop near-duplicates and keep the prompt within the token budget
+    packed = packer.pack(hits_to_chunks(search_res))
+    references = ""
+    references_list = []
+    for i, chunk in enumerate(packed['chunks']):
+        node_content = chunk['text'].replace('\n', ' ')
+        references += f"Reference {i+1}:\n" + node_content + "\n\n"
+        references_list.append(node_content)
+    return references, references_list
+
+class ContextPacker():
+    """
+    Builds the prompt context from retrieved chunks under a token budget:
+    1. chunks of the same document whose (end-exclusive) character ranges overlap or touch are merged,
+    2. near-duplicate chunks (Jaccard similarity of token trigrams >= dedup_threshold) are dropped,
+    3. the highest-scoring chunks that fit are packed until `token_budget`; a chunk that does not fit
+       is truncated instead if at least `min_chunk_tokens` of budget remain.
+    Every chunk is tokenized once with the cached encoder.
+    """
+    def __init__(self, token_budget:int=2000, dedup_threshold:float=0.8, min_chunk_tokens:int=64,
+                 encoding_name:str="cl100k_base"):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.min_chunk_tokens = min_chunk_tokens
+        self.encoding = get_encoding(encoding_name)
+
+    def _merge_adjacent(self, chunks:list) -> list:
+        merged, with_offsets = [], []
+        for c in chunks:
+            if c['doc_id'] is not None and c['start'] is not None and c['end'] is not None:
+                with_offsets.append(c)
+            else:
+                merged.append(c)
+        with_offsets.sort(key=lambda c: (c['doc_id'], c['start']))
+        current = None
+        for chunk in with_offsets:
+            # Offsets are end-exclusive: start == end touches, a larger start leaves a gap that is not in either text
+            if current is not None and chunk['doc_id'] == current['doc_id'] and chunk['start'] <= current['end']:
+                # Append only the part of the next chunk that is not already covered
+                overlap = current['end'] - chunk['start']
+                if chunk['end'] > current['end']:
+                    current['text'] = current['text'] + chunk['text'][max(overlap, 0):]
+                    current['end'] = chunk['end']
+                current['score'] = max(current['score'], chunk['score'])
+                current['tokens'] = None
+            else:
+                current = dict(chunk)
+                merged.append(current)
+        return merged
+
+    @staticmethod
+    def _shingles(tokens:list) -> set:
+        if len(tokens) < 3:
+            return {tuple(tokens)}
+        return set(zip(tokens, tokens[1:], tokens[2:]))
+
+    def pack(self, chunks:list) -> dict:
+        """
+        Returns {'chunks': packed chunks in score order, 'tokens': tokens used,
+        'tokens_in': tokens of the input chunks, 'tokens_saved': tokens_in - tokens, 'dropped': chunk count}.
+        """
+        with tracing.span("context.pack", chunks=len(chunks)) as span:
+            packed = self._pack(chunks)
+            span.set(tokens=packed['tokens'], tokens_saved=packed['tokens_saved'])
+        return packed
+
+    def _pack(self, chunks:list) -> dict:
+        chunks = [dict(chunk, tokens=self.encoding.encode(chunk['text'])) for chunk in chunks]
+        tokens_in = sum(len(chunk['tokens']) for chunk in chunks)
+
+        candidates = self._merge_adjacent(chunks)
+        for chunk in candidates:
+            if chunk.get('tokens') is None:
+                chunk['tokens'] = self.encoding.encode(chunk['text'])
+        candidates.sort(key=lambda c: c['score'], reverse=True)
+
+        kept, kept_shingles = [], []
+        for chunk in candidates:
+            shingles = self._shingles(chunk['tokens'])
+            if any(len(shingles & other) / max(len(shingles | other), 1) >= self.dedup_threshold
+                   for other in kept_shingles):
+                continue
+            kept.append(chunk)
+            kept_shingles.append(shingles)
+
+        packed, used = [], 0
+        for chunk in kept:
+            remaining = self.token_budget - used
+            if len(chunk['tokens']) <= remaining:
+                packed.append(chunk)
+                used += len(chunk['tokens'])
+            elif remaining >= self.min_chunk_tokens:
+                chunk = dict(chunk, tokens=chunk['tokens'][:remaining])
+                # A token prefix can end inside a multi-byte character (Vietnamese diacritics),
+                # drop the incomplete bytes instead of decoding them to U+FFFD
+                chunk['text'] = self.encoding.decode_bytes(chunk['tokens']).decode('utf-8', errors='ignore')
+                packed.append(chunk)
+                used += remaining
+                break
+            # Otherwise a smaller, lower-scoring chunk may still fit
+
+        return {'chunks': packed, 'tokens': used, 'tokens_in': tokens_in,
+                'tokens_saved': tokens_in - used, 'dropped': len(chunks) - len(packed)}
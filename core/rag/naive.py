@@ -1,32 +1,65 @@
-import os.path, os
+import os.path, os, time, asyncio
 from llama_index import (
     VectorStoreIndex,
     SimpleDirectoryReader,
     StorageContext,
     ServiceContext,
-    PromptTemplate
+    PromptTemplate,
+    QueryBundle,
 )
+from llama_index.response.schema import Response
 from qdrant_client.local.qdrant_local import QdrantLocal
-from llama_index.vector_stores import QdrantVectorStore
+from llama_index.vector_stores import QdrantVectorStore, MetadataFilters, ExactMatchFilter
 from llama_index.llms import OpenAI
 from llama_index.embeddings import OpenAIEmbedding
+from core.connector.embedding_cache import EmbeddingCache, CachedEmbedding
+from core.connector.payload import LeanQdrantVectorStore
+from core.ingestion.manifest import FileManifest
+from core.ingestion.ingest import iter_files
+from core.connector.streaming import TokenStream, AsyncTokenStream, iterate_in_thread
+from core.rag.answer_cache import SemanticAnswerCache
+from core.monitoring import tracing
 from dotenv import load_dotenv
 load_dotenv()
 
+def metadata_filters(filters) -> MetadataFilters:
+    """MetadataFilters from {metadata key: value}, all required, e.g. {"file_name": "report.pdf"}."""
+    if filters is None or isinstance(filters, MetadataFilters):
+        return filters
+    return MetadataFilters(filters=[ExactMatchFilter(key=key, value=value) for key, value in filters.items()])
+
 class NaiveRAG():
-    def __init__(self, data_path:str,  db_path:str, collection_name:str='demo_collection'):
+    def __init__(self, data_path:str,  db_path:str, collection_name:str='demo_collection', 
+                 embedding_cache_path:str=None, answer_cache:SemanticAnswerCache=None,
+                 llm=None, embed_model=None, lean_payload:bool=False):
         self.db_path = db_path
         self.PERSIST_DIR = data_path
         self.collection_name = collection_name
-        self.__openai_key = os.environ["OPENAI_API_KEY"]
+        # An injected llm/embed_model (e.g. the offline benchmark fakes) needs no OpenAI key
+        if llm is None or embed_model is None:
+            self.__openai_key = os.environ["OPENAI_API_KEY"]
         
-        self.llm = OpenAI(model="gpt-3.5-turbo-1106", temperature=0.0, api_key=self.__openai_key)
-        self.embed_model = OpenAIEmbedding(api_key=self.__openai_key)
+        self.llm = llm or OpenAI(model="gpt-3.5-turbo-1106", temperature=0.0, api_key=self.__openai_key)
+        self.embed_model = embed_model or OpenAIEmbedding(api_key=self.__openai_key)
+        if embedding_cache_path is not None:
+            # Re-running ingestion or repeating a question only embeds text that is not cached yet
+            self.embedding_cache = EmbeddingCache(embedding_cache_path)
+            self.embed_model = CachedEmbedding(self.embed_model, self.embedding_cache)
         self.service_context = ServiceContext.from_defaults(llm=self.llm, embed_model=self.embed_model)
         
-        self.vector_store = QdrantVectorStore(
-            client=QdrantLocal(location=self.db_path),
+        self.client = QdrantLocal(location=self.db_path)
+        # Lean payloads store text, doc id, offsets and file metadata as plain keys instead of the
+        # serialized node, so every search hit is smaller and cheaper to decode
+        vector_store_class = LeanQdrantVectorStore if lean_payload else QdrantVectorStore
+        self.vector_store = vector_store_class(
+            client=self.client,
             collection_name=self.collection_name,)
+        # Tracks which files are already ingested, kept next to the Qdrant database
+        self.manifest_path = os.path.join(self.db_path, f"{self.collection_name}_manifest.json")
+
+        self.answer_cache = answer_cache
+        if answer_cache is not None and answer_cache.version_fn is None:
+            answer_cache.version_fn = self.__collection_version
         
     def __get_documents(self):
         if os.path.exists(self.PERSIST_DIR):
@@ -52,21 +85,82 @@ class NaiveRAG():
         self.query_engine = self.index.as_query_engine(
             similarity_top_k=3,
             vector_store_query_mode="default",
-            # filters=MetadataFilters(
-            #     filters=[
-            #         ExactMatchFilter(key="name", value="paul graham"),
-            #     ]
-            # ),
             alpha=None,
             doc_ids=None,
 
             )
+        self.stream_engine = self.index.as_query_engine(
+            similarity_top_k=3,
+            vector_store_query_mode="default",
+            streaming=True,
+            )
+
+    def __collection_version(self):
+        # The manifest is rewritten by every ingest, so its mtime changes whenever the collection does
+        if os.path.exists(self.manifest_path):
+            return os.path.getmtime(self.manifest_path)
+        return None
+
+    def __delete_file_points(self, file_path:str):
+        from qdrant_client.http import models
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[
+                    models.FieldCondition(key="file_path", match=models.MatchValue(value=file_path)),
+                ])
+            ),
+        )
 
     def run_naive(self):
-        self.__get_documents()
+        with tracing.span("rag.ingest", collection=self.collection_name) as span:
+            self.__get_documents()
+            self.__store_documents()
+            self.__vector_store_index()
+            self.__create_engine()
+            span.set(documents=len(self.documents))
+        manifest = FileManifest(self.manifest_path)
+        for file_path in {doc.metadata["file_path"] for doc in self.documents}:
+            manifest.update(file_path)
+        manifest.save()
+
+    def __input_files(self) -> list:
+        # SimpleDirectoryReader refuses an empty directory, which here means every file was removed
+        if os.path.isdir(self.PERSIST_DIR) and next(iter_files(self.PERSIST_DIR), None) is None:
+            return []
+        return SimpleDirectoryReader(self.PERSIST_DIR).input_files
+
+    def run_incremental(self):
+        """
+        Incremental alternative to run_naive: only new or changed files in data_path are parsed, 
+        chunked and embedded, and the points of changed or removed files are deleted first.
+        File size, mtime and content hash are tracked in a manifest next to db_path.
+        Returns the report {'new', 'changed', 'removed', 'unchanged'} of file paths.
+        """
+        manifest = FileManifest(self.manifest_path)
+        report = manifest.diff(self.__input_files())
         self.__store_documents()
-        self.__vector_store_index()
-        self.__create_engine()
+
+        for file_path in report['removed'] + report['changed']:
+            self.__delete_file_points(file_path)
+            manifest.remove(file_path)
+        if len(report['removed']) > 0 or len(report['changed']) > 0:
+            manifest.save()
+
+        to_ingest = report['new'] + report['changed']
+        if len(to_ingest) > 0:
+            self.documents = SimpleDirectoryReader(input_files=to_ingest).load_data()
+            self.__vector_store_index()
+            for file_path in to_ingest:
+                manifest.update(file_path)
+            manifest.save()
+            self.__create_engine()
+        else:
+            self.query_vector_storage()
+
+        print(f"Ingested {len(report['new'])} new and {len(report['changed'])} changed files, "
+              f"removed {len(report['removed'])}, skipped {len(report['unchanged'])} unchanged")
+        return report
     
     def query_vector_storage(self):
         self.index = VectorStoreIndex.from_vector_store(
@@ -76,7 +170,70 @@ class NaiveRAG():
         self.__create_engine()
 
     
-    def query(self, query:str):
-        return self.query_engine.query(query)
+    def query(self, query:str, filters=None):
+        """
+        filters restricts retrieval to the chunks whose metadata match, a MetadataFilters or a dict
+        {key: value} such as {"file_name": "report.pdf"}; Qdrant applies it during the search.
+        Filtered queries bypass the answer cache, whose entries are not scoped by filter.
+        """
+        filters = metadata_filters(filters)
+        with tracing.span("rag.query", collection=self.collection_name, filtered=filters is not None) as span:
+            if self.answer_cache is None or filters is not None:
+                return self.__answer(QueryBundle(query_str=query), filters)
+
+            # Embed once: the vector serves both the cache lookup and the retrieval on a miss
+            with tracing.span("rag.embed_query"):
+                query_bundle = QueryBundle(
+                    query_str=query, embedding=self.service_context.embed_model.get_query_embedding(query))
+            cached = self.answer_cache.lookup(query_bundle.embedding)
+            if cached is not None:
+                span.set(cache_hits=1)
+                return Response(response=cached['answer'], source_nodes=cached['sources'],
+                                metadata={'cache_hit': True, 'cached_query': cached['query'],
+                                          'similarity': cached['similarity']})
+            response = self.__answer(query_bundle)
+            self.answer_cache.store(query, query_bundle.embedding, response.response, response.source_nodes)
+            return response
+
+    def __answer(self, query_bundle:QueryBundle, filters:MetadataFilters=None):
+        # Same steps as query_engine.query, run separately so retrieval and generation get their own spans
+        with tracing.span("rag.retrieve") as span:
+            if filters is None:
+                nodes = self.query_engine.retrieve(query_bundle)
+            else:
+                nodes = self.index.as_retriever(similarity_top_k=3, filters=filters).retrieve(query_bundle)
+            span.set(nodes=len(nodes))
+        with tracing.span("rag.synthesize"):
+            return self.query_engine.synthesize(query_bundle, nodes)
+
+    def __stream_engine(self, filters):
+        if filters is None:
+            return self.stream_engine
+        return self.index.as_query_engine(similarity_top_k=3, streaming=True, filters=filters)
+
+    def stream_query(self, query:str, filters=None) -> TokenStream:
+        """
+        Streams the answer tokens as the LLM produces them. Retrieval time is included in 
+        the returned TokenStream's time_to_first_token; retrieved nodes are in `source_nodes`.
+        filters as in query.
+        """
+        start = time.perf_counter()
+        with tracing.span("rag.stream_query", collection=self.collection_name):
+            response = self.__stream_engine(metadata_filters(filters)).query(query)
+        return TokenStream(response.response_gen, start, response.source_nodes)
+
+    def astream_query(self, query:str, filters=None) -> AsyncTokenStream:
+        """Async version of stream_query, consumed with `async for`."""
+        start = time.perf_counter()
+        stream = None
+        engine = self.__stream_engine(metadata_filters(filters))
+        async def deltas():
+            response = await asyncio.to_thread(engine.query, query)
+            stream.source_nodes = response.source_nodes
+            async for delta in iterate_in_thread(response.response_gen):
+                yield delta
+        stream = AsyncTokenStream(deltas(), start)
+        return stream
+
     
     
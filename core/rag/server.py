@@ -0,0 +1,313 @@
+"""
+Resident query service: the collection is loaded once and shared by every request, instead of each
+script opening its own QdrantLocal (and deleting `database/.lock` to get past its single-process lock).
+
+    python -m core.rag.server --pipeline references --db database --collection tndksh --port 8000
+    curl -N localhost:8000/query -d '{"query": "..."}'
+
+POST /query {"query": str, "stream": bool = true}
+    streams newline-delimited JSON events: {"type": "sources", "sources": [...]}, then one
+    {"type": "delta", "text": ...} per answer token, then {"type": "done", "stats": {...}};
+    with "stream": false a single JSON object {"answer", "sources", "stats"} is returned.
+GET /health, GET /metrics (the tracing Prometheus text).
+
+Query embeddings of concurrent requests are coalesced by an EmbeddingBatcher: the first query waits
+at most `max_wait_ms` for others to join, then the whole batch is embedded in one request.
+"""
+import os, json, time, asyncio, argparse
+from http import HTTPStatus
+from urllib.request import Request, urlopen
+from llama_index import QueryBundle
+from core.connector.streaming import iterate_in_thread
+from core.monitoring import tracing
+
+class EmbeddingBatcher():
+    """Coalesces concurrent embed() calls into batches of at most `max_batch` texts for `embed_fn`."""
+    def __init__(self, embed_fn, max_batch:int=64, max_wait_ms:float=5.0):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def embed(self, text:str) -> list:
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            with tracing.span("server.embed_batch", batch_size=len(batch)):
+                try:
+                    vectors = await asyncio.to_thread(self.embed_fn, [text for text, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(list(vector))
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+class NaiveRAGPipeline():
+    """Serves a NaiveRAG whose engines are ready (after run_naive, run_incremental or query_vector_storage)."""
+    def __init__(self, rag):
+        self.rag = rag
+
+    def embed(self, texts:list) -> list:
+        # Query and text embeddings are the same for ada-002, so a micro-batch takes the batched text path
+        return self.rag.service_context.embed_model.get_text_embedding_batch(texts)
+
+    def retrieve(self, query:str, vector:list) -> tuple:
+        query_bundle = QueryBundle(query_str=query, embedding=vector)
+        nodes = self.rag.stream_engine.retrieve(query_bundle)
+        sources = [{'id': n.node.node_id, 'score': n.score, 'text': n.node.get_content(),
+                    'file_name': n.node.metadata.get('file_name')} for n in nodes]
+        return (query_bundle, nodes), sources
+
+    async def stream(self, query:str, context):
+        query_bundle, nodes = context
+        response = await asyncio.to_thread(self.rag.stream_engine.synthesize, query_bundle, nodes)
+        async for delta in iterate_in_thread(response.response_gen):
+            yield delta
+
+class ReferencesPipeline():
+    """The retrieve_references pipeline of the evaluation: MyQdrant search, ContextPacker, MyOAI chat."""
+    def __init__(self, oai_client, qdrant, collection_name:str, packer, prompt:str=None, top_k:int=3):
+        from core.rag.context import REFERENCES_PROMPT
+        self.oai_client = oai_client
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.packer = packer
+        self.prompt = prompt or REFERENCES_PROMPT
+        self.top_k = top_k
+
+    def embed(self, texts:list) -> list:
+        return self.oai_client.get_embeddings(texts)
+
+    def retrieve(self, query:str, vector:list) -> tuple:
+        from core.connector.payload import CONTEXT_FIELDS
+        from core.rag.context import format_references
+        search_res = self.qdrant.search_data(collection_name=self.collection_name, query_vector=vector,
+                                             top_k=self.top_k, with_payload=CONTEXT_FIELDS)
+        references, references_list = format_references(search_res, self.packer)
+        return references, [{'text': text} for text in references_list]
+
+    async def stream(self, query:str, context):
+        async for delta in self.oai_client.astream_chat(prompt=self.prompt.format(context_str=context, query_str=query)):
+            yield delta
+
+class QueryServer():
+    """
+    asyncio HTTP server around a pipeline (NaiveRAGPipeline or ReferencesPipeline). At most
+    `max_concurrency` queries are answered at once, the others wait for a slot.
+    """
+    def __init__(self, pipeline, host:str="127.0.0.1", port:int=8000, max_batch:int=64,
+                 max_wait_ms:float=5.0, max_concurrency:int=32):
+        self.pipeline = pipeline
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.batcher = EmbeddingBatcher(pipeline.embed, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        self._slots = None
+        self._server = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        await self.batcher.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def answer(self, query:str):
+        """Yields the events of one query: sources, the answer deltas, then done with the timings."""
+        async with self._slots:
+            start = time.perf_counter()
+            with tracing.span("server.query") as span:
+                vector = await self.batcher.embed(query)
+                embedded = time.perf_counter()
+                context, sources = await asyncio.to_thread(tracing.bind(self.pipeline.retrieve), query, vector)
+                retrieved = time.perf_counter()
+                yield {'type': 'sources', 'sources': sources}
+                first_token, n_tokens = None, 0
+                async for delta in self.pipeline.stream(query, context):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    n_tokens += 1
+                    yield {'type': 'delta', 'text': delta}
+                end = time.perf_counter()
+                stats = {'embed_ms': 1000 * (embedded - start), 'retrieve_ms': 1000 * (retrieved - embedded),
+                         'time_to_first_token_ms': None if first_token is None else 1000 * (first_token - start),
+                         'total_ms': 1000 * (end - start), 'n_tokens': n_tokens}
+                span.set(completion_tokens=n_tokens)
+            yield {'type': 'done', 'stats': stats}
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], request_line[1].split("?")[0]
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                await self._respond(writer, 400, {'error': 'invalid Content-Length'})
+                return
+            body = await reader.readexactly(length)
+
+            if method == "GET" and path == "/health":
+                await self._respond(writer, 200, {'status': 'ok'})
+            elif method == "GET" and path == "/metrics":
+                await self._respond(writer, 200, tracing.prometheus_text(), "text/plain; version=0.0.4")
+            elif method == "POST" and path == "/query":
+                try:
+                    request = json.loads(body or b"{}")
+                    query = request['query']
+                except (ValueError, KeyError):
+                    await self._respond(writer, 400, {'error': 'expected a JSON body with a "query" key'})
+                    return
+                if request.get('stream', True):
+                    await self._stream(writer, self.answer(query))
+                else:
+                    await self._respond(writer, 200, await self._collect(self.answer(query)))
+            else:
+                await self._respond(writer, 404, {'error': f'{method} {path} not found'})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            # Pipeline errors (OpenAI, Qdrant) of a non-streaming query, or a bug: answer instead of dropping the connection
+            try:
+                await self._respond(writer, 500, {'error': repr(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _collect(self, events) -> dict:
+        answer, sources, stats = [], [], None
+        try:
+            async for event in events:
+                if event['type'] == 'delta':
+                    answer.append(event['text'])
+                elif event['type'] == 'sources':
+                    sources = event['sources']
+                else:
+                    stats = event['stats']
+        finally:
+            await events.aclose()
+        return {'answer': "".join(answer), 'sources': sources, 'stats': stats}
+
+    async def _respond(self, writer, status:int, body, content_type:str="application/json"):
+        data = (body if isinstance(body, str) else json.dumps(body, ensure_ascii=False, default=str)).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    async def _stream(self, writer, events):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        try:
+            try:
+                async for event in events:
+                    line = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                    writer.write(f"{len(line):x}\r\n".encode("latin-1") + line + b"\r\n")
+                    await writer.drain()
+            except ConnectionError:
+                raise
+            except Exception as e:
+                line = (json.dumps({'type': 'error', 'error': repr(e)}) + "\n").encode("utf-8")
+                writer.write(f"{len(line):x}\r\n".encode("latin-1") + line + b"\r\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # A client that disconnects mid-answer must not keep the query's slot and span open
+            await events.aclose()
+
+def stream_query(url:str, query:str):
+    """Client side: yields the events of a query to a running QueryServer at `url`."""
+    request = Request(url.rstrip("/") + "/query", data=json.dumps({'query': query}).encode("utf-8"),
+                      headers={'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident RAG query server")
+    parser.add_argument("--pipeline", choices=["references", "naive"], default="references")
+    parser.add_argument("--db", default="database", help="QdrantLocal directory")
+    parser.add_argument("--collection", default="tndksh")
+    parser.add_argument("--data", default="data", help="documents of the naive pipeline")
+    parser.add_argument("--embedding-cache", default="database/embedding_cache.sqlite")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--trace", default=None, help="JSONL file for the tracing spans")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    if args.trace is not None:
+        tracing.enable(jsonl_path=args.trace)
+    if args.pipeline == "naive":
+        from core.rag.naive import NaiveRAG
+        rag = NaiveRAG(args.data, args.db, args.collection, embedding_cache_path=args.embedding_cache)
+        rag.query_vector_storage()
+        pipeline = NaiveRAGPipeline(rag)
+    else:
+        from core.connector.open_ai import MyOAI
+        from core.connector.qdrantdb import MyQdrant
+        from core.connector.embedding_cache import EmbeddingCache
+        from core.rag.context import ContextPacker
+        oai_client = MyOAI(api_key=os.environ["OPENAI_API_KEY"], cache=EmbeddingCache(args.embedding_cache))
+        pipeline = ReferencesPipeline(oai_client, MyQdrant(local_location=args.db), args.collection,
+                                      ContextPacker(token_budget=3000))
+
+    server = QueryServer(pipeline, args.host, args.port, max_batch=args.max_batch,
+                         max_wait_ms=args.max_wait_ms, max_concurrency=args.max_concurrency)
+    print(f"Serving {args.pipeline} pipeline of {args.collection} on http://{args.host}:{args.port}")
+    asyncio.run(server.serve_forever())
+
+if __name__ == "__main__":
+    main()
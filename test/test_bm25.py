@@ -0,0 +1,81 @@
+import unicodedata
+import pytest
+from core.connector.bm25 import BM25Index, tokenize_vi
+
+TEXTS = {
+    'a': "Mỏ Bạch Hổ nằm ở bể Cửu Long, giếng 107-PL-1X khoan năm 2019",
+    'b': "Sông Hồng chảy qua Hà Nội",
+    'c': "Báo cáo trữ lượng dầu khí bể Cửu Long",
+    'd': "Giếng khoan thăm dò ở bể Nam Côn Sơn",
+}
+
+def build(texts=TEXTS) -> BM25Index:
+    index = BM25Index()
+    index.add_many(texts.items())
+    return index
+
+def test_tokenizer_keeps_codes_and_adds_bigrams():
+    tokens = tokenize_vi("Giếng 107-PL-1X ở Sông Hồng")
+    assert "107-pl-1x" in tokens and "pl" in tokens
+    assert "sông_hồng" in tokens
+    # Composed and decomposed diacritics give the same tokens
+    assert tokenize_vi(unicodedata.normalize("NFD", "Sông Hồng")) == tokenize_vi("Sông Hồng")
+
+def test_search_ranks_matching_documents():
+    index = build()
+    hits = index.search("bể Cửu Long", top_k=2)
+    assert {point_id for point_id, _ in hits} == {'a', 'c'}
+    assert index.search("107-pl-1x")[0][0] == 'a'
+    assert index.search("không có từ nào") == []
+
+def test_delete_and_overwrite_then_compact():
+    index = build()
+    index.add('b', "Sông Đà")
+    index.delete('d')
+    assert len(index) == 3 and index.n_deleted == 2
+    assert all(point_id != 'd' for point_id, _ in index.search("giếng khoan"))
+
+    index.compact()
+    assert index.n_deleted == 0 and len(index.row_to_id) == 3
+    assert index.search("bể Cửu Long") != [] and index.search("Sông Đà")[0][0] == 'b'
+    # Scores only depend on the live documents, not on where their rows ended up
+    fresh = build({'a': TEXTS['a'], 'b': "Sông Đà", 'c': TEXTS['c']})
+    assert index.search("bể Cửu Long") == pytest.approx(fresh.search("bể Cửu Long"))
+
+def test_compaction_runs_automatically_after_many_deletes():
+    index = BM25Index()
+    index.add_many((i, f"tài liệu số {i}") for i in range(3000))
+    for i in range(1200):
+        index.delete(i)
+    assert index.n_deleted < 1200
+    assert len(index.row_to_id) < 3000
+    assert index.search("số 2999")[0][0] == 2999
+
+def test_save_load_roundtrip(tmp_path):
+    index = build()
+    index.delete('b')
+    path = str(tmp_path / 'bm25.npz')
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 3
+    for query in ("bể Cửu Long", "giếng khoan", "107-PL-1X"):
+        assert loaded.search(query) == pytest.approx(index.search(query))
+    loaded.add('e', "Bể Cửu Long có nhiều mỏ")
+    assert 'e' in {point_id for point_id, _ in loaded.search("Cửu Long")}
+
+def test_keyword_index_file_follows_single_writes(tmp_path):
+    from qdrant_client.http import models
+    from core.connector.qdrantdb import MyQdrant
+    index_path = str(tmp_path / 'bm25.npz')
+    client = MyQdrant(local_location=str(tmp_path / 'db'), local_backend="numpy")
+    client.create_collection('c', embedding_size=4)
+    client.enable_keyword_index('c', index_path)
+    client.upsert_data([models.PointStruct(id=i, vector=[1.0, 0.0, 0.0, float(i)], payload={'text': text})
+                        for i, text in enumerate(TEXTS.values())], 'c')
+    client.delete_data([0], 'c')
+
+    # A new process loads the saved file instead of rebuilding it
+    reopened = MyQdrant(local_location=str(tmp_path / 'db'), local_backend="numpy")
+    index = reopened.enable_keyword_index('c', index_path)
+    assert len(index) == 3
+    assert [point_id for point_id, _ in index.search("Cửu Long")] == [2]
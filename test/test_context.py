@@ -0,0 +1,48 @@
+from core.rag.context import ContextPacker
+
+DOCUMENT = "Mỏ Bạch Hổ là mỏ dầu lớn nhất của Việt Nam, nằm ở bể Cửu Long ngoài khơi Vũng Tàu."
+
+def chunk(start:int, end:int, score:float, doc_id:str='doc', text:str=None) -> dict:
+    return {'text': DOCUMENT[start:end] if text is None else text, 'score': score,
+            'doc_id': doc_id, 'start': start, 'end': end}
+
+def test_overlapping_and_touching_chunks_are_merged():
+    packer = ContextPacker(token_budget=1000, dedup_threshold=1.1)
+    packed = packer.pack([chunk(30, 60, 0.5), chunk(0, 40, 0.9), chunk(60, len(DOCUMENT), 0.2)])
+    assert [c['text'] for c in packed['chunks']] == [DOCUMENT]
+    assert packed['chunks'][0]['score'] == 0.9
+    assert (packed['chunks'][0]['start'], packed['chunks'][0]['end']) == (0, len(DOCUMENT))
+
+def test_gaps_and_other_documents_are_not_merged():
+    packer = ContextPacker(token_budget=1000, dedup_threshold=1.1)
+    packed = packer.pack([chunk(0, 20, 0.9), chunk(25, 50, 0.8), chunk(20, 40, 0.7, doc_id='other')])
+    assert [c['text'] for c in packed['chunks']] == [DOCUMENT[0:20], DOCUMENT[25:50], DOCUMENT[20:40]]
+
+def test_near_duplicates_are_dropped():
+    packer = ContextPacker(token_budget=1000)
+    packed = packer.pack([chunk(0, 80, 0.9, doc_id='a'), chunk(0, 80, 0.5, doc_id='b'),
+                          {'text': "Sông Hồng chảy qua Hà Nội.", 'score': 0.1, 'doc_id': None, 'start': None, 'end': None}])
+    assert [c['doc_id'] for c in packed['chunks']] == ['a', None]
+    assert packed['dropped'] == 1
+
+def test_budget_truncates_on_a_character_boundary():
+    packer = ContextPacker(dedup_threshold=1.1, min_chunk_tokens=1)
+    first = packer.encoding.encode(DOCUMENT)
+    packer.token_budget = len(first) + 5
+    long_text = "Đường ống dẫn khí Nam Côn Sơn " * 20
+    packed = packer.pack([chunk(0, len(DOCUMENT), 0.9), {'text': long_text, 'score': 0.5, 'doc_id': 'b',
+                                                         'start': None, 'end': None}])
+    assert packed['tokens'] == packer.token_budget
+    assert packed['chunks'][0]['text'] == DOCUMENT
+    truncated = packed['chunks'][1]['text']
+    assert truncated and long_text.startswith(truncated)
+    assert "�" not in truncated
+    assert packed['tokens_saved'] == packed['tokens_in'] - packed['tokens']
+
+def test_chunk_that_does_not_fit_is_skipped_below_min_tokens():
+    packer = ContextPacker(dedup_threshold=1.1, min_chunk_tokens=64)
+    packer.token_budget = len(packer.encoding.encode(DOCUMENT)) + len(packer.encoding.encode("Cửu Long"))
+    packed = packer.pack([chunk(0, len(DOCUMENT), 0.9),
+                          {'text': "Bể Nam Côn Sơn " * 50, 'score': 0.5, 'doc_id': None, 'start': None, 'end': None},
+                          {'text': "Cửu Long", 'score': 0.1, 'doc_id': None, 'start': None, 'end': None}])
+    assert [c['text'] for c in packed['chunks']] == [DOCUMENT, "Cửu Long"]
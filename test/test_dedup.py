@@ -0,0 +1,97 @@
+import pytest
+from llama_index.schema import TextNode
+from core.ingestion.dedup import ALIAS_COUNT_KEY, ALIASES_KEY, ChunkDeduplicator, normalize
+
+REPORT = ("Giếng khoan thăm dò 107-PL-1X ở bể Cửu Long đạt độ sâu 3500 mét, "
+          "lưu lượng dầu thử vỉa đạt 2000 thùng mỗi ngày và áp suất vỉa ổn định trong suốt quá trình thử")
+
+def nodes(texts, file_path:str='a.txt') -> list:
+    return [TextNode(text=text, metadata={'file_path': file_path}) for text in texts]
+
+class FakeStore():
+    """Only the MyQdrant methods apply_aliases uses."""
+    def __init__(self, ids):
+        self.payloads = {point_id: {} for point_id in ids}
+
+    def retrieve_data(self, collection_name, point_ids, with_payload=True):
+        return [type('Record', (), {'id': point_id}) for point_id in point_ids if point_id in self.payloads]
+
+    def set_payload_data(self, collection_name, payload, point_ids):
+        for point_id in point_ids:
+            self.payloads[point_id].update(payload)
+
+def test_exact_duplicates_ignore_case_spacing_and_punctuation():
+    deduplicator = ChunkDeduplicator()
+    kept = deduplicator.dedupe(nodes([REPORT, "  " + REPORT.upper().replace(",", " ;"), "Sông Hồng chảy qua Hà Nội"]))
+    assert len(kept) == 2
+    assert kept[0].metadata[ALIASES_KEY][0]['file_path'] == 'a.txt'
+    assert ALIASES_KEY in kept[0].excluded_embed_metadata_keys
+    assert deduplicator.report()['exact_duplicates'] == 1
+
+def test_minhash_finds_near_duplicates_only():
+    deduplicator = ChunkDeduplicator(threshold=0.7)
+    words = normalize(REPORT)
+    near = " ".join(words[:-1] + ["rất", "ổn", "định"]) # A small edit at the end
+    unrelated = "Báo cáo tài chính quý ba của tổng công ty cho thấy doanh thu tăng mạnh nhờ giá dầu thế giới phục hồi"
+    kept = deduplicator.dedupe(nodes([REPORT, near, unrelated]))
+    assert [node.text for node in kept] == [REPORT, unrelated]
+    assert deduplicator.report()['near_duplicates'] == 1
+
+    signature = deduplicator.signature(words)
+    similarity = (signature == deduplicator.signature(normalize(near))).mean()
+    assert similarity >= 0.7
+    assert (signature == deduplicator.signature(normalize(unrelated))).mean() < 0.2
+
+def test_on_disk_index_dedups_across_runs_and_applies_aliases(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite')
+    first = ChunkDeduplicator(path)
+    canonical = first.dedupe(nodes([REPORT]))[0]
+    first.close()
+
+    second = ChunkDeduplicator(path)
+    assert second.dedupe(nodes([REPORT, REPORT], file_path='b.txt')) == []
+    store = FakeStore([canonical.node_id])
+    assert second.apply_aliases(store, 'c') == 1
+    assert store.payloads[canonical.node_id][ALIAS_COUNT_KEY] == 2
+    assert second.pending_aliases() == {}
+
+def test_aliases_are_capped():
+    deduplicator = ChunkDeduplicator(max_aliases=3)
+    kept = deduplicator.dedupe(nodes([REPORT] * 50))
+    assert len(kept) == 1
+    assert len(kept[0].metadata[ALIASES_KEY]) == 3
+    assert kept[0].metadata[ALIAS_COUNT_KEY] == 49
+
+def test_forget_lets_deleted_chunks_be_ingested_again():
+    deduplicator = ChunkDeduplicator()
+    canonical = deduplicator.dedupe(nodes([REPORT]))[0]
+    deduplicator.dedupe(nodes([REPORT], file_path='b.txt'))
+    assert deduplicator.forget([canonical.node_id]) == ['b.txt']
+    assert len(deduplicator.dedupe(nodes([REPORT]))) == 1
+
+def test_forget_file_and_missing_canonicals():
+    deduplicator = ChunkDeduplicator()
+    canonical = deduplicator.dedupe(nodes([REPORT]))[0]
+    deduplicator.dedupe(nodes([REPORT], file_path='b.txt'))
+    store = FakeStore([canonical.node_id])
+    deduplicator.apply_aliases(store, 'c')
+
+    # Removing the duplicate's file empties the canonical's aliases
+    assert deduplicator.forget_file('b.txt') == []
+    deduplicator.apply_aliases(store, 'c')
+    assert store.payloads[canonical.node_id] == {ALIASES_KEY: [], ALIAS_COUNT_KEY: 0}
+
+    # A canonical deleted behind the deduplicator's back is forgotten instead of updated
+    deduplicator.dedupe(nodes([REPORT], file_path='c.txt'))
+    assert deduplicator.apply_aliases(FakeStore([]), 'c') == 0
+    assert len(deduplicator.dedupe(nodes([REPORT], file_path='d.txt'))) == 1
+
+def test_clear_empties_the_index():
+    deduplicator = ChunkDeduplicator()
+    deduplicator.dedupe(nodes([REPORT]))
+    deduplicator.clear()
+    assert len(deduplicator.dedupe(nodes([REPORT]))) == 1
+
+def test_num_perm_must_split_into_bands():
+    with pytest.raises(ValueError):
+        ChunkDeduplicator(num_perm=100, bands=16)
@@ -0,0 +1,140 @@
+import uuid
+import numpy as np
+import pytest
+from qdrant_client.http import models
+from core.connector.numpy_store import NumpyCollection, NumpyVectorStore
+
+DIM = 64
+
+def points(vectors, start:int=0, payloads=None):
+    return [models.PointStruct(id=start + i, vector=vector.tolist(),
+                               payload=payloads[i] if payloads is not None else {'n': start + i})
+            for i, vector in enumerate(vectors)]
+
+def random_vectors(n:int, dim:int=DIM, seed:int=0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+def exact_ids(vectors:np.ndarray, query:np.ndarray, k:int) -> set:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return set(np.argsort(-(normalized @ query))[:k].tolist())
+
+def test_upsert_grows_capacity_and_keeps_rows(tmp_path):
+    collection = NumpyCollection.create(str(tmp_path / 'c'), DIM, capacity=4)
+    vectors = random_vectors(50)
+    for start in range(0, 50, 7):
+        collection.upsert(points(vectors[start:start + 7], start))
+    assert collection.config['capacity'] == 64
+    assert collection.count() == 50
+    hit = collection.search(vectors[33], limit=1)[0]
+    assert hit.id == 33 and hit.payload == {'n': 33}
+    assert hit.score == pytest.approx(1.0, abs=1e-5)
+
+def test_overwrite_and_delete_tombstone_rows(tmp_path):
+    collection = NumpyCollection.create(str(tmp_path / 'c'), DIM)
+    vectors = random_vectors(10)
+    collection.upsert(points(vectors))
+    collection.upsert([models.PointStruct(id=3, vector=vectors[3].tolist(), payload={'n': 'new'})])
+    collection.delete([5])
+    assert collection.count() == 9
+    assert collection.config['deleted'] == 2
+    ids = [hit.id for hit in collection.search(vectors[5], limit=10)]
+    assert 5 not in ids and ids.count(3) == 1
+    assert collection.retrieve([3])[0].payload == {'n': 'new'}
+    assert collection.retrieve([5]) == []
+
+def test_reopen_restores_points_and_ids(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.create_collection('c', models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+    vectors = random_vectors(20)
+    ids = [str(uuid.uuid4()) for _ in range(20)]
+    store.upsert('c', [models.PointStruct(id=point_id, vector=vector.tolist(), payload={'i': i})
+                       for i, (point_id, vector) in enumerate(zip(ids, vectors))])
+    store.delete('c', models.PointIdsList(points=[ids[0]]))
+    store.close()
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert reopened.count('c').count == 19
+    assert [c.name for c in reopened.get_collections().collections] == ['c']
+    hit = reopened.search('c', vectors[7], limit=1)[0]
+    assert hit.id == ids[7] and hit.payload == {'i': 7}
+    assert reopened.retrieve('c', [ids[0]]) == []
+    records, offset = reopened.scroll('c', limit=100)
+    assert offset is None and len(records) == 19
+
+@pytest.mark.parametrize("quantization, oversampling, min_recall", [('int8', 2.0, 0.95), ('binary', 4.0, 0.9)])
+def test_quantized_search_recall(tmp_path, quantization, oversampling, min_recall):
+    collection = NumpyCollection.create(str(tmp_path / 'c'), 128, quantization=quantization)
+    # Clustered like real embeddings: the neighbours of a query are points of its topic
+    rng = np.random.default_rng(1)
+    centers = random_vectors(100, 128)
+    vectors = (np.repeat(centers, 20, axis=0) + 0.5 * random_vectors(2000, 128, seed=2)).astype(np.float32)
+    collection.upsert(points(vectors))
+    params = models.SearchParams(quantization=models.QuantizationSearchParams(rescore=True, oversampling=oversampling))
+    recalls = []
+    for i in rng.choice(len(vectors), 20, replace=False):
+        query = vectors[i] + 0.2 * rng.standard_normal(128).astype(np.float32)
+        expected = exact_ids(vectors, query / np.linalg.norm(query), 10)
+        found = {hit.id for hit in collection.search(query, limit=10, search_params=params)}
+        recalls.append(len(found & expected) / 10)
+    assert np.mean(recalls) >= min_recall
+    assert collection.memory_report()['search_bytes'] < collection.memory_report()['vector_bytes']
+
+def test_payload_index_filters_survive_reopen(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.create_collection('c', models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+    vectors = random_vectors(30)
+    payloads = [{'file_path': f'doc_{i % 3}.pdf', 'year': 2000 + i} for i in range(30)]
+    store.upsert('c', points(vectors[:20], payloads=payloads[:20]))
+    store.create_payload_index('c', 'file_path', models.PayloadSchemaType.KEYWORD)
+    store.create_payload_index('c', 'year', models.PayloadSchemaType.INTEGER)
+    only_doc_1 = models.Filter(must=[models.FieldCondition(key='file_path', match=models.MatchValue(value='doc_1.pdf'))])
+    hits = store.search('c', vectors[0], limit=30, query_filter=only_doc_1)
+    assert sorted(hit.id for hit in hits) == [i for i in range(20) if i % 3 == 1]
+    store.close()
+
+    # Rows upserted after the index was saved are caught up on the first filtered search
+    reopened = NumpyVectorStore(str(tmp_path))
+    reopened.upsert('c', points(vectors[20:], 20, payloads[20:]))
+    reopened.delete('c', [4])
+    hits = reopened.search('c', vectors[0], limit=30, query_filter=only_doc_1)
+    assert sorted(hit.id for hit in hits) == [i for i in range(30) if i % 3 == 1 and i != 4]
+    recent = models.Filter(must=[models.FieldCondition(key='year', range=models.Range(gte=2025))],
+                           must_not=[models.FieldCondition(key='file_path', match=models.MatchValue(value='doc_2.pdf'))])
+    records, _ = reopened.scroll('c', limit=30, scroll_filter=recent)
+    assert sorted(record.id for record in records) == [25, 27, 28]
+
+def test_recall_report_keeps_estimated_and_measured_apart(tmp_path):
+    from core.connector.qdrantdb import MyQdrant
+    client = MyQdrant(local_location=str(tmp_path), local_backend="numpy")
+    client.create_collection('c', embedding_size=DIM, profile="int8")
+    vectors = random_vectors(70)
+    client.upsert_data(points(vectors), 'c')
+    client.delete_data(list(range(50, 70)), 'c')
+    report = client.recall_report('c', vectors[:5].tolist(), top_k=5, profile="int8")
+    assert report['count'] == 50
+    assert report['estimated']['vector_bytes'] == 50 * DIM * 4
+    assert report['measured']['count'] == 70 and report['measured']['code_bytes'] == 70 * DIM
+
+def test_reads_during_growing_upserts(tmp_path):
+    import threading
+    collection = NumpyCollection.create(str(tmp_path / 'c'), DIM, capacity=4, quantization='int8')
+    vectors = random_vectors(400)
+    collection.upsert(points(vectors[:4]))
+    def writer():
+        for start in range(4, 400, 3):
+            collection.upsert(points(vectors[start:start + 3], start))
+    thread = threading.Thread(target=writer)
+    thread.start()
+    errors = []
+    while thread.is_alive():
+        try:
+            assert collection.search(vectors[0], limit=3, with_vectors=True)[0].id == 0
+            records, _ = collection.scroll(limit=500, with_vectors=True)
+            assert [record.id for record in records] == list(range(len(records)))
+            assert collection.retrieve([1])[0].payload == {'n': 1}
+        except Exception as e:
+            errors.append(e)
+            break
+    thread.join()
+    assert errors == []
+    assert collection.count() == 400
@@ -0,0 +1,111 @@
+import json
+import pytest
+from core.evaluation.question_generation import QuestionGenerator
+from core.evaluation.runner import EvaluationRunner
+
+PROMPT = "{context_str}\n{query_str}"
+
+class FakeChat():
+    """Answers every prompt without a network call and records the prompts it got."""
+    def __init__(self, answer=lambda prompt: "trả lời", fail_on=()):
+        self.answer = answer
+        self.fail_on = set(fail_on)
+        self.prompts = []
+
+    def get_chat(self, prompt:str, max_tokens:int=2000, json_mode:bool=False):
+        self.prompts.append(prompt)
+        if any(marker in prompt for marker in self.fail_on):
+            raise RuntimeError("boom")
+        return self.answer(prompt)
+
+def write_lines(path, rows, partial:str=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        if partial is not None:
+            f.write(partial) # What a crash in the middle of a write leaves behind
+
+def test_runner_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / 'answers.jsonl'
+    restored = {'index': 1, 'question': "q1", 'answer': "cũ", 'context': [], 'ground_truth': "cũ",
+                'latency': {'answer': 1.0}}
+    write_lines(path, [restored], partial='{"index": 2, "quest')
+    client = FakeChat()
+    runner = EvaluationRunner(client, lambda question, arg: (f"ref {arg}", [f"ref {arg}"]), PROMPT, str(path),
+                              max_workers=2)
+
+    rows = runner.run(["q0", "q1", "q2"], ["g0", "g1", "g2"], retrieve_args=[0, 1, 2])
+    assert [row['question'] for row in rows] == ["q0", "q1", "q2"]
+    assert rows[1]['answer'] == "cũ"
+    assert rows[2]['context'] == ["ref 2"]
+    assert len(client.prompts) == 4 # answer and ground truth of q0 and q2 only
+    assert set(runner.latency_report(rows)) == {'format', 'answer', 'ground_truth'}
+
+    again = FakeChat()
+    runner.oai_client = again
+    assert [row['answer'] for row in runner.run(["q0", "q1", "q2"], ["g0", "g1", "g2"])] == [row['answer'] for row in rows]
+    assert again.prompts == []
+
+def test_question_generator_resumes_and_retries_failed_chunks(tmp_path):
+    path = tmp_path / 'questions.jsonl'
+    write_lines(path, [{'id': 'a', 'doc': 'd', 'context': "ctx-a", 'questions': {'q1': "cũ?"}}], partial='{"id": "b"')
+    samples = [{'id': point_id, 'doc': 'd', 'context': f"ctx-{point_id}"} for point_id in "abcd"]
+    client = FakeChat(lambda prompt: json.dumps({'q1': "Câu hỏi?", 'q2': " ", 'q3': "Câu khác?"}),
+                      fail_on=["ctx-c"])
+    generator = QuestionGenerator(client, str(path), max_workers=2)
+
+    rows = generator.run(samples)
+    assert [row['id'] for row in rows] == ['a', 'b', 'd']
+    assert rows[0]['questions'] == {'q1': "cũ?"}
+    assert rows[1]['questions'] == {'q1': "Câu hỏi?", 'q2': "Câu khác?"}
+    assert sorted(generator.load_checkpoint()) == ['a', 'b', 'd']
+
+    # Only the chunk that failed is sent again
+    generator.oai_client = FakeChat(lambda prompt: json.dumps({'q1': "Câu hỏi?"}))
+    assert [row['id'] for row in generator.run(samples)] == ['a', 'b', 'c', 'd']
+    assert len(generator.oai_client.prompts) == 1 and "ctx-c" in generator.oai_client.prompts[0]
+
+def test_question_generator_retries_invalid_json(tmp_path):
+    answers = iter(['{"q1": "Câu hỏi', '{"q1": "Câu hỏi?"}'])
+    generator = QuestionGenerator(FakeChat(lambda prompt: next(answers)), str(tmp_path / 'q.jsonl'))
+    assert generator.run([{'id': 'a', 'doc': 'd', 'context': "ctx"}])[0]['questions'] == {'q1': "Câu hỏi?"}
+
+def test_scorer_only_scores_new_changed_and_failed_rows(tmp_path, monkeypatch):
+    pytest.importorskip("ragas")
+    pytest.importorskip("datasets")
+    import pandas as pd
+    from core.evaluation.scoring import RagasScorer, row_key
+
+    from ragas.metrics import context_recall, faithfulness
+    judge = type('Judge', (), {'model_name': "gpt-4"})()
+    scorer = RagasScorer(llm=judge, results_path=str(tmp_path / 'scores.jsonl'), metrics=[context_recall, faithfulness])
+    scored = []
+    def evaluate(dataset):
+        # Judge-LLM stand-in: the question "q1" fails its faithfulness metric on the first run
+        scored.extend(dataset['question'])
+        return pd.DataFrame([{name: (float('nan') if question == "q1" and name == 'faithfulness' and len(scored) <= 3
+                                     else 0.5) for name in scorer.metric_names} for question in dataset['question']])
+    monkeypatch.setattr(scorer, '_evaluate', evaluate)
+
+    questions, answers = ["q0", "q1", "q2"], ["a0", "a1", "a2"]
+    contexts, ground_truths = [["c0"], ["c1"], ["c2"]], ["g0", "g1", "g2"]
+    frame = scorer.score(questions, answers, contexts, ground_truths)
+    assert scored == ["q0", "q1", "q2"]
+    assert frame['faithfulness'].isna().tolist() == [False, True, False]
+    assert set(scorer.load_results()) == {row_key("q0", "a0", ["c0"], "g0", judge="gpt-4"),
+                                          row_key("q2", "a2", ["c2"], "g2", judge="gpt-4")}
+
+    answers[2] = "a2 mới"
+    frame = scorer.score(questions, answers, contexts, ground_truths)
+    assert scored[3:] == ["q1", "q2"]
+    assert not frame[scorer.metric_names].isna().any().any()
+
+    # An added metric rescores every row, and so does another judge model
+    from ragas.metrics import answer_relevancy
+    scorer.metrics.append(answer_relevancy)
+    frame = scorer.score(questions, answers, contexts, ground_truths)
+    assert scored[5:] == ["q0", "q1", "q2"]
+    assert frame['answer_relevancy'].tolist() == [0.5, 0.5, 0.5]
+    judge.model_name = "gpt-4o"
+    scorer.score(questions, answers, contexts, ground_truths)
+    assert scored[8:] == ["q0", "q1", "q2"]
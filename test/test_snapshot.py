@@ -0,0 +1,30 @@
+import json
+import numpy as np
+from core.connector.snapshot import NPY_HEADER_SIZE, export_snapshot, iter_snapshot, load_snapshot_vectors
+
+def test_header_is_rewritten_with_the_final_shape(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((1000, 16)).astype(np.float32)
+    items = ((i, vector, {'i': i, 'text': "dầu khí"}) for i, vector in enumerate(vectors))
+    meta = export_snapshot(items, str(tmp_path))
+    assert meta == {'count': 1000, 'dim': 16}
+
+    with open(tmp_path / 'vectors.npy', 'rb') as f:
+        assert len(f.read()) == NPY_HEADER_SIZE + vectors.nbytes
+    loaded = load_snapshot_vectors(str(tmp_path))
+    assert isinstance(loaded, np.memmap) and loaded.shape == (1000, 16)
+    np.testing.assert_array_equal(loaded, vectors)
+    assert json.loads((tmp_path / 'meta.json').read_text()) == meta
+
+def test_roundtrip_keeps_ids_and_payloads(tmp_path):
+    items = [("0b6c5a2e-1f3a-4c1d-9a44-3f2f1c7e8d90", [1.0, 0.0], {'text': "Sông Hồng"}), (7, [0.0, 1.0], None)]
+    export_snapshot(iter(items), str(tmp_path))
+    restored = list(iter_snapshot(str(tmp_path)))
+    assert [point_id for point_id, _, _ in restored] == [items[0][0], 7]
+    assert [payload for _, _, payload in restored] == [{'text': "Sông Hồng"}, {}]
+    np.testing.assert_array_equal(restored[1][1], np.array([0.0, 1.0], dtype=np.float32))
+
+def test_export_without_vectors(tmp_path):
+    meta = export_snapshot(((i, None, {'i': i}) for i in range(3)), str(tmp_path))
+    assert meta == {'count': 3, 'dim': None}
+    assert not (tmp_path / 'vectors.npy').exists()
+    assert [vector for _, vector, _ in iter_snapshot(str(tmp_path))] == [None, None, None]
@@ -0,0 +1,21 @@
+from core.monitoring.tracing import Tracer
+
+def test_only_quantities_become_counters(tmp_path):
+    tracer = Tracer()
+    tracer.enable(str(tmp_path / 'spans.jsonl'))
+    for _ in range(2):
+        with tracer.span("qdrant.search", top_k=5, limit=10, batch_size=32, filtered=True) as span:
+            span.set(nodes=3, cache_hits=1, retries=2)
+    tracer.disable()
+    text = tracer.prometheus_text()
+    assert 'rag_span_attribute_total{span="qdrant.search",attribute="nodes"} 6' in text
+    assert 'attribute="cache_hits"} 2' in text and 'attribute="filtered"} 2' in text
+    for setting in ("top_k", "limit", "batch_size", "retries"):
+        assert f'attribute="{setting}"' not in text
+    assert '"top_k": 5' in (tmp_path / 'spans.jsonl').read_text() # Still recorded on the span
+
+    tracer.count_attributes("batch_size")
+    tracer.enable()
+    with tracer.span("server.embed_batch", batch_size=8):
+        pass
+    assert 'rag_span_attribute_total{span="server.embed_batch",attribute="batch_size"} 8' in tracer.prometheus_text()